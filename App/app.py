@@ -1,4 +1,4 @@
-from flask import Flask
+from flask import Flask, Response
 from flask_restful import Api
 from flask_jwt_extended import JWTManager
 from flask import g
@@ -7,28 +7,57 @@ import os
 import logging
 from time import time
 
-from resources.login import UserLogin
+from resources.login import UserLogin, TokenRefresh
 from resources.accounts import Accounts
-from resources.strategies import Strategies
-from resources.accountvalues import AccountValues
+from resources.strategies import Strategies, StrategyPerformance
+from resources.accountvalues import AccountValues, AccountValuesBackfill, AccountValuesAnalytics
 from resources.positions import Positions
+from resources.cachestats import CacheStats
+from resources.investors import InvestorNav
+from resources.helpers import closerequestsessions
+from db import db
+from supporting import metrics
+from supporting.querydetector import installquerydetector
 
 app = Flask(__name__)
 app.config['JWT_SECRET_KEY'] = os.environ['JWTSecret']
+# Let flask_jwt_extended turn token errors into 401/422 responses instead of flask_restful returning 500
+app.config['PROPAGATE_EXCEPTIONS'] = True
 jwt = JWTManager(app)
 
 api = Api(app)
 
 api.add_resource(UserLogin, '/login')
+api.add_resource(TokenRefresh, '/login/refresh')
 api.add_resource(Accounts, '/accounts')
 api.add_resource(Strategies, '/strategies')
+api.add_resource(StrategyPerformance, '/strategies/performance')
 api.add_resource(AccountValues, '/accountvalues')
+api.add_resource(AccountValuesBackfill, '/accountvalues/backfill')
+api.add_resource(AccountValuesAnalytics, '/accountvalues/analytics')
 api.add_resource(Positions, '/positions')
+api.add_resource(CacheStats, '/cachestats')
+api.add_resource(InvestorNav, '/investors/nav')
+
+installquerydetector(app, db.replicarouter.engines)
+metrics.instrumentengine(db.engine, name="primary")
+for number, engine in enumerate(db.replicaengines, start=1):
+    metrics.instrumentengine(engine, name=f"replica{number}")
+
+
+app.teardown_request(closerequestsessions)
+
+
+@app.route('/metrics')
+def metricsendpoint():
+    data, contenttype = metrics.generatemetrics()
+    return Response(data, content_type=contenttype)
 
 
 @app.before_request
 def beforereq():
     g.start = time()
+    metrics.startrequest()
     logging.debug(f"{request.method} {request.endpoint} started")
 
 
@@ -37,6 +66,7 @@ def afterreq(response):
     diff = time() - g.start
 
     logging.debug(f"{request.method} {request.endpoint} took: {diff} seconds")
+    metrics.finishrequest(method=request.method, endpoint=request.endpoint, status=response.status_code, elapsed=diff)
 
     return response
 
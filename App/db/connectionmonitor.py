@@ -0,0 +1,92 @@
+import logging
+import os
+import sys
+import threading
+import traceback
+from time import monotonic, sleep
+from typing import Dict
+import sqlalchemy
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+_sqlalchemydir = os.path.dirname(os.path.abspath(sqlalchemy.__file__))
+
+
+def _capturestack() -> list:
+    """
+    Returns the code and line of the calling frames, innermost first. It runs on every checkout, so the source lines
+    are only looked up when a connection is reported, traceback.extract_stack reads them for every frame.
+    """
+    frame = sys._getframe(1)
+    stack = []
+    while frame is not None:
+        stack.append((frame.f_code, frame.f_lineno))
+        frame = frame.f_back
+    return stack
+
+
+class ConnectionMonitor:
+    """
+    Logs connections that are held out of the pool longer than thresholdseconds, together with the stack that checked
+    them out. A connection still held is reported once by a background thread, a connection returned late is reported
+    on checkin. A threshold of 0 disables the monitor.
+    """
+    def __init__(self, thresholdseconds: float):
+        self.thresholdseconds = thresholdseconds
+        self.reported = 0
+        self._held: Dict[int, dict] = dict()
+        self._lock = threading.Lock()
+        self._threadpid = None
+
+    def instrumentengine(self, engine: Engine):
+        if not self.thresholdseconds:
+            return
+        url = engine.url.render_as_string(hide_password=True)
+
+        @event.listens_for(engine, "checkout")
+        def checkout(dbapiconnection, connectionrecord, connectionproxy):
+            self._startthread()
+            with self._lock:
+                self._held[id(connectionrecord)] = {"since": monotonic(),
+                                                    "stack": _capturestack(),
+                                                    "thread": threading.current_thread().name,
+                                                    "url": url,
+                                                    "reported": False}
+
+        @event.listens_for(engine, "checkin")
+        def checkin(dbapiconnection, connectionrecord):
+            with self._lock:
+                held = self._held.pop(id(connectionrecord), None)
+            if held and not held['reported'] and monotonic() - held['since'] > self.thresholdseconds:
+                self._report(held, "was held")
+
+    def _startthread(self):
+        # Started lazily in every gunicorn worker, threads do not survive the fork
+        if self._threadpid == os.getpid():
+            return
+        with self._lock:
+            if self._threadpid == os.getpid():
+                return
+            self._threadpid = os.getpid()
+            self._held.clear()
+        threading.Thread(target=self._watch, name="connectionmonitor", daemon=True).start()
+
+    def _watch(self):
+        while True:
+            sleep(min(self.thresholdseconds, 10.0))
+            now = monotonic()
+            with self._lock:
+                overdue = [x for x in self._held.values()
+                           if not x['reported'] and now - x['since'] > self.thresholdseconds]
+                for held in overdue:
+                    held['reported'] = True
+            for held in overdue:
+                self._report(held, "is held")
+
+    def _report(self, held: dict, verb: str):
+        self.reported += 1
+        # SQLAlchemy's own frames only show how the pool was reached, not who holds the connection
+        stack = [traceback.FrameSummary(code.co_filename, lineno, code.co_name)
+                 for code, lineno in reversed(held['stack'][1:]) if _sqlalchemydir not in code.co_filename]
+        logging.warning(f"Connection to {held['url']} {verb} for {monotonic() - held['since']:.1f} s by thread "
+                        f"{held['thread']}, checked out at:\n{''.join(traceback.format_list(stack))}")
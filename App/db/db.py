@@ -1,19 +1,40 @@
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
-from db.dbconfig import mysqlusername, mysqlpassword, mysqlhost, mysqldatabase
+from db.dbconfig import databaseurl, replicadatabaseurls, replicaretryseconds, replicastickyseconds, poolsize, \
+    maxoverflow, pooltimeout, poolrecycle, poolpreping, connectionleakseconds
 from db.models import Base
+from db.replicas import ReplicaRouter
+from db.connectionmonitor import ConnectionMonitor
 import os
 
 echo = os.environ.get("DEBUG", "") == "True"
 
-engine = create_engine('mysql+mysqlconnector://{}:{}@{}/{}'.format(
-    mysqlusername,
-    mysqlpassword,
-    mysqlhost,
-    mysqldatabase), echo=echo, pool_recycle=360, pool_size=5, max_overflow=40)
+
+def createengine(url: str):
+    return create_engine(url,
+                         echo=echo,
+                         pool_size=poolsize,
+                         max_overflow=maxoverflow,
+                         pool_timeout=pooltimeout,
+                         pool_recycle=poolrecycle,
+                         pool_pre_ping=poolpreping)
+
+
+engine = createengine(databaseurl)
 
 Base.metadata.create_all(engine)
 
 Session = sessionmaker(bind=engine, expire_on_commit=False)
 
-readonlysession = sessionmaker(bind=engine, autocommit=True)
+replicaengines = [createengine(x) for x in replicadatabaseurls]
+
+replicarouter = ReplicaRouter(primary=engine,
+                              replicas=replicaengines,
+                              retryseconds=replicaretryseconds,
+                              stickyseconds=replicastickyseconds)
+
+readonlysession = replicarouter.readonlysession
+
+connectionmonitor = ConnectionMonitor(thresholdseconds=connectionleakseconds)
+for _engine in replicarouter.engines:
+    connectionmonitor.instrumentengine(_engine)
@@ -1,6 +1,50 @@
 import os
 
-mysqldatabase = os.environ['mysqldatabase']
-mysqlhost = os.environ['mysqlhost']
-mysqlusername = os.environ['mysqlusername']
-mysqlpassword = os.environ['mysqlpassword']
+# A full SQLAlchemy URL overrides the MySQL settings, e.g. sqlite:////tmp/bench.sqlite for local benchmark runs
+databaseurl = os.environ.get("databaseurl")
+# Comma separated SQLAlchemy URLs of read replicas, GET requests read from the primary when there are none
+replicadatabaseurls = [x.strip() for x in os.environ.get("replicadatabaseurls", "").split(",") if x.strip()]
+# Seconds a replica that failed to connect is skipped
+replicaretryseconds = float(os.environ.get("replicaretryseconds", 30))
+# Seconds a user reads from the primary after a write, should cover the replication lag
+replicastickyseconds = float(os.environ.get("replicastickyseconds", 5))
+
+# Connections per gunicorn worker and engine. By default every worker thread can hold one connection and the same
+# number again can overflow for streamed responses, with dbmaxconnections set the pools of all workers together stay
+# below it. gunicornworkers and gunicornthreads are read by gunicorn.cfg as well.
+gunicornworkers = int(os.environ.get("gunicornworkers", 3))
+gunicornthreads = int(os.environ.get("gunicornthreads", 4))
+poolsize = int(os.environ.get("dbpoolsize", gunicornthreads))
+maxoverflow = int(os.environ.get("dbmaxoverflow", gunicornthreads))
+if os.environ.get("dbmaxconnections"):
+    connectionsperworker = max(1, int(os.environ["dbmaxconnections"]) // gunicornworkers)
+    poolsize = min(poolsize, connectionsperworker)
+    maxoverflow = min(maxoverflow, connectionsperworker - poolsize)
+# Seconds to wait for a connection when the pool is exhausted
+pooltimeout = float(os.environ.get("dbpooltimeout", 30))
+# Seconds after which connections are replaced, should be below the wait_timeout of the server
+poolrecycle = int(os.environ.get("dbpoolrecycle", 360))
+# Test connections on checkout so connections dropped by the server are replaced instead of failing a request
+poolpreping = os.environ.get("dbpoolpreping", "True") == "True"
+# Seconds a connection may be held before it is logged with the stack that checked it out, 0 disables the check
+connectionleakseconds = float(os.environ.get("connectionleakseconds", 30))
+
+if not databaseurl:
+    mysqldatabase = os.environ['mysqldatabase']
+    mysqlhost = os.environ['mysqlhost']
+    mysqlusername = os.environ['mysqlusername']
+    mysqlpassword = os.environ['mysqlpassword']
+
+    databaseurl = 'mysql+mysqlconnector://{}:{}@{}/{}'.format(
+        mysqlusername,
+        mysqlpassword,
+        mysqlhost,
+        mysqldatabase)
+
+    # Replicas on other hosts with the same database and credentials
+    if not replicadatabaseurls and os.environ.get("mysqlreplicahosts"):
+        replicadatabaseurls = ['mysql+mysqlconnector://{}:{}@{}/{}'.format(
+            mysqlusername,
+            mysqlpassword,
+            x.strip(),
+            mysqldatabase) for x in os.environ["mysqlreplicahosts"].split(",") if x.strip()]
@@ -0,0 +1,146 @@
+"""
+Versioned schema changes for databases created before the change was declared in db/models.py. create_all creates
+missing tables with all their indexes but never alters existing tables, so every change to an existing table gets a
+migration here. Migrations check what exists first, they are no-ops on databases created by create_all.
+"""
+
+import logging
+from typing import Callable, Dict, List, Tuple
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.orm import Session
+from db.models import Base, SchemaVersion
+
+
+def _createindex(connection: Connection, tablename: str, indexname: str):
+    if indexname in _existingindexnames(connection, tablename):
+        return
+    table = Base.metadata.tables[tablename]
+    index = next((x for x in table.indexes if x.name == indexname), None)
+    if index is not None:
+        index.create(connection)
+        return
+    constraint = next(x for x in table.constraints if x.name == indexname)
+    columns = ", ".join(x.name for x in constraint.columns)
+    connection.execute(text(f"CREATE UNIQUE INDEX {indexname} ON {tablename} ({columns})"))
+
+
+def _existingindexnames(connection: Connection, tablename: str) -> set:
+    inspector = inspect(connection)
+    names = {x['name'] for x in inspector.get_indexes(tablename)}
+    names.update(x['name'] for x in inspector.get_unique_constraints(tablename))
+    return names
+
+
+class DuplicateKeys(Exception):
+    """
+    Raised when a unique key can not be added because rows share its columns. The rows are left alone, they are
+    deleted by deleteduplicates after review.
+    """
+    pass
+
+
+# Natural keys added as unique indexes by migration 2, rows whose key has a NULL column do not collide
+UNIQUEKEYS: List[Tuple[str, str, List[str]]] = [
+    ("accountvalue", "uq_accountvalue_account_date", ["accountdbid", "valuedate"]),
+    ("positions", "uq_position_account_brokerposition", ["accountid", "brokerpositionid"]),
+    ("useraccountlinks", "uq_useraccountlink_user_account", ["userid", "accountid"]),
+    ("strategyuserlinks", "uq_strategyuserlink_user_strategy", ["userid", "strategyid"]),
+]
+
+
+def _duplicatesselect(tablename: str, columns: List[str]) -> str:
+    grouping = ", ".join(columns)
+    notnull = " AND ".join(f"{x} IS NOT NULL" for x in columns)
+    return f"SELECT {grouping}, COUNT(*) AS duplicates, MAX(id) AS keepid FROM {tablename} WHERE {notnull} " \
+           f"GROUP BY {grouping} HAVING COUNT(*) > 1"
+
+
+def findduplicates(connection: Connection, tablename: str, columns: List[str]) -> List[dict]:
+    """
+    Returns the key columns, the number of rows and the highest id of every group of rows with the same key.
+    """
+    return [dict(x) for x in connection.execute(text(_duplicatesselect(tablename, columns))).mappings()]
+
+
+def deleteduplicates(engine: Engine) -> Dict[str, int]:
+    """
+    Deletes all but the most recent row, the one with the highest id, of every group of rows with the same unique key
+    that is not in place yet. Returns the number of deleted rows per table.
+    """
+    deleted = dict()
+    with engine.begin() as connection:
+        for tablename, indexname, columns in UNIQUEKEYS:
+            if indexname in _existingindexnames(connection, tablename):
+                continue
+            groups = findduplicates(connection, tablename, columns)
+            if not groups:
+                continue
+            condition = " AND ".join(f"t.{x} = d.{x}" for x in columns)
+            # The derived table lets MySQL delete from the table the subquery selects from
+            result = connection.execute(text(f"DELETE FROM {tablename} WHERE id IN (SELECT id FROM "
+                                             f"(SELECT t.id FROM {tablename} t "
+                                             f"JOIN ({_duplicatesselect(tablename, columns)}) d "
+                                             f"ON {condition} AND t.id < d.keepid) AS obsolete)"))
+            deleted[tablename] = result.rowcount
+            logging.warning(f"Deleted {result.rowcount} duplicate rows from {tablename}")
+    return deleted
+
+
+def _addcompositeindexes(connection: Connection):
+    _createindex(connection, "apiusers", "ix_user_username")
+    _createindex(connection, "positions", "ix_position_account_status")
+    _createindex(connection, "positions", "ix_position_account_entry")
+    _createindex(connection, "accounttransactions", "ix_accounttransaction_account_datetime")
+
+
+def _adduniquekeys(connection: Connection):
+    missing = [x for x in UNIQUEKEYS if x[1] not in _existingindexnames(connection, x[0])]
+    problems = []
+    for tablename, indexname, columns in missing:
+        for group in findduplicates(connection, tablename, columns):
+            key = ", ".join(f"{x}={group[x]}" for x in columns)
+            problems.append(f"{tablename}: {key} ({group['duplicates']} rows)")
+    if problems:
+        raise DuplicateKeys("Rows share a unique key, review them and run python migrate.py deleteduplicates to "
+                            "keep the row with the highest id of each key:\n" + "\n".join(problems))
+    for tablename, indexname, columns in missing:
+        _createindex(connection, tablename, indexname)
+
+
+def _addunitpricingindexes(connection: Connection):
+    _createindex(connection, "portfoliovalue", "ix_portfoliovalue_valuedate")
+    _createindex(connection, "accounttransactions", "ix_accounttransaction_investor_datetime")
+
+
+# Append only, the position in the list is the version number
+migrations: List[Tuple[str, Callable[[Connection], None]]] = [
+    ("Indexes for logins, positions and transactions", _addcompositeindexes),
+    ("Unique keys for account values, positions and links", _adduniquekeys),
+    ("Indexes for unit pricing", _addunitpricingindexes),
+]
+
+
+def currentversion(engine: Engine) -> int:
+    with Session(bind=engine) as session:
+        return SchemaVersion.getversion(session=session)
+
+
+def upgrade(engine: Engine) -> List[str]:
+    """
+    Applies the migrations the database has not seen yet, each one in its own transaction together with the new
+    version number. Returns the descriptions of the applied migrations.
+    """
+    Base.metadata.create_all(engine)
+    applied = []
+    for version, (description, migration) in enumerate(migrations, start=1):
+        if version <= currentversion(engine):
+            continue
+        with engine.begin() as connection:
+            migration(connection)
+            with Session(bind=connection) as session:
+                SchemaVersion.setversion(session=session, version=version)
+                session.flush()
+        logging.info(f"Applied migration {version}: {description}")
+        applied.append(description)
+    return applied
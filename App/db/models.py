@@ -1,15 +1,19 @@
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy import Integer, String, Column, ForeignKey, Boolean, Float, Date, DateTime, Text, BigInteger
+from sqlalchemy import Integer, String, Column, ForeignKey, Boolean, Float, Date, DateTime, Text, BigInteger, \
+    UniqueConstraint, Index, insert, update, delete, select, or_, and_, func, case, Select
+from sqlalchemy.engine import RowMapping
 from sqlalchemy.orm import Session
-from typing import List, Optional
-from datetime import date, datetime
+from typing import List, Optional, Tuple, Dict
+from datetime import date, datetime, timedelta
 from passlib.hash import pbkdf2_sha256 as sha256
+from db.upsert import upsertrows
 
 Base = declarative_base()
 
 
 class User(Base):
     __tablename__ = 'apiusers'
+    __table_args__ = (Index("ix_user_username", "username"),)
 
     id = Column(Integer, primary_key=True)
     username = Column(String(100), nullable=False)
@@ -23,6 +27,7 @@ class User(Base):
 
 class UserAccountLink(Base):
     __tablename__ = "useraccountlinks"
+    __table_args__ = (UniqueConstraint("userid", "accountid", name="uq_useraccountlink_user_account"),)
 
     """
     A class the represents a database that records the connection between users and accounts. This is used to
@@ -47,6 +52,17 @@ class UserAccountLink(Base):
     def getlinksforuser(session: Session, userid: int) -> List['UserAccountLink']:
         return session.query(UserAccountLink).filter(UserAccountLink.userid == userid).all()
 
+    @staticmethod
+    def getrightsforuser(session: Session, userid: int) -> List[Tuple[int, bool, bool, bool]]:
+        """
+        Returns (accountid, isadmin, isowner, isreadwrite) tuples for the links of the user.
+        """
+        return session.query(UserAccountLink.accountid,
+                             UserAccountLink.isadmin,
+                             UserAccountLink.isowner,
+                             UserAccountLink.isreadwrite).\
+            filter(UserAccountLink.userid == userid).all()
+
 
 class Strategy(Base):
     __tablename__ = "strategies"
@@ -63,6 +79,18 @@ class Strategy(Base):
             filter(StrategyUserLink.userid == userid).\
             filter(StrategyUserLink.isactive == True).all()
 
+    @staticmethod
+    def getstrategyrowsforuser(session: Session, userid: int) -> List[RowMapping]:
+        """
+        Returns id, name, description and startdate of the active strategies of a user without loading Strategy
+        objects.
+        """
+        statement = select(Strategy.id, Strategy.name, Strategy.description, Strategy.startdate).\
+            join(StrategyUserLink, StrategyUserLink.strategyid == Strategy.id).\
+            where(StrategyUserLink.userid == userid).\
+            where(StrategyUserLink.isactive == True)
+        return session.execute(statement).mappings().all()
+
     @staticmethod
     def getstrategywithname(session: Session, name: str) -> 'Strategy':
         return session.query(Strategy).filter(Strategy.name == name).first()
@@ -79,7 +107,7 @@ class Strategy(Base):
     def canuserusestrategy(session: Session, userid: int, strategyid: int) -> bool:
         link = session.query(StrategyUserLink).filter(StrategyUserLink.userid == userid).\
             filter(StrategyUserLink.strategyid == strategyid).first()
-        return link.isactive
+        return link is not None and link.isactive
 
     @staticmethod
     def canusereditstrategy(session: Session, userid: int, strategyid: int) -> bool:
@@ -94,6 +122,7 @@ class StrategyUserLink(Base):
     determine which users have access to which strategies.
     """
     __tablename__ = "strategyuserlinks"
+    __table_args__ = (UniqueConstraint("userid", "strategyid", name="uq_strategyuserlink_user_strategy"),)
 
     id = Column(Integer, primary_key=True)
     userid = Column(Integer, ForeignKey("apiusers.id"))
@@ -126,6 +155,10 @@ class Account(Base):
     def getactiveaccounts(session: Session) -> List['Account']:
         return session.query(Account).filter(Account.isactive == True).all()
 
+    @staticmethod
+    def getactiveaccountids(session: Session) -> List[int]:
+        return session.execute(select(Account.id).where(Account.isactive == True).order_by(Account.id)).scalars().all()
+
     @staticmethod
     def getaccountbyaccountid(session: Session, accountid: str) -> 'Account':
         account = session.query(Account).filter(Account.accountid == accountid).first()
@@ -141,6 +174,32 @@ class Account(Base):
         accountids = [link.accountid for link in links]
         return session.query(Account).filter(Account.id.in_(accountids)).all()
 
+    @staticmethod
+    def getaccountlistingforuser(session: Session, userid: int, accountid: Optional[int] = None) -> List[RowMapping]:
+        """
+        Returns the accounts of a user together with the name of the executing strategy in one joined query. The
+        row keys are id, accountname, accountid, currency, timezone, executingstrategyid, executingstrategyname and
+        isactive.
+        :param session:
+        :param userid:
+        :param accountid: database id to only return a single account
+        :return:
+        """
+        statement = select(Account.id,
+                           Account.name.label("accountname"),
+                           Account.accountid,
+                           Account.currency,
+                           Account.timezone,
+                           Account.executingstrategy.label("executingstrategyid"),
+                           Strategy.name.label("executingstrategyname"),
+                           Account.isactive).\
+            join(UserAccountLink, UserAccountLink.accountid == Account.id).\
+            outerjoin(Strategy, Strategy.id == Account.executingstrategy).\
+            where(UserAccountLink.userid == userid)
+        if accountid is not None:
+            statement = statement.where(Account.id == accountid)
+        return session.execute(statement).mappings().all()
+
     @staticmethod
     def canusereditaccount(session: Session, userid: int, accountid: int) -> bool:
         link = session.query(UserAccountLink).filter(UserAccountLink.userid == userid).\
@@ -148,8 +207,56 @@ class Account(Base):
         return link.isadmin or link.isowner or link.isreadwrite
 
 
+class AccountChange(Base):
+    """
+    This class holds per account change counters that are bumped whenever values or positions of the account are
+    written. They are used to derive ETags without querying the data itself.
+    """
+    __tablename__ = "accountchanges"
+
+    accountdbid = Column(Integer, ForeignKey("accounts.id"), primary_key=True)
+    valuesversion = Column(Integer, nullable=False, default=0)
+    valuesupdated = Column(DateTime)
+    positionsversion = Column(Integer, nullable=False, default=0)
+    positionsupdated = Column(DateTime)
+
+    @staticmethod
+    def bump(session: Session, accountid: int, kind: str):
+        """
+        Increments the change counter of kind ("values" or "positions") for the account.
+        """
+        version = getattr(AccountChange, f"{kind}version")
+        now = datetime.utcnow().replace(microsecond=0)
+        result = session.execute(update(AccountChange).
+                                 where(AccountChange.accountdbid == accountid).
+                                 values({version: version + 1, f"{kind}updated": now}))
+        if result.rowcount == 0:
+            session.execute(insert(AccountChange).values({"accountdbid": accountid,
+                                                          f"{kind}version": 1,
+                                                          f"{kind}updated": now}))
+
+    @staticmethod
+    def getversion(session: Session, accountid: int, kind: str) -> Tuple[int, Optional[datetime]]:
+        """
+        Returns the change counter of kind ("values" or "positions") and the time of the last change.
+        """
+        row = session.execute(select(getattr(AccountChange, f"{kind}version"),
+                                     getattr(AccountChange, f"{kind}updated")).
+                              where(AccountChange.accountdbid == accountid)).first()
+        return (row[0], row[1]) if row else (0, None)
+
+    @staticmethod
+    def getversions(session: Session, accountids: List[int], kind: str) -> Dict[int, int]:
+        """
+        Returns the change counters of kind of several accounts, accounts without changes are left out.
+        """
+        return dict(session.execute(select(AccountChange.accountdbid, getattr(AccountChange, f"{kind}version")).
+                                    where(AccountChange.accountdbid.in_(accountids))).all())
+
+
 class AccountValue(Base):
     __tablename__ = "accountvalue"
+    __table_args__ = (UniqueConstraint("accountdbid", "valuedate", name="uq_accountvalue_account_date"),)
 
     id = Column(Integer, primary_key=True)
     accountdbid = Column(Integer, ForeignKey("accounts.id"), index=True)
@@ -183,9 +290,195 @@ class AccountValue(Base):
     def getaccountvaluesforstrategy(session: Session, strategyid: int) -> List['AccountValue']:
         return session.query(AccountValue).filter(AccountValue.executedstrategyid == strategyid).all()
 
+    @staticmethod
+    def upsertvalues(session: Session, values: List[dict]):
+        """
+        Inserts or updates values keyed on (accountdbid, valuedate) with multi-row upserts. Each dict holds
+        accountdbid, valuedate, value and executedstrategyid.
+        """
+        upsertrows(session=session,
+                   table=AccountValue.__table__,
+                   rows=values,
+                   keycolumns=["accountdbid", "valuedate"],
+                   updatecolumns=["value", "executedstrategyid"])
+
+    @staticmethod
+    def getvaluecolumnsforperiod(session: Session,
+                                 accountids: List[int],
+                                 startdate: date,
+                                 enddate: date) -> List[Tuple[date, float, int]]:
+        """
+        Returns (valuedate, value, accountdbid) tuples for the period without loading AccountValue objects.
+        """
+        return session.query(AccountValue.valuedate, AccountValue.value, AccountValue.accountdbid).\
+            filter(AccountValue.valuedate >= startdate).\
+            filter(AccountValue.valuedate <= enddate).\
+            filter(AccountValue.accountdbid.in_(accountids)).\
+            order_by(AccountValue.valuedate).all()
+
+    @staticmethod
+    def getlastvaluesbefore(session: Session, accountids: List[int], valuedate: date) -> List[Tuple[int, float]]:
+        """
+        Returns (accountdbid, value) tuples with the value of every account on its last day before valuedate.
+        """
+        lastdates = select(AccountValue.accountdbid, func.max(AccountValue.valuedate).label("valuedate")).\
+            where(AccountValue.accountdbid.in_(accountids)).\
+            where(AccountValue.valuedate < valuedate).\
+            group_by(AccountValue.accountdbid).subquery()
+        return session.execute(select(AccountValue.accountdbid, AccountValue.value).
+                               join(lastdates, and_(AccountValue.accountdbid == lastdates.c.accountdbid,
+                                                    AccountValue.valuedate == lastdates.c.valuedate))).all()
+
+    @staticmethod
+    def getdailytotalsforperiod(session: Session,
+                                startdate: date,
+                                enddate: date,
+                                accountids: Optional[List[int]] = None,
+                                strategyid: Optional[int] = None) -> List[Tuple[date, float]]:
+        """
+        Returns (valuedate, total) tuples with the values of the accounts, or of the values executed by the strategy,
+        summed up per day in the database.
+        """
+        statement = select(AccountValue.valuedate, func.sum(AccountValue.value)).\
+            where(AccountValue.valuedate >= startdate).\
+            where(AccountValue.valuedate <= enddate)
+        if accountids is not None:
+            statement = statement.where(AccountValue.accountdbid.in_(accountids))
+        if strategyid is not None:
+            statement = statement.where(AccountValue.executedstrategyid == strategyid)
+        return session.execute(statement.group_by(AccountValue.valuedate).order_by(AccountValue.valuedate)).all()
+
+    @staticmethod
+    def getvaluedaterange(session: Session, accountids: List[int]) -> Tuple[Optional[date], Optional[date]]:
+        """
+        Returns the first and the last valuedate of the accounts, (None, None) without values.
+        """
+        return tuple(session.execute(select(func.min(AccountValue.valuedate), func.max(AccountValue.valuedate)).
+                                     where(AccountValue.accountdbid.in_(accountids))).one())
+
+    @staticmethod
+    def getstrategydailytotalsforperiod(session: Session,
+                                        strategyid: int,
+                                        startdate: date,
+                                        enddate: date) -> List[Tuple[date, float, float]]:
+        """
+        Returns (valuedate, total, flow) tuples for the days the strategy was executed. total sums up the values of
+        the accounts executing the strategy that day. flow is the value of accounts that started executing it that
+        day minus the previous value of accounts that stopped, so they are not counted as performance. Uses window
+        functions, which need MySQL 8.0 or SQLite 3.25.
+        """
+        strategyaccounts = select(AccountValue.accountdbid).\
+            where(AccountValue.executedstrategyid == strategyid).distinct()
+        window = {"partition_by": AccountValue.accountdbid, "order_by": AccountValue.valuedate}
+        rows = select(AccountValue.valuedate,
+                      AccountValue.value,
+                      func.coalesce(AccountValue.executedstrategyid, 0).label("strategyid"),
+                      func.coalesce(func.lag(AccountValue.executedstrategyid).over(**window), 0).
+                      label("priorstrategyid"),
+                      func.lag(AccountValue.value).over(**window).label("priorvalue")).\
+            where(AccountValue.accountdbid.in_(strategyaccounts)).\
+            where(AccountValue.valuedate <= enddate).subquery()
+
+        executing = rows.c.strategyid == strategyid
+        executedbefore = rows.c.priorstrategyid == strategyid
+        total = func.sum(case((executing, rows.c.value), else_=0.0))
+        flow = func.sum(case((and_(executing, ~executedbefore), rows.c.value),
+                             (and_(~executing, executedbefore), -rows.c.priorvalue),
+                             else_=0.0))
+        statement = select(rows.c.valuedate, total, flow).\
+            where(rows.c.valuedate >= startdate).\
+            where(or_(executing, executedbefore)).\
+            group_by(rows.c.valuedate).\
+            having(func.sum(case((executing, 1), else_=0)) > 0).\
+            order_by(rows.c.valuedate)
+        return session.execute(statement).all()
+
+
+class AccountPerformance(Base):
+    """
+    This class represents the persisted daily performance series of an account. Each row holds the summed value for
+    the day, the transactions included in performance and the cumulative performance index since the first value of
+    the account. Rows are maintained by supporting.performanceseries.PerformanceSeries.
+    """
+    __tablename__ = "accountperformance"
+    __table_args__ = (UniqueConstraint("accountdbid", "valuedate", name="uq_accountperformance_account_date"),)
+
+    id = Column(Integer, primary_key=True)
+    accountdbid = Column(Integer, ForeignKey("accounts.id"), nullable=False)
+    valuedate = Column(Date, nullable=False)
+    value = Column(Float, nullable=False)
+    transactionvalue = Column(Float, nullable=False, default=0.0)
+    dayperformance = Column(Float, nullable=False)
+    cumulativeperformance = Column(Float, nullable=False)
+
+    @staticmethod
+    def getseriesforperiod(session: Session,
+                           accountid: int,
+                           startdate: date,
+                           enddate: date) -> List[Tuple[date, float, float, float, float]]:
+        """
+        Returns (valuedate, value, transactionvalue, dayperformance, cumulativeperformance) tuples for the period.
+        """
+        statement = select(AccountPerformance.valuedate,
+                           AccountPerformance.value,
+                           AccountPerformance.transactionvalue,
+                           AccountPerformance.dayperformance,
+                           AccountPerformance.cumulativeperformance).\
+            where(AccountPerformance.accountdbid == accountid).\
+            where(AccountPerformance.valuedate >= startdate).\
+            where(AccountPerformance.valuedate <= enddate).\
+            order_by(AccountPerformance.valuedate)
+        return session.execute(statement).all()
+
+    @staticmethod
+    def getlastbeforedate(session: Session, accountid: int, valuedate: date) -> Optional['AccountPerformance']:
+        return session.query(AccountPerformance).\
+            filter(AccountPerformance.accountdbid == accountid).\
+            filter(AccountPerformance.valuedate < valuedate).\
+            order_by(AccountPerformance.valuedate.desc()).first()
+
+    @staticmethod
+    def getseriesforaccounts(session: Session,
+                             accountids: List[int],
+                             startdate: date,
+                             enddate: date) -> List[Tuple[int, date, float, float, float, float]]:
+        """
+        Returns (accountdbid, valuedate, value, transactionvalue, dayperformance, cumulativeperformance) tuples for the
+        period ordered by account and date.
+        """
+        statement = select(AccountPerformance.accountdbid,
+                           AccountPerformance.valuedate,
+                           AccountPerformance.value,
+                           AccountPerformance.transactionvalue,
+                           AccountPerformance.dayperformance,
+                           AccountPerformance.cumulativeperformance).\
+            where(AccountPerformance.accountdbid.in_(accountids)).\
+            where(AccountPerformance.valuedate >= startdate).\
+            where(AccountPerformance.valuedate <= enddate).\
+            order_by(AccountPerformance.accountdbid, AccountPerformance.valuedate)
+        return session.execute(statement).all()
+
+    @staticmethod
+    def getaccountswithseries(session: Session, accountids: List[int]) -> List[int]:
+        return session.execute(select(AccountPerformance.accountdbid).
+                               where(AccountPerformance.accountdbid.in_(accountids)).distinct()).scalars().all()
+
+    @staticmethod
+    def hasseries(session: Session, accountid: int) -> bool:
+        return session.query(AccountPerformance.id).\
+            filter(AccountPerformance.accountdbid == accountid).first() is not None
+
+    @staticmethod
+    def deletefromdate(session: Session, accountid: int, fromdate: Optional[date]):
+        query = session.query(AccountPerformance).filter(AccountPerformance.accountdbid == accountid)
+        if fromdate:
+            query = query.filter(AccountPerformance.valuedate >= fromdate)
+        query.delete(synchronize_session=False)
+
 
 class PortfolioValue(Base):
     __tablename__ = "portfoliovalue"
+    __table_args__ = (Index("ix_portfoliovalue_valuedate", "valuedate"),)
 
     id = Column(Integer, primary_key=True)
     valuedate = Column(Date, nullable=False)
@@ -216,9 +509,78 @@ class PortfolioValue(Base):
             session.add(dbobj)
         return dbobj
 
+    @staticmethod
+    def getlastvaluedate(session: Session) -> Optional[date]:
+        return session.execute(select(func.max(PortfolioValue.valuedate))).scalar()
+
+    @staticmethod
+    def replacetotalsforperiod(session: Session, startdate: date, enddate: date, totals: List[Tuple[date, float]]):
+        """
+        Makes the days of the period hold exactly the (valuedate, totalvalue) tuples of totals. Existing days are
+        updated and new ones inserted in one executemany each, days missing from totals are deleted. shareprice and
+        performance of updated days are kept until the unit pricing recomputes them.
+        """
+        existing = dict(session.execute(select(PortfolioValue.valuedate, PortfolioValue.id).
+                                        where(PortfolioValue.valuedate >= startdate).
+                                        where(PortfolioValue.valuedate <= enddate)).all())
+        updates, inserts = [], []
+        for valuedate, totalvalue in totals:
+            if valuedate in existing:
+                updates.append({"id": existing.pop(valuedate), "totalvalue": totalvalue})
+            else:
+                inserts.append({"valuedate": valuedate, "totalvalue": totalvalue})
+        if updates:
+            session.execute(update(PortfolioValue), updates)
+        if inserts:
+            session.execute(insert(PortfolioValue), inserts)
+        if existing:
+            session.execute(delete(PortfolioValue).where(PortfolioValue.id.in_(existing.values())))
+
+    @staticmethod
+    def getlastpricedbefore(session: Session, valuedate: Optional[date]) -> Optional[Tuple[date, float, float]]:
+        """
+        Returns (valuedate, totalvalue, shareprice) of the last day with a share price before valuedate, or of the
+        last day with a share price at all if valuedate is None.
+        """
+        statement = select(PortfolioValue.valuedate, PortfolioValue.totalvalue, PortfolioValue.shareprice).\
+            where(PortfolioValue.shareprice.isnot(None))
+        if valuedate is not None:
+            statement = statement.where(PortfolioValue.valuedate < valuedate)
+        return session.execute(statement.order_by(PortfolioValue.valuedate.desc()).limit(1)).first()
+
+    @staticmethod
+    def getvaluecolumnsafter(session: Session, valuedate: Optional[date]) -> List[Tuple[int, date, float]]:
+        """
+        Returns (id, valuedate, totalvalue) tuples of the days after valuedate, or of all days if valuedate is None.
+        """
+        statement = select(PortfolioValue.id, PortfolioValue.valuedate, PortfolioValue.totalvalue)
+        if valuedate is not None:
+            statement = statement.where(PortfolioValue.valuedate > valuedate)
+        return session.execute(statement.order_by(PortfolioValue.valuedate)).all()
+
+    @staticmethod
+    def getsharepricesforperiod(session: Session, startdate: date, enddate: date) -> List[Tuple[date, float]]:
+        return session.execute(select(PortfolioValue.valuedate, PortfolioValue.shareprice).
+                               where(PortfolioValue.valuedate >= startdate).
+                               where(PortfolioValue.valuedate <= enddate).
+                               where(PortfolioValue.shareprice.isnot(None)).
+                               order_by(PortfolioValue.valuedate)).all()
+
+    @staticmethod
+    def updateprices(session: Session, prices: List[dict]):
+        """
+        Sets shareprice and performance of many days in one executemany, each dict holds id, shareprice and
+        performance.
+        """
+        if prices:
+            session.execute(update(PortfolioValue), prices)
+
 
 class Position(Base):
     __tablename__ = "positions"
+    __table_args__ = (UniqueConstraint("accountid", "brokerpositionid", name="uq_position_account_brokerposition"),
+                      Index("ix_position_account_status", "accountid", "status"),
+                      Index("ix_position_account_entry", "accountid", "entrydatetime"))
 
     id = Column(Integer, primary_key=True)
     accountid = Column(Integer, ForeignKey("accounts.id"), index=True)
@@ -260,9 +622,88 @@ class Position(Base):
             filter(Position.accountid == accountid).\
             filter(Position.brokerpositionid == brokerpositionid).first()
 
+    @staticmethod
+    def getpositionsselect(accountid: int,
+                           status: Optional[str] = None,
+                           instrumentname: Optional[str] = None,
+                           startdatetime: Optional[datetime] = None,
+                           enddatetime: Optional[datetime] = None,
+                           after: Optional[Tuple[datetime, int]] = None) -> Select:
+        """
+        Returns a select of the position columns of an account ordered by (entrydatetime, id). Positions without
+        entrydatetime sort first, as MySQL and SQLite order NULL before any value.
+        :param accountid:
+        :param status:
+        :param instrumentname:
+        :param startdatetime: earliest entrydatetime, inclusive
+        :param enddatetime: latest entrydatetime, exclusive
+        :param after: (entrydatetime, id) of the last position of the previous page, entrydatetime may be None
+        :return:
+        """
+        statement = select(*Position.__table__.columns).where(Position.accountid == accountid)
+        if status:
+            statement = statement.where(Position.status == status)
+        if instrumentname:
+            statement = statement.where(Position.instrumentname == instrumentname)
+        if startdatetime:
+            statement = statement.where(Position.entrydatetime >= startdatetime)
+        if enddatetime:
+            statement = statement.where(Position.entrydatetime < enddatetime)
+        if after and after[0] is None:
+            statement = statement.where(or_(Position.entrydatetime.isnot(None),
+                                            and_(Position.entrydatetime.is_(None), Position.id > after[1])))
+        elif after:
+            statement = statement.where(or_(Position.entrydatetime > after[0],
+                                            and_(Position.entrydatetime == after[0], Position.id > after[1])))
+        return statement.order_by(Position.entrydatetime, Position.id)
+
+    @staticmethod
+    def getpositionidsforbrokerids(session: Session, accountid: int, brokerpositionids: List[str]) -> Dict[str, int]:
+        """
+        Returns a dict of brokerpositionid to database id for the positions of the account that already exist.
+        """
+        rows = session.query(Position.brokerpositionid, Position.id).\
+            filter(Position.accountid == accountid).\
+            filter(Position.brokerpositionid.in_(brokerpositionids)).all()
+        return {brokerpositionid: dbid for brokerpositionid, dbid in rows}
+
+    @staticmethod
+    def upsertpositions(session: Session, accountid: int, positions: List[dict]) -> Dict[str, str]:
+        """
+        Inserts or updates a batch of positions for an account with one lookup query and one executemany per
+        operation. Each dict holds the Position columns and must contain brokerpositionid, brokerpositionids must be
+        unique within the batch.
+        :return: dict of brokerpositionid to "created" or "updated"
+        """
+        if not positions:
+            return {}
+
+        existing = Position.getpositionidsforbrokerids(session=session,
+                                                       accountid=accountid,
+                                                       brokerpositionids=[x['brokerpositionid'] for x in positions])
+        inserts = []
+        updates = []
+        for position in positions:
+            row = dict(position, accountid=accountid)
+            if row['brokerpositionid'] in existing:
+                row['id'] = existing[row['brokerpositionid']]
+                updates.append(row)
+            else:
+                inserts.append(row)
+
+        if inserts:
+            session.execute(insert(Position), inserts)
+        if updates:
+            session.execute(update(Position), updates)
+
+        return {x['brokerpositionid']: "updated" if x['brokerpositionid'] in existing else "created"
+                for x in positions}
+
 
 class AccountTransaction(Base):
     __tablename__ = "accounttransactions"
+    __table_args__ = (Index("ix_accounttransaction_account_datetime", "accountdbid", "transactiondatetime"),
+                      Index("ix_accounttransaction_investor_datetime", "investor", "transactiondatetime"))
 
     id = Column(Integer, primary_key=True)
     accountdbid = Column(Integer, ForeignKey('accounts.id'))
@@ -310,6 +751,116 @@ class AccountTransaction(Base):
             filter(AccountTransaction.transactiondatetime <= enddate). \
             filter(AccountTransaction.accountdbid.in_(accountids)).all()
 
+    @staticmethod
+    def getperformancetransactioncolumnsforperiod(session: Session,
+                                                  startdate: date,
+                                                  enddate: date,
+                                                  accountids: List[int]) -> List[Tuple[datetime, float, int]]:
+        """
+        Returns (transactiondatetime, value, accountdbid) tuples for the transactions that should be included in
+        performance calculations. The enddate is inclusive for the whole day.
+        """
+        return session.query(AccountTransaction.transactiondatetime,
+                             AccountTransaction.value,
+                             AccountTransaction.accountdbid). \
+            filter(AccountTransaction.transactiondatetime >= startdate). \
+            filter(AccountTransaction.transactiondatetime < enddate + timedelta(days=1)). \
+            filter(AccountTransaction.accountdbid.in_(accountids)). \
+            filter(AccountTransaction.includeinperformance == True). \
+            filter(AccountTransaction.internaltransaction.isnot(True)). \
+            filter(AccountTransaction.sharedtransaction.isnot(True)).all()
+
+    @staticmethod
+    def getperformancetransactiontotalsforperiod(session: Session,
+                                                 startdate: date,
+                                                 enddate: date,
+                                                 accountids: List[int]) -> List[Tuple[date, float]]:
+        """
+        Returns (transactiondate, total) tuples with the transactions included in performance summed up per day in the
+        database.
+        """
+        transactiondate = func.date(AccountTransaction.transactiondatetime, type_=Date)
+        return session.execute(select(transactiondate, func.sum(AccountTransaction.value)).
+                               where(AccountTransaction.transactiondatetime >= startdate).
+                               where(AccountTransaction.transactiondatetime < enddate + timedelta(days=1)).
+                               where(AccountTransaction.accountdbid.in_(accountids)).
+                               where(AccountTransaction.includeinperformance == True).
+                               where(AccountTransaction.internaltransaction.isnot(True)).
+                               where(AccountTransaction.sharedtransaction.isnot(True)).
+                               group_by(transactiondate).
+                               order_by(transactiondate)).all()
+
+    @staticmethod
+    def getperformancetransactiontotalsforstrategy(session: Session,
+                                                   strategyid: int,
+                                                   startdate: date,
+                                                   enddate: date) -> List[Tuple[date, float]]:
+        """
+        Returns (transactiondate, total) tuples with the transactions included in performance of accounts on days they
+        executed the strategy, summed up per day in the database.
+        """
+        transactiondate = func.date(AccountTransaction.transactiondatetime, type_=Date)
+        return session.execute(select(transactiondate, func.sum(AccountTransaction.value)).
+                               join(AccountValue, and_(AccountValue.accountdbid == AccountTransaction.accountdbid,
+                                                       AccountValue.valuedate == transactiondate)).
+                               where(AccountValue.executedstrategyid == strategyid).
+                               where(AccountTransaction.transactiondatetime >= startdate).
+                               where(AccountTransaction.transactiondatetime < enddate + timedelta(days=1)).
+                               where(AccountTransaction.includeinperformance == True).
+                               where(AccountTransaction.internaltransaction.isnot(True)).
+                               where(AccountTransaction.sharedtransaction.isnot(True)).
+                               group_by(transactiondate).
+                               order_by(transactiondate)).all()
+
+    @staticmethod
+    def getinvestortransactioncolumnsafter(session: Session,
+                                           valuedate: Optional[date]) -> List[Tuple[int, datetime, float]]:
+        """
+        Returns (id, transactiondatetime, value) tuples of the investor transactions on days after valuedate, or of
+        all investor transactions if valuedate is None.
+        """
+        statement = select(AccountTransaction.id, AccountTransaction.transactiondatetime, AccountTransaction.value).\
+            where(AccountTransaction.investor.isnot(None))
+        if valuedate is not None:
+            statement = statement.where(AccountTransaction.transactiondatetime >= valuedate + timedelta(days=1))
+        return session.execute(statement.order_by(AccountTransaction.transactiondatetime)).all()
+
+    @staticmethod
+    def updatesharestraded(session: Session, shares: List[dict]):
+        """
+        Sets sharestraded of many transactions in one executemany, each dict holds id and sharestraded.
+        """
+        if shares:
+            session.execute(update(AccountTransaction), shares)
+
+    @staticmethod
+    def getinvestorholdings(session: Session) -> List[Tuple[int, float, float, float]]:
+        """
+        Returns (investor, shares, boughtvalue, boughtshares) tuples summed up per investor in the database over the
+        transactions with sharestraded set.
+        """
+        bought = AccountTransaction.sharestraded > 0
+        return session.execute(select(AccountTransaction.investor,
+                                      func.sum(AccountTransaction.sharestraded),
+                                      func.sum(case((bought, AccountTransaction.value), else_=0.0)),
+                                      func.sum(case((bought, AccountTransaction.sharestraded), else_=0.0))).
+                               where(AccountTransaction.investor.isnot(None)).
+                               where(AccountTransaction.sharestraded.isnot(None)).
+                               group_by(AccountTransaction.investor)).all()
+
+    @staticmethod
+    def getsharestradedforinvestor(session: Session, investorid: int, enddate: date) -> List[Tuple[date, float]]:
+        """
+        Returns (transactiondate, shares) tuples with the shares the investor traded summed up per day.
+        """
+        transactiondate = func.date(AccountTransaction.transactiondatetime, type_=Date)
+        return session.execute(select(transactiondate, func.sum(AccountTransaction.sharestraded)).
+                               where(AccountTransaction.investor == investorid).
+                               where(AccountTransaction.sharestraded.isnot(None)).
+                               where(AccountTransaction.transactiondatetime < enddate + timedelta(days=1)).
+                               group_by(transactiondate).
+                               order_by(transactiondate)).all()
+
     @staticmethod
     def gettransactionsbyinvestor(session: Session, investorid: int) -> List['AccountTransaction']:
         return session.query(AccountTransaction).\
@@ -330,3 +881,36 @@ class Investor(Base):
     @staticmethod
     def getallinvestors(session: Session) -> List['Investor']:
         return session.query(Investor).all()
+
+    @staticmethod
+    def updateholdings(session: Session, holdings: List[dict]):
+        """
+        Sets noofshares, averageacquisitioncost and netassetvalue of many investors in one executemany, each dict
+        holds id and the three values.
+        """
+        if holdings:
+            session.execute(update(Investor), holdings)
+
+
+class SchemaVersion(Base):
+    """
+    This class holds the version of the last migration from db/migrations.py applied to the database.
+    """
+    __tablename__ = "schemaversion"
+
+    id = Column(Integer, primary_key=True)
+    version = Column(Integer, nullable=False)
+    appliedat = Column(DateTime, nullable=False)
+
+    @staticmethod
+    def getversion(session: Session) -> int:
+        return session.execute(select(SchemaVersion.version)).scalar_one_or_none() or 0
+
+    @staticmethod
+    def setversion(session: Session, version: int):
+        versionobj = session.get(SchemaVersion, 1)
+        if versionobj is None:
+            versionobj = SchemaVersion(id=1)
+            session.add(versionobj)
+        versionobj.version = version
+        versionobj.appliedat = datetime.utcnow()
@@ -0,0 +1,87 @@
+import logging
+from itertools import count
+from threading import Lock
+from time import monotonic
+from typing import Dict, Iterator, List, Optional
+from sqlalchemy.engine import Engine
+from sqlalchemy import event
+from sqlalchemy.exc import DBAPIError, InvalidRequestError
+from sqlalchemy.orm import Session, sessionmaker
+
+
+class ReplicaRouter:
+    """
+    Hands out read-only sessions on the replica engines in round-robin order. A replica that fails to connect is
+    skipped for retryseconds and the next one is tried, when no replica is reachable the session uses the primary.
+
+    Users that wrote within stickyseconds read from the primary so they see their own writes despite replication lag.
+    The writes are remembered per process, so this only holds for requests served by the same gunicorn worker.
+    """
+    def __init__(self, primary: Engine, replicas: List[Engine], retryseconds: float, stickyseconds: float):
+        self.primary = primary
+        self.replicas = replicas
+        self.retryseconds = retryseconds
+        self.stickyseconds = stickyseconds
+        self._primarysession = sessionmaker(bind=primary, expire_on_commit=False, info={"readonly": True})
+        self._replicasessions = {x: sessionmaker(bind=x, expire_on_commit=False, info={"readonly": True})
+                                 for x in replicas}
+        self._next = count()
+        self._downuntil: Dict[Engine, float] = dict()
+        self._recentwriters: Dict[int, float] = dict()
+        self._lock = Lock()
+
+    @property
+    def engines(self) -> List[Engine]:
+        return [self.primary] + self.replicas
+
+    def readonlysession(self, userid: Optional[int] = None) -> Session:
+        """
+        Returns a session for reads, on a healthy replica unless userid wrote recently or no replica is reachable.
+        The session is connected already, so a failing replica is noticed here and not in the middle of a request.
+        """
+        if userid is not None and self.wrotelately(userid):
+            return self._primarysession()
+
+        for engine in self._candidates():
+            session = self._replicasessions[engine]()
+            try:
+                session.connection()
+                return session
+            except DBAPIError as e:
+                session.close()
+                self.markdown(engine, e)
+        return self._primarysession()
+
+    def _candidates(self) -> Iterator[Engine]:
+        if not self.replicas:
+            return
+        start = next(self._next)
+        now = monotonic()
+        for offset in range(len(self.replicas)):
+            engine = self.replicas[(start + offset) % len(self.replicas)]
+            if self._downuntil.get(engine, 0.0) <= now:
+                yield engine
+
+    def markdown(self, engine: Engine, error: Exception):
+        logging.warning(f"Read replica {engine.url.render_as_string(hide_password=True)} unavailable for "
+                        f"{self.retryseconds} s: {error}")
+        with self._lock:
+            self._downuntil[engine] = monotonic() + self.retryseconds
+
+    def recordwrite(self, userid: int):
+        now = monotonic()
+        with self._lock:
+            self._recentwriters[userid] = now + self.stickyseconds
+            # Keep the dict from growing with users that stopped writing
+            if len(self._recentwriters) > 10000:
+                self._recentwriters = {x: y for x, y in self._recentwriters.items() if y > now}
+
+    def wrotelately(self, userid: int) -> bool:
+        return self._recentwriters.get(userid, 0.0) > monotonic()
+
+
+@event.listens_for(Session, "before_flush")
+def _preventreadonlywrites(session: Session, flushcontext, instances):
+    # Read-only sessions on the primary would accept writes that fail once replicas are configured
+    if session.info.get("readonly") and (session.new or session.dirty or session.deleted):
+        raise InvalidRequestError("Read-only session can not write, use db.Session for writes")
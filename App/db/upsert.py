@@ -0,0 +1,38 @@
+from typing import List
+from sqlalchemy import Table
+from sqlalchemy.orm import Session
+
+# Number of rows per multi-row INSERT statement, keeps statements below max_allowed_packet
+upsertchunksize = 1000
+
+
+def upsertrows(session: Session, table: Table, rows: List[dict], keycolumns: List[str], updatecolumns: List[str]):
+    """
+    Inserts rows with multi-row INSERT statements and updates updatecolumns of rows that already exist. keycolumns
+    must be covered by a unique constraint on the table. Uses ON DUPLICATE KEY UPDATE on MySQL and
+    ON CONFLICT DO UPDATE on SQLite and PostgreSQL.
+    :param session:
+    :param table:
+    :param rows: dicts with the same keys, at most one row per key
+    :param keycolumns: columns of the unique constraint
+    :param updatecolumns: columns that are overwritten when the row exists
+    :return:
+    """
+    dialect = session.get_bind().dialect.name
+    if dialect == "mysql":
+        from sqlalchemy.dialects.mysql import insert
+    elif dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    elif dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        raise NotImplementedError(f"Upsert is not supported for {dialect}")
+
+    for start in range(0, len(rows), upsertchunksize):
+        statement = insert(table).values(rows[start:start + upsertchunksize])
+        if dialect == "mysql":
+            statement = statement.on_duplicate_key_update({x: statement.inserted[x] for x in updatecolumns})
+        else:
+            statement = statement.on_conflict_do_update(index_elements=keycolumns,
+                                                        set_={x: statement.excluded[x] for x in updatecolumns})
+        session.execute(statement)
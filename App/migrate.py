@@ -0,0 +1,27 @@
+"""
+Brings the schema of the configured database up to date, run before starting a new version of the API:
+
+    python migrate.py            applies missing migrations
+    python migrate.py current    prints the schema version of the database
+    python migrate.py deleteduplicates
+                                 deletes rows that keep a unique key from being added, all but the one with the
+                                 highest id of each key
+"""
+import logging
+import sys
+from db import db
+from db import migrations
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    command = sys.argv[1] if len(sys.argv) > 1 else "upgrade"
+    if command == "current":
+        print(f"Schema version {migrations.currentversion(db.engine)} of {len(migrations.migrations)}")
+    elif command == "upgrade":
+        applied = migrations.upgrade(db.engine)
+        print(f"Applied {len(applied)} migrations, schema version {migrations.currentversion(db.engine)}")
+    elif command == "deleteduplicates":
+        deleted = migrations.deleteduplicates(db.engine)
+        print(f"Deleted {sum(deleted.values())} duplicate rows")
+    else:
+        raise SystemExit(__doc__)
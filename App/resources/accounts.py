@@ -1,7 +1,8 @@
 from flask_restful import Resource, reqparse
 from db.models import Account, Strategy, UserAccountLink, StrategyUserLink
 from flask_jwt_extended import get_jwt_identity, jwt_required
-from resources.helpers import sessionhandler, useraccountrightsneeded
+from resources.helpers import sessionhandler, useraccountrightsneeded, rowtodict
+from supporting.accountaccesscache import accountaccesscache
 from dateutil.tz import gettz
 
 
@@ -9,9 +10,9 @@ class Accounts(Resource):
     @jwt_required()
     @sessionhandler
     def get(self, session):
-        accounts = Account.getaccountsbyuserid(session=session, userid=get_jwt_identity())
+        accounts = Account.getaccountlistingforuser(session=session, userid=get_jwt_identity())
 
-        return [self._returndictforaccount(session=session, account=x) for x in accounts]
+        return [rowtodict(x) for x in accounts]
 
     @jwt_required()
     @sessionhandler
@@ -40,8 +41,11 @@ class Accounts(Resource):
             account.isactive = bool(data['isactive'])
 
         session.commit()
+        accountaccesscache.invalidate(userid=get_jwt_identity())
 
-        return self._returndictforaccount(session=session, account=account)
+        return rowtodict(Account.getaccountlistingforuser(session=session,
+                                                          userid=get_jwt_identity(),
+                                                          accountid=account.id)[0])
 
     @jwt_required()
     @sessionhandler
@@ -59,10 +63,9 @@ class Accounts(Resource):
         newaccount.name = data['accountname']
         newaccount.accountid = data['accountid']
         newaccount.currency = data['currency']
-        try:
-            newaccount.timezone = gettz(data['timezone'])
-        except ValueError:
+        if gettz(data['timezone']) is None:
             return {"message": "Invalid timezone"}, 400
+        newaccount.timezone = data['timezone']
         newaccount.executingstrategy = data['executingstrategyid']
         newaccount.isactive = True
 
@@ -78,20 +81,8 @@ class Accounts(Resource):
         session.add(newlink)
 
         session.commit()
+        accountaccesscache.invalidate(userid=get_jwt_identity())
 
-        return self._returndictforaccount(session=session, account=newaccount)
-
-    @staticmethod
-    def _returndictforaccount(session, account: Account) -> dict:
-        strategy = Strategy.getstrategywithid(session=session, id=account.executingstrategy)
-
-        return {
-            "id": account.id,
-            "accountname": account.name,
-            "accountid": account.accountid,
-            "currency": account.currency,
-            "timezone": account.timezone,
-            "executingstrategyid": account.executingstrategy,
-            "executingstrategyname": strategy.name if strategy else None,
-            "isactive": account.isactive
-        }
+        return rowtodict(Account.getaccountlistingforuser(session=session,
+                                                          userid=get_jwt_identity(),
+                                                          accountid=newaccount.id)[0])
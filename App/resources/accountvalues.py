@@ -1,37 +1,111 @@
 import datetime
+from flask import request
 from flask_restful import Resource, reqparse
-from db.models import Account, AccountValue
+from db.models import Account, AccountValue, Strategy
 from flask_jwt_extended import get_jwt_identity, jwt_required
-from resources.helpers import sessionhandler, useraccountrightsneeded
+from resources.helpers import sessionhandler, useraccountrightsneeded, conditionalget, singleflight
 from dateutil.parser import parse
 from dateutil.tz import gettz
-from supporting.performancecalculator import PerformanceCalculator
+from supporting.performanceseries import PerformanceSeries
+from supporting.performancecalculator import PerformanceCalculator, RESOLUTIONS
+from supporting.performanceanalytics import PerformanceAnalytics
+from supporting.accountaccesscache import accountaccesscache
 
 
 class AccountValues(Resource):
     @jwt_required()
+    def get(self):
+        """
+        Returns the values and performance of one account given by accountid, or of several accounts given by
+        accountids as a comma separated list or "all" for every account of the user. resolution reduces the days to
+        the last day of every week or month, "weekly" or "monthly", or to at most a number of days, the first day of
+        the range is always returned.
+        """
+        if request.args.get("accountids"):
+            return self._getaccounts()
+        return self._getaccount()
+
     @sessionhandler
     @useraccountrightsneeded()
-    def get(self, session, account):
+    @conditionalget("values")
+    @singleflight
+    def _getaccount(self, session, account):
         parser = reqparse.RequestParser()
         parser.add_argument("startdate", required=False, type=str, location="args")
         parser.add_argument("enddate", required=False, type=str, location="args")
+        parser.add_argument("resolution", required=False, type=str, location="args", default="daily")
+
+        data = parser.parse_args()
+
+        try:
+            resolution = self._resolutionfromstring(data['resolution'])
+        except ValueError:
+            return {"message": "resolution must be daily, weekly, monthly or a number of days of at least 2"}, 400
+
+        df = PerformanceSeries.getperformanceforperiod(session=session,
+                                                       accountid=account.id,
+                                                       startdate=parse(data['startdate']).date(),
+                                                       enddate=parse(data['enddate']).date())
+        if df.empty:
+            return []
+
+        return self._valuesfromframe(df=df, resolution=resolution)
+
+    @sessionhandler
+    def _getaccounts(self, session):
+        parser = reqparse.RequestParser()
+        parser.add_argument("accountids", required=True, type=str, location="args")
+        parser.add_argument("startdate", required=True, type=str, location="args")
+        parser.add_argument("enddate", required=True, type=str, location="args")
+        parser.add_argument("resolution", required=False, type=str, location="args", default="daily")
 
         data = parser.parse_args()
 
-        values = AccountValue.getaccountvalueforperiod(
-            session=session,
-            accountid=account.id,
-            startdate=parse(data['startdate']),
-            enddate=parse(data['enddate'])
-        )
+        try:
+            resolution = self._resolutionfromstring(data['resolution'])
+        except ValueError:
+            return {"message": "resolution must be daily, weekly, monthly or a number of days of at least 2"}, 400
 
-        df = PerformanceCalculator.calculateperformancefromaccountvalues(session=session, accountvalues=values)
-        df = df.reset_index()
-        df['valuedate'] = df['valuedate'].apply(lambda x: x.strftime('%Y-%m-%d'))
-        df["rangeperformance"] -= 1.0
+        rights = accountaccesscache.getaccounts(session=session, userid=get_jwt_identity())
+        if data['accountids'] == "all":
+            accountids = sorted(rights)
+        else:
+            try:
+                accountids = list(dict.fromkeys(int(x) for x in data['accountids'].split(",")))
+            except ValueError:
+                return {"message": "accountids must be a comma separated list of ids or all"}, 400
+            notfound = [x for x in accountids if x not in rights]
+            if notfound:
+                return {"message": "Account not found", "accountids": notfound}, 404
 
-        return df[["valuedate", "value", "rangeperformance"]].to_dict(orient="records")
+        frames = PerformanceSeries.getperformanceforaccounts(session=session,
+                                                             accountids=accountids,
+                                                             startdate=parse(data['startdate']).date(),
+                                                             enddate=parse(data['enddate']).date())
+        values = {x: [] for x in accountids}
+        for accountid, df in frames.items():
+            values[accountid] = self._valuesfromframe(df=df, resolution=resolution)
+
+        return [{"accountid": x, "values": y} for x, y in values.items()]
+
+    @staticmethod
+    def _resolutionfromstring(resolution: str):
+        if resolution == "daily" or resolution in RESOLUTIONS:
+            return resolution
+        maxpoints = int(resolution)
+        if maxpoints < 2:
+            raise ValueError("At least 2 days are needed")
+        return maxpoints
+
+    @staticmethod
+    def _valuesfromframe(df, resolution) -> list:
+        df = PerformanceCalculator.resampleperformance(df=df, resolution=resolution)
+        # Plain lists with the dates formatted at once, DataFrame.to_dict and per row strftime are several times slower
+        return [{"valuedate": valuedate, "value": value, "rangeperformance": rangeperformance}
+                for valuedate, value, rangeperformance in
+                zip(df.index.strftime('%Y-%m-%d').tolist(),
+                    df['value'].tolist(),
+                    (df['rangeperformance'] - 1.0).tolist())]
 
     @jwt_required()
     @sessionhandler
@@ -53,3 +127,120 @@ class AccountValues(Resource):
         session.commit()
 
         return {"message": "Value updated"}, 200
+
+
+class AccountValuesAnalytics(Resource):
+    @jwt_required()
+    @sessionhandler
+    @useraccountrightsneeded()
+    @conditionalget("values")
+    @singleflight
+    def get(self, session, account):
+        """
+        Returns risk and return figures of an account for a period: total and annualized return, volatility, Sharpe
+        and Sortino ratios, maximum drawdown, best and worst days and a summary of the rolling returns over windows
+        given in days as a comma separated list. riskfreerate is the annual rate the ratios are measured against.
+        """
+        parser = reqparse.RequestParser()
+        parser.add_argument("startdate", required=True, type=str, location="args")
+        parser.add_argument("enddate", required=True, type=str, location="args")
+        parser.add_argument("windows", required=False, type=str, location="args", default="21,63,252")
+        parser.add_argument("riskfreerate", required=False, type=float, location="args", default=0.0)
+
+        data = parser.parse_args()
+
+        try:
+            windows = self._windowsfromstring(data['windows'])
+        except ValueError:
+            return {"message": "windows must be a comma separated list of positive numbers of days"}, 400
+
+        result = PerformanceAnalytics.getanalyticsforperiod(session=session,
+                                                            accountid=account.id,
+                                                            startdate=parse(data['startdate']).date(),
+                                                            enddate=parse(data['enddate']).date(),
+                                                            windows=windows,
+                                                            riskfreerate=data['riskfreerate'])
+        if result is None:
+            return {"message": "No values for account in period"}, 404
+        return result
+
+    @staticmethod
+    def _windowsfromstring(windows: str) -> list:
+        windows = list(dict.fromkeys(int(x) for x in windows.split(",") if x.strip()))
+        if any(x <= 0 for x in windows):
+            raise ValueError("Window lengths must be positive")
+        return windows
+
+
+class AccountValuesBackfill(Resource):
+    @jwt_required()
+    @sessionhandler
+    def post(self, session):
+        """
+        Writes historical values for one or many accounts in one transaction. The body holds a list of values with
+        accountid, valuedate, value and optionally executedstrategyid. accountid can be given once at the top level
+        when all values belong to the same account. executedstrategyid must be a strategy the user can use. Existing
+        values for the same account and date are overwritten.
+        """
+        body = request.get_json(silent=True)
+        if not isinstance(body, dict) or not isinstance(body.get('values'), list):
+            return {"message": "values must be a list"}, 400
+
+        rows = dict()
+        errors = []
+        for index, item in enumerate(body['values']):
+            try:
+                row = self._valuerowfromdict(item, defaultaccountid=body.get('accountid'))
+            except (KeyError, TypeError, ValueError, OverflowError) as e:
+                errors.append({"index": index, "message": f"Invalid value: {e}"})
+                continue
+            rows[(row['accountdbid'], row['valuedate'])] = row
+        if errors:
+            return {"message": "Invalid values", "errors": errors}, 400
+        if not rows:
+            return {"message": "No values given"}, 400
+
+        accountids = set(x['accountdbid'] for x in rows.values())
+        rights = accountaccesscache.getaccounts(session=session, userid=get_jwt_identity())
+        notallowed = set(x for x in accountids if x not in rights or not rights[x].canedit)
+        if notallowed:
+            return {"message": "User not allowed to edit accounts", "accountids": sorted(notallowed)}, 403
+
+        strategyids = set(x['executedstrategyid'] for x in rows.values() if x['executedstrategyid'] is not None)
+        notallowed = set(x for x in strategyids
+                         if not Strategy.canuserusestrategy(session=session, userid=get_jwt_identity(), strategyid=x))
+        if notallowed:
+            return {"message": "User cannot use strategies", "strategyids": sorted(notallowed)}, 403
+
+        AccountValue.upsertvalues(session=session, values=list(rows.values()))
+
+        # The upsert bypasses the ORM, refresh the performance series once per account from its earliest date
+        for accountid in accountids:
+            PerformanceSeries.markdirty(session=session,
+                                        accountid=accountid,
+                                        fromdate=min(x['valuedate'] for x in rows.values()
+                                                     if x['accountdbid'] == accountid))
+        session.commit()
+
+        return {"message": "Values updated", "accounts": len(accountids), "values": len(rows)}, 200
+
+    @staticmethod
+    def _valuerowfromdict(item: dict, defaultaccountid) -> dict:
+        if not isinstance(item, dict):
+            raise TypeError("value must be an object")
+        accountid = item.get('accountid', defaultaccountid)
+        if accountid is None:
+            raise KeyError('accountid')
+        valuedate = item['valuedate']
+        try:
+            valuedate = datetime.date.fromisoformat(valuedate)
+        except ValueError:
+            valuedate = parse(valuedate).date()
+
+        return {
+            "accountdbid": int(accountid),
+            "valuedate": valuedate,
+            "value": float(item['value']),
+            "executedstrategyid": int(item['executedstrategyid']) if item.get('executedstrategyid') is not None
+            else None
+        }
@@ -0,0 +1,10 @@
+from flask_restful import Resource
+from flask_jwt_extended import jwt_required
+from supporting.resultcache import performancecache
+from supporting.singleflight import requestflight
+
+
+class CacheStats(Resource):
+    @jwt_required()
+    def get(self):
+        return {"performance": performancecache.stats(), "singleflight": requestflight.stats()}
@@ -1,22 +1,64 @@
+import hashlib
 from functools import wraps
+from datetime import date
 from db import db
-from db.models import Account
+from db.models import Account, AccountChange
+from supporting.accountaccesscache import accountaccesscache
+from supporting.singleflight import requestflight
 from flask_jwt_extended import get_jwt_identity
 from flask_restful import reqparse
-from flask import request
+from flask import request, Response, g
+from sqlalchemy.orm import Session
+from typing import Optional
 
 
 def sessionhandler(obj):
+    """
+    Passes a session to the handler. GET requests get a read-only session that may read from a replica, other
+    requests a session on the primary. Users read from the primary for a while after their writes. The session is
+    closed when the handler returns or raises.
+    """
     @wraps(obj)
     def wrapped(*args, **kwargs):
-        session = db.Session()
+        userid = _currentuserid()
+        readonly = request.method in ("GET", "HEAD")
+        session = requestsession(readonly=readonly, userid=userid)
         kwargs['session'] = session
-        func = obj(*args, **kwargs)
-        session.close()
+        try:
+            func = obj(*args, **kwargs)
+        finally:
+            session.close()
+        if not readonly and userid is not None:
+            db.replicarouter.recordwrite(userid)
         return func
     return wrapped
 
 
+def requestsession(readonly: bool, userid: Optional[int] = None) -> Session:
+    """
+    Returns a new session that is closed at the latest when the request is torn down.
+    """
+    session = db.readonlysession(userid=userid) if readonly else db.Session()
+    g.setdefault("requestsessions", []).append(session)
+    return session
+
+
+def closerequestsessions(exception: Optional[BaseException] = None):
+    """
+    Teardown handler that closes the sessions of the request, rolling back anything not committed.
+    """
+    for session in g.pop("requestsessions", []):
+        session.close()
+
+
+def _currentuserid():
+    try:
+        return get_jwt_identity()
+    except RuntimeError:
+        # Handler without jwt_required, e.g. login
+        return None
+
+
 def useraccountrightsneeded(editrights=False):
     def wrapper(obj):
         @wraps(obj)
@@ -30,15 +72,15 @@ def useraccountrightsneeded(editrights=False):
 
             data = parser.parse_args()
 
-            accounts = Account.getaccountsbyuserid(session=session, userid=get_jwt_identity())
-            try:
-                account = next(x for x in accounts if x.id == int(data['accountid']))
-            except StopIteration:
+            rights = accountaccesscache.getrights(session=session,
+                                                  userid=get_jwt_identity(),
+                                                  accountid=int(data['accountid']))
+            account = session.get(Account, int(data['accountid'])) if rights else None
+            if account is None:
                 return {"message": "Account not found"}, 404
 
-            if editrights:
-                if not account.canusereditaccount(session=session, userid=get_jwt_identity(), accountid=account.id):
-                    return {"message": "User not allowed to edit account"}, 403
+            if editrights and not rights.canedit:
+                return {"message": "User not allowed to edit account"}, 403
             # Add account to kwargs to be used in the function
             kwargs['account'] = account
             func = obj(*args, **kwargs)
@@ -46,3 +88,65 @@ def useraccountrightsneeded(editrights=False):
         return wrapped
     return wrapper
 
+
+def conditionalget(kind: str):
+    """
+    Answers GET requests with 304 when the If-None-Match or If-Modified-Since headers match the change counter of
+    kind ("values" or "positions") of the account, without running the wrapped handler. Other responses get ETag
+    and Last-Modified headers. Must be applied after useraccountrightsneeded.
+
+    Last-Modified has a resolution of one second and a second write can follow within the same second, so
+    If-Modified-Since only matches when the last change is strictly older. Clients that echo Last-Modified get their
+    304 from the ETag.
+    """
+    def wrapper(obj):
+        @wraps(obj)
+        def wrapped(*args, **kwargs):
+            account = kwargs['account']
+            version, updated = AccountChange.getversion(session=kwargs['session'], accountid=account.id, kind=kind)
+            etag = hashlib.sha1(f"{account.id}:{kind}:{version}:".encode() + request.query_string).hexdigest()
+            headers = {"ETag": f'"{etag}"'}
+            # singleflight keys on the ETag, so a request never receives data older than its ETag
+            g.etag = etag
+            if updated:
+                headers["Last-Modified"] = updated.strftime("%a, %d %b %Y %H:%M:%S GMT")
+
+            if request.if_none_match:
+                if request.if_none_match.contains(etag):
+                    return Response(status=304, headers=headers)
+            elif updated and request.if_modified_since and \
+                    request.if_modified_since.replace(tzinfo=None) > updated:
+                return Response(status=304, headers=headers)
+
+            result = obj(*args, **kwargs)
+            if isinstance(result, Response):
+                if result.status_code == 200:
+                    result.headers.update(headers)
+                return result
+            if isinstance(result, tuple):
+                return result
+            return result, 200, headers
+        return wrapped
+    return wrapper
+
+
+def singleflight(obj):
+    """
+    Lets concurrent identical requests for the same account share one execution of the wrapped handler. Must be
+    applied after useraccountrightsneeded and conditionalget, the handler must not return a streaming response.
+    Requests only share an execution when they computed the same ETag, a request that saw a newer version than the
+    running one starts its own.
+    """
+    @wraps(obj)
+    def wrapped(*args, **kwargs):
+        key = (request.endpoint, kwargs['account'].id, request.query_string, g.get("etag"))
+        return requestflight.do(key, lambda: obj(*args, **kwargs))
+    return wrapped
+
+
+def rowtodict(row, exclude=()) -> dict:
+    """
+    Converts a row mapping of a Core select to a JSON serializable dict, dates and datetimes become ISO strings.
+    """
+    return {key: value.isoformat() if isinstance(value, date) else value
+            for key, value in row.items() if key not in exclude}
@@ -0,0 +1,42 @@
+from flask_restful import Resource, reqparse
+from flask_jwt_extended import get_jwt_identity, jwt_required
+from dateutil.parser import parse
+from db.models import User, Investor
+from resources.helpers import sessionhandler
+from supporting.unitpricing import UnitPricing
+
+
+class InvestorNav(Resource):
+    @jwt_required()
+    @sessionhandler
+    def get(self, session):
+        """
+        Returns the shares, share price and net asset value of an investor for every priced day of the period.
+        Investors are not linked to users, so only admins can read them.
+        """
+        parser = reqparse.RequestParser()
+        parser.add_argument("investorid", required=True, type=int, location="args")
+        parser.add_argument("startdate", required=True, type=str, location="args")
+        parser.add_argument("enddate", required=True, type=str, location="args")
+
+        data = parser.parse_args()
+
+        user = session.get(User, get_jwt_identity())
+        if user is None or not user.isadmin:
+            return {"message": "User not allowed to read investors"}, 403
+
+        if session.get(Investor, data['investorid']) is None:
+            return {"message": "Investor not found"}, 404
+
+        df = UnitPricing.getnavseries(session=session,
+                                      investorid=data['investorid'],
+                                      startdate=parse(data['startdate']).date(),
+                                      enddate=parse(data['enddate']).date())
+        if df.empty:
+            return []
+
+        return [{"valuedate": valuedate, "shares": shares, "shareprice": shareprice, "nav": nav}
+                for valuedate, shares, shareprice, nav in zip(df.index.strftime('%Y-%m-%d').tolist(),
+                                                              df['shares'].tolist(),
+                                                              df['shareprice'].tolist(),
+                                                              df['nav'].tolist())]
@@ -1,8 +1,14 @@
+import os
+from concurrent.futures import TimeoutError
 from flask_restful import Resource, reqparse
 from db.models import User
-from flask_jwt_extended import create_access_token
+from flask_jwt_extended import create_access_token, create_refresh_token, get_jwt_identity, jwt_required
 from datetime import timedelta
 from resources.helpers import sessionhandler
+from supporting.passwordverifier import passwordverifier, LoginQueueFull
+
+accesstokenexpiry = timedelta(minutes=15)
+refreshtokenexpiry = timedelta(hours=float(os.environ.get("refreshtokenhours", 24)))
 
 
 class UserLogin(Resource):
@@ -25,12 +31,33 @@ class UserLogin(Resource):
 
         userobject = result[0]
 
-        # Validate password on user object
-        if userobject.verifypassword(data['password']) is False:
+        # Validate password in the password verification pool
+        try:
+            verified = passwordverifier.verify(passwordhash=userobject.password, password=data['password'])
+        except (LoginQueueFull, TimeoutError):
+            return {"message": "Too many logins, try again later"}, 503, {"Retry-After": "1"}
+
+        if verified is False:
             return {"message": "Wrong username or password"}, 401
 
         # Generate tokens
         returndict = dict()
-        returndict['accesstoken'] = create_access_token(identity=userobject.id, expires_delta=timedelta(minutes=15))
+        returndict['accesstoken'] = create_access_token(identity=userobject.id, expires_delta=accesstokenexpiry)
+        returndict['refreshtoken'] = create_refresh_token(identity=userobject.id, expires_delta=refreshtokenexpiry)
 
         return returndict
+
+
+class TokenRefresh(Resource):
+    @jwt_required(refresh=True)
+    @sessionhandler
+    def post(self, session):
+        """
+        Issues a new access token for a refresh token, which only needs a signature check instead of a password
+        verification. The user must still be active.
+        """
+        userobject = session.get(User, get_jwt_identity())
+        if userobject is None or not userobject.isactive:
+            return {"message": "User not active"}, 401
+
+        return {"accesstoken": create_access_token(identity=userobject.id, expires_delta=accesstokenexpiry)}
@@ -1,33 +1,109 @@
+import base64
 import datetime
+import json
+import os
+from flask import request, Response, stream_with_context
 from flask_restful import Resource, reqparse
-from db.models import Account, Position
+from db.models import Account, Position, AccountChange
 from flask_jwt_extended import get_jwt_identity, jwt_required
-from resources.helpers import sessionhandler, useraccountrightsneeded
+from resources.helpers import sessionhandler, useraccountrightsneeded, rowtodict, conditionalget, requestsession
 from dateutil.parser import parse
 from dateutil.tz import gettz
 from supporting.performancecalculator import PerformanceCalculator
 
+# Number of positions resolved and written per statement in batch mode
+positionbatchsize = int(os.environ.get("positionbatchsize", 500))
+# Maximum number of positions accepted in one batch request
+maxpositionsperrequest = int(os.environ.get("maxpositionsperrequest", 5000))
+# Maximum page size of paginated listings
+maxpositionpagesize = int(os.environ.get("maxpositionpagesize", 1000))
+# Number of rows fetched at a time when streaming
+positionstreambatchsize = 500
+
 
 class Positions(Resource):
     @jwt_required()
     @sessionhandler
     @useraccountrightsneeded()
+    @conditionalget("positions")
     def get(self, session, account: Account):
         parser = reqparse.RequestParser()
         parser.add_argument("onlyopen", type=int, location="args", required=False)
+        parser.add_argument("status", location="args", required=False)
+        parser.add_argument("instrument", location="args", required=False)
+        parser.add_argument("startdate", location="args", required=False)
+        parser.add_argument("enddate", location="args", required=False)
+        parser.add_argument("limit", type=int, location="args", required=False)
+        parser.add_argument("cursor", location="args", required=False)
+        parser.add_argument("format", location="args", required=False, choices=("json", "ndjson"))
 
         data = parser.parse_args()
 
-        if data['onlyopen'] and bool(data['onlyopen']) is True:
-            return [self._positiontodict(x) for x in Position.getopenpositionsforaccount(session=session,
-                                                                                         accountid=account.id)]
-        return [self._positiontodict(x) for x in Position.getallpositionsforaccount(session=session,
-                                                                                    accountid=account.id)]
+        if data['limit'] is not None and data['limit'] < 1:
+            return {"message": "limit must be positive"}, 400
+
+        if not any(data[x] for x in ("status", "instrument", "startdate", "enddate", "limit", "cursor", "format")):
+            statement = Position.getpositionsselect(accountid=account.id,
+                                                    status="OPEN" if data['onlyopen'] else None)
+            return [rowtodict(x, exclude=("id",)) for x in session.execute(statement).mappings()]
+
+        try:
+            filters = dict(accountid=account.id,
+                           status="OPEN" if data['onlyopen'] else data['status'],
+                           instrumentname=data['instrument'],
+                           startdatetime=_parsedatetime(data['startdate']),
+                           enddatetime=_parsedatetime(data['enddate']),
+                           after=self._decodecursor(data['cursor']) if data['cursor'] else None)
+        except (TypeError, ValueError, OverflowError):
+            return {"message": "Invalid date or cursor"}, 400
+
+        if data['format'] == "ndjson":
+            return self._streampositions(filters=filters, limit=data['limit'], userid=get_jwt_identity())
+
+        limit = min(data['limit'] or maxpositionpagesize, maxpositionpagesize)
+
+        rows = session.execute(Position.getpositionsselect(**filters).limit(limit + 1)).mappings().all()
+        nextcursor = self._encodecursor(rows[limit - 1]) if len(rows) > limit else None
+
+        return {"positions": [rowtodict(x, exclude=("id",)) for x in rows[:limit]], "nextcursor": nextcursor}
+
+    def _streampositions(self, filters: dict, limit: int, userid: int) -> Response:
+        """
+        Streams the positions as newline delimited JSON while they are fetched. The stream runs after the request
+        handler has returned, so it uses a session of its own.
+        """
+        def generate():
+            session = requestsession(readonly=True, userid=userid)
+            try:
+                statement = Position.getpositionsselect(**filters)
+                if limit:
+                    statement = statement.limit(limit)
+                result = session.execute(statement, execution_options={"yield_per": positionstreambatchsize})
+                for row in result.mappings():
+                    yield json.dumps(rowtodict(row, exclude=("id",))) + "\n"
+            finally:
+                session.close()
+
+        return Response(stream_with_context(generate()), mimetype="application/x-ndjson")
+
+    @staticmethod
+    def _encodecursor(position) -> str:
+        entrydatetime = position['entrydatetime'].isoformat() if position['entrydatetime'] else None
+        return base64.urlsafe_b64encode(json.dumps([entrydatetime, position['id']]).encode()).decode()
+
+    @staticmethod
+    def _decodecursor(cursor: str) -> tuple:
+        entrydatetime, dbid = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return datetime.datetime.fromisoformat(entrydatetime) if entrydatetime is not None else None, int(dbid)
 
     @jwt_required()
     @sessionhandler
     @useraccountrightsneeded(editrights=True)
     def post(self, session, account: Account):
+        body = request.get_json(silent=True)
+        if isinstance(body, dict) and "positions" in body:
+            return self._postbatch(session=session, account=account, positions=body['positions'])
+
         parser = reqparse.RequestParser()
         parser.add_argument("brokerpositionid", required=True)
         parser.add_argument("brokerinstrumentidentifier", required=True)
@@ -67,10 +143,86 @@ class Positions(Resource):
         dbpos.exitprice = data['exitprice']
         dbpos.profit = data['profit']
 
+        AccountChange.bump(session=session, accountid=account.id, kind="positions")
         session.commit()
 
         return self._positiontodict(position=dbpos)
 
+    def _postbatch(self, session, account: Account, positions: list):
+        """
+        Inserts or updates a list of positions in one transaction. Items that fail validation are reported and
+        skipped, if the same brokerpositionid occurs more than once the last item wins.
+        """
+        if not isinstance(positions, list):
+            return {"message": "positions must be a list"}, 400
+        if len(positions) > maxpositionsperrequest:
+            return {"message": f"Too many positions, the maximum is {maxpositionsperrequest}"}, 413
+
+        results = [None] * len(positions)
+        rows = dict()
+        for index, item in enumerate(positions):
+            try:
+                row = self._positionrowfromdict(item)
+            except (KeyError, TypeError, ValueError, OverflowError) as e:
+                results[index] = {"status": "error", "message": f"Invalid position: {e}"}
+                continue
+            if row['brokerpositionid'] in rows:
+                results[rows[row['brokerpositionid']][0]] = {"status": "skipped",
+                                                             "message": "Superseded by a later item"}
+            rows[row['brokerpositionid']] = (index, row)
+
+        items = list(rows.values())
+        for start in range(0, len(items), positionbatchsize):
+            batch = items[start:start + positionbatchsize]
+            statuses = Position.upsertpositions(session=session,
+                                                accountid=account.id,
+                                                positions=[row for _, row in batch])
+            for index, row in batch:
+                results[index] = {"status": statuses[row['brokerpositionid']]}
+
+        if items:
+            AccountChange.bump(session=session, accountid=account.id, kind="positions")
+        session.commit()
+
+        for index, result in enumerate(results):
+            item = positions[index]
+            result['brokerpositionid'] = item.get('brokerpositionid') if isinstance(item, dict) else None
+
+        return {
+            "created": sum(1 for x in results if x['status'] == "created"),
+            "updated": sum(1 for x in results if x['status'] == "updated"),
+            "failed": sum(1 for x in results if x['status'] == "error"),
+            "results": results
+        }
+
+    @staticmethod
+    def _positionrowfromdict(item: dict) -> dict:
+        """
+        Validates a position from a batch request and converts it to a dict of Position columns.
+        """
+        if not isinstance(item, dict):
+            raise TypeError("position must be an object")
+        for key in ("brokerpositionid", "brokerinstrumentidentifier", "instrumentname", "status", "size",
+                    "entrydatetime", "entryprice", "stoplossprice", "takeprofitprice"):
+            if item.get(key) is None:
+                raise KeyError(key)
+
+        return {
+            "brokerpositionid": str(item['brokerpositionid']),
+            "brokerinstrumentidentifier": item['brokerinstrumentidentifier'],
+            "instrumentname": item['instrumentname'],
+            "status": item['status'],
+            "expirydate": _parsedatetime(item.get('expirydate')),
+            "size": float(item['size']),
+            "entrydatetime": _parsedatetime(item['entrydatetime']),
+            "entryprice": float(item['entryprice']),
+            "stoplossprice": float(item['stoplossprice']),
+            "takeprofitprice": float(item['takeprofitprice']),
+            "exitdatetime": _parsedatetime(item.get('exitdatetime')),
+            "exitprice": float(item['exitprice']) if item.get('exitprice') is not None else None,
+            "profit": float(item['profit']) if item.get('profit') is not None else None
+        }
+
     def _positiontodict(self, position: Position) -> dict:
         return {
             "accountid": position.accountid,
@@ -88,3 +240,15 @@ class Positions(Resource):
             "exitprice": position.exitprice,
             "profit": position.profit
         }
+
+
+def _parsedatetime(value):
+    """
+    Parses an ISO 8601 datetime with the fast standard library parser and falls back to dateutil for other formats.
+    """
+    if not value:
+        return None
+    try:
+        return datetime.datetime.fromisoformat(value)
+    except ValueError:
+        return parse(value)
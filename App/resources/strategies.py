@@ -1,7 +1,9 @@
 from flask_restful import Resource, reqparse
 from db.models import Strategy, StrategyUserLink
 from flask_jwt_extended import get_jwt_identity, jwt_required
-from resources.helpers import sessionhandler
+from resources.helpers import sessionhandler, rowtodict
+from supporting.performancecalculator import PerformanceCalculator
+from dateutil.parser import parse
 from datetime import datetime
 
 
@@ -9,9 +11,9 @@ class Strategies(Resource):
     @jwt_required()
     @sessionhandler
     def get(self, session):
-        strategies = Strategy.getstrategiesforuser(session=session, userid=get_jwt_identity())
+        strategies = Strategy.getstrategyrowsforuser(session=session, userid=get_jwt_identity())
 
-        return [self._returndictforstrategy(x) for x in strategies]
+        return [rowtodict(x) for x in strategies]
 
     @jwt_required()
     @sessionhandler
@@ -76,3 +78,34 @@ class Strategies(Resource):
             "description": strategy.description,
             "startdate": strategy.startdate.isoformat()
         }
+
+
+class StrategyPerformance(Resource):
+    @jwt_required()
+    @sessionhandler
+    def get(self, session):
+        """
+        Returns the combined daily value and performance of all accounts that executed the strategy in the period.
+        """
+        parser = reqparse.RequestParser()
+        parser.add_argument("strategyid", required=True, type=int, location="args")
+        parser.add_argument("startdate", required=True, type=str, location="args")
+        parser.add_argument("enddate", required=True, type=str, location="args")
+
+        data = parser.parse_args()
+
+        if not Strategy.canuserusestrategy(session=session, userid=get_jwt_identity(), strategyid=data['strategyid']):
+            return {"message": "Strategy not found"}, 404
+
+        df = PerformanceCalculator.calculatestrategyperformanceforperiod(session=session,
+                                                                         strategyid=data['strategyid'],
+                                                                         startdate=parse(data['startdate']).date(),
+                                                                         enddate=parse(data['enddate']).date())
+        if df.empty:
+            return []
+
+        return [{"valuedate": valuedate, "value": value, "rangeperformance": rangeperformance}
+                for valuedate, value, rangeperformance in
+                zip(df.index.strftime('%Y-%m-%d').tolist(),
+                    df['value'].tolist(),
+                    (df['rangeperformance'] - 1.0).tolist())]
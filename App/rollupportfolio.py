@@ -0,0 +1,32 @@
+"""
+Fills PortfolioValue with the summed up values of the active accounts and prices the portfolio in shares, run after
+the accounts reported the day's values:
+
+    python rollupportfolio.py                      rolls up the days since the last roll-up
+    python rollupportfolio.py 2024-01-31           rolls up the days from the given day
+    python rollupportfolio.py rebuild [fromdate]   rebuilds the history in parallel, rollupprocesses sets the pool size
+"""
+import logging
+import os
+import sys
+from dateutil.parser import parse
+from db import db
+from supporting.portfoliorollup import PortfolioRollup
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    arguments = sys.argv[1:]
+    if arguments[:1] == ["rebuild"]:
+        fromdate = parse(arguments[1]).date() if len(arguments) > 1 else None
+        processes = int(os.environ["rollupprocesses"]) if "rollupprocesses" in os.environ else None
+        days = PortfolioRollup.rebuild(databaseurl=db.engine.url.render_as_string(hide_password=False),
+                                       fromdate=fromdate,
+                                       processes=processes)
+    elif len(arguments) <= 1:
+        fromdate = parse(arguments[0]).date() if arguments else None
+        with db.Session() as session:
+            days = PortfolioRollup.updatefromdate(session=session, fromdate=fromdate)
+            session.commit()
+    else:
+        raise SystemExit(__doc__)
+    print(f"Rolled up {days} days")
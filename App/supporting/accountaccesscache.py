@@ -0,0 +1,91 @@
+import os
+from collections import OrderedDict
+from threading import Lock
+from time import monotonic
+from typing import Dict, Optional, NamedTuple
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from db.models import UserAccountLink
+
+INVALIDATEDUSERSKEY = "accountaccesscacheinvalidatedusers"
+
+
+class AccountRights(NamedTuple):
+    canedit: bool
+
+
+class AccountAccessCache:
+    """
+    An in-process cache of the accounts each user can access, loaded from UserAccountLink. Entries expire after ttl
+    seconds and the least recently used users are evicted when the cache holds more than maxsize users.
+
+    Link changes made through the ORM invalidate the user once the session commits. The cache is per process, so
+    other gunicorn workers see a change at the latest when their entry expires.
+    """
+    def __init__(self, ttl: float, maxsize: int):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._entries: 'OrderedDict[int, tuple]' = OrderedDict()
+        self._lock = Lock()
+
+    def getrights(self, session: Session, userid: int, accountid: int) -> Optional[AccountRights]:
+        """
+        Returns the rights of the user on the account or None if the user has no access to it.
+        """
+        return self.getaccounts(session=session, userid=userid).get(accountid)
+
+    def getaccounts(self, session: Session, userid: int) -> Dict[int, AccountRights]:
+        """
+        Returns the rights of the user per account id, loading them with one query on a miss.
+        """
+        now = monotonic()
+        with self._lock:
+            entry = self._entries.get(userid)
+            if entry and entry[0] > now:
+                self._entries.move_to_end(userid)
+                return entry[1]
+
+        accounts = {x.accountid: AccountRights(canedit=bool(x.isadmin or x.isowner or x.isreadwrite))
+                    for x in UserAccountLink.getrightsforuser(session=session, userid=userid)}
+
+        with self._lock:
+            self._entries[userid] = (now + self.ttl, accounts)
+            self._entries.move_to_end(userid)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return accounts
+
+    def invalidate(self, userid: Optional[int] = None):
+        """
+        Removes the cached rights of a user, or of all users if userid is None.
+        """
+        with self._lock:
+            if userid is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(userid, None)
+
+
+accountaccesscache = AccountAccessCache(ttl=float(os.environ.get("accesscachettl", 60)),
+                                        maxsize=int(os.environ.get("accesscachesize", 1024)))
+
+
+def _marklinkuser(mapper, connection, target):
+    session = Session.object_session(target)
+    if session is not None:
+        session.info.setdefault(INVALIDATEDUSERSKEY, set()).add(target.userid)
+
+
+for _eventname in ("after_insert", "after_update", "after_delete"):
+    event.listen(UserAccountLink, _eventname, _marklinkuser)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidatelinkusers(session: Session):
+    for userid in session.info.pop(INVALIDATEDUSERSKEY, ()):
+        accountaccesscache.invalidate(userid=userid)
+
+
+@event.listens_for(Session, "after_rollback")
+def _clearlinkusers(session: Session):
+    session.info.pop(INVALIDATEDUSERSKEY, None)
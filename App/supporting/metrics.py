@@ -0,0 +1,98 @@
+import os
+from time import perf_counter
+from flask import g, has_request_context
+from prometheus_client import CollectorRegistry, Counter, Gauge, Histogram, generate_latest, multiprocess, \
+    CONTENT_TYPE_LATEST
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# With PROMETHEUS_MULTIPROC_DIR set every gunicorn worker writes its samples to that directory and /metrics
+# aggregates all of them, otherwise the metrics only cover the serving process
+multiprocessmode = bool(os.environ.get("PROMETHEUS_MULTIPROC_DIR"))
+
+requestlatency = Histogram("http_request_duration_seconds",
+                           "Request latency per endpoint",
+                           ["method", "endpoint", "status"],
+                           buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0))
+requestqueries = Histogram("http_request_db_queries",
+                           "Database statements per request",
+                           ["method", "endpoint"],
+                           buckets=(0, 1, 2, 3, 5, 10, 20, 50, 100, 250))
+requestdbtime = Histogram("http_request_db_seconds",
+                          "Database time per request",
+                          ["method", "endpoint"],
+                          buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0))
+dbqueries = Counter("db_queries_total", "Database statements executed")
+dbtime = Counter("db_query_seconds_total", "Time spent executing database statements")
+poolcheckedout = Gauge("db_pool_checked_out", "Connections checked out of the pool", ["engine"],
+                       multiprocess_mode="livesum")
+pooloverflow = Gauge("db_pool_overflow", "Connections open beyond the pool size", ["engine"],
+                     multiprocess_mode="livesum")
+poolcheckouts = Counter("db_pool_checkouts_total", "Connections checked out of the pool")
+poolexhausted = Counter("db_pool_exhausted_total",
+                        "Checkouts that left no connection available, later checkouts have to wait")
+
+
+def instrumentengine(engine: Engine, name: str):
+    """
+    Registers the engine and pool event hooks that record statement counts, database time and pool usage. The pool
+    gauges are labelled with name, "primary" or "replica1", "replica2", ...
+    """
+    @event.listens_for(engine, "before_cursor_execute")
+    def beforecursorexecute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("metricsstarts", []).append(perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def aftercursorexecute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = perf_counter() - conn.info["metricsstarts"].pop()
+        dbqueries.inc()
+        dbtime.inc(elapsed)
+        if has_request_context() and "dbqueries" in g:
+            g.dbqueries += 1
+            g.dbtime += elapsed
+
+    pool = engine.pool
+    checkedoutgauge = poolcheckedout.labels(name)
+    overflowgauge = pooloverflow.labels(name)
+
+    def updatepoolgauges(returning: int = 0):
+        if hasattr(pool, "checkedout"):
+            checkedoutgauge.set(pool.checkedout() - returning)
+            overflowgauge.set(max(pool.overflow(), 0))
+
+    @event.listens_for(engine, "checkout")
+    def checkout(dbapiconnection, connectionrecord, connectionproxy):
+        poolcheckouts.inc()
+        updatepoolgauges()
+        maxoverflow = getattr(pool, "_max_overflow", -1)
+        if hasattr(pool, "checkedout") and maxoverflow >= 0 and pool.checkedout() >= pool.size() + maxoverflow:
+            poolexhausted.inc()
+
+    @event.listens_for(engine, "checkin")
+    def checkin(dbapiconnection, connectionrecord):
+        # The pool counts the connection as checked out until the checkin hooks have run
+        updatepoolgauges(returning=1)
+
+
+def startrequest():
+    g.dbqueries = 0
+    g.dbtime = 0.0
+
+
+def finishrequest(method: str, endpoint: str, status: int, elapsed: float):
+    endpoint = endpoint or "unknown"
+    requestlatency.labels(method, endpoint, str(status)).observe(elapsed)
+    if "dbqueries" in g:
+        requestqueries.labels(method, endpoint).observe(g.dbqueries)
+        requestdbtime.labels(method, endpoint).observe(g.dbtime)
+
+
+def generatemetrics() -> tuple:
+    """
+    Returns the Prometheus text format of all metrics and its content type.
+    """
+    if multiprocessmode:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(), CONTENT_TYPE_LATEST
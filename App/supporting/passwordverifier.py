@@ -0,0 +1,59 @@
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from threading import BoundedSemaphore, Lock
+from passlib.hash import pbkdf2_sha256 as sha256
+
+
+class LoginQueueFull(Exception):
+    """
+    Raised when more password verifications are pending than the queue limit allows.
+    """
+    pass
+
+
+def _verify(password: str, passwordhash: str) -> bool:
+    return sha256.verify(password, passwordhash)
+
+
+class PasswordVerifier:
+    """
+    Verifies pbkdf2 password hashes in a bounded process pool so that logins do not hold the CPU of the request
+    threads. At most queuelimit verifications can be pending at a time, further logins are rejected with
+    LoginQueueFull instead of queueing up behind them.
+
+    The pool is created on first use, so every gunicorn worker gets its own pool after forking. Its processes are
+    started by a forkserver, forking the multithreaded worker itself could copy locks held by other threads.
+    """
+    def __init__(self, workers: int, queuelimit: int, timeout: float):
+        self.workers = workers
+        self.timeout = timeout
+        self._slots = BoundedSemaphore(queuelimit)
+        self._executor = None
+        self._executorpid = None
+        self._lock = Lock()
+
+    def verify(self, passwordhash: str, password: str) -> bool:
+        if not self._slots.acquire(blocking=False):
+            raise LoginQueueFull()
+        try:
+            future = self._getexecutor().submit(_verify, password, passwordhash)
+        except Exception:
+            self._slots.release()
+            raise
+        # The slot is released when the verification finishes, even if the request gave up waiting for it
+        future.add_done_callback(lambda _: self._slots.release())
+        return future.result(timeout=self.timeout)
+
+    def _getexecutor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None or self._executorpid != os.getpid():
+                self._executor = ProcessPoolExecutor(max_workers=self.workers,
+                                                     mp_context=multiprocessing.get_context("forkserver"))
+                self._executorpid = os.getpid()
+            return self._executor
+
+
+passwordverifier = PasswordVerifier(workers=int(os.environ.get("loginworkers", 1)),
+                                    queuelimit=int(os.environ.get("loginqueuelimit", 8)),
+                                    timeout=float(os.environ.get("logintimeout", 10)))
@@ -0,0 +1,181 @@
+import math
+from datetime import date
+from typing import Optional, Sequence
+from sqlalchemy.orm import Session
+from supporting.performanceseries import PerformanceSeries
+from supporting.resultcache import performancecache
+import pandas as pd
+import numpy as np
+
+DAYSPERYEAR = 365.25
+
+
+class PerformanceAnalytics:
+    """
+    This class computes risk and return figures from the daily performance of an account. The daily returns are the
+    transaction adjusted dayperformance of the performance series, so deposits and withdrawals do not count as
+    returns. The return of the first day of a range is earned before the range and left out.
+
+    Figures are annualized with the number of returns per year of the range itself, accounts valued on business days
+    only get about 252 and accounts valued every day 365.
+    """
+    @classmethod
+    def getanalyticsforperiod(cls,
+                              session: Session,
+                              accountid: int,
+                              startdate: date,
+                              enddate: date,
+                              windows: Sequence[int],
+                              riskfreerate: float = 0.0) -> Optional[dict]:
+        """
+        Returns the analytics of an account for a period. Results are cached in performancecache under the values
+        version of the account like the series they are calculated from.
+        :param session:
+        :param accountid:
+        :param startdate:
+        :param enddate:
+        :param windows: lengths of the rolling windows in returns
+        :param riskfreerate: annual risk free rate for the Sharpe and Sortino ratios, 0.02 for 2 %
+        :return: dict of figures, None if the account has no values in the period
+        """
+        cachekey = PerformanceSeries.cachekey(session=session, accountid=accountid, startdate=startdate,
+                                              enddate=enddate) + ("analytics", tuple(windows), riskfreerate)
+        result = performancecache.get(cachekey)
+        if result is not None:
+            return result
+
+        df = PerformanceSeries.getperformanceforperiod(session=session,
+                                                       accountid=accountid,
+                                                       startdate=startdate,
+                                                       enddate=enddate)
+        if df.empty:
+            return None
+
+        result = cls.calculateanalytics(valuedates=df.index,
+                                        dayperformance=df['dayperformance'].to_numpy(),
+                                        windows=windows,
+                                        riskfreerate=riskfreerate)
+        performancecache.set(cachekey, result)
+        return result
+
+    @classmethod
+    def calculateanalytics(cls,
+                           valuedates: pd.DatetimeIndex,
+                           dayperformance: np.ndarray,
+                           windows: Sequence[int],
+                           riskfreerate: float = 0.0) -> dict:
+        """
+        Calculates the analytics from a daily performance series.
+        :param valuedates: dates of the series
+        :param dayperformance: value of every day divided by the value of the day before plus its transactions
+        :param windows: lengths of the rolling windows in returns, windows longer than the series are left out
+        :param riskfreerate: annual risk free rate
+        :return: dict of figures, figures that cannot be calculated for the series are None
+        """
+        returns = np.asarray(dayperformance, dtype=float)[1:] - 1.0
+        enddates = valuedates[1:]
+        cumulative = np.concatenate(([1.0], np.cumprod(1.0 + returns)))
+        years = (valuedates[-1] - valuedates[0]).days / DAYSPERYEAR
+
+        result = {"startdate": valuedates[0].strftime('%Y-%m-%d'),
+                  "enddate": valuedates[-1].strftime('%Y-%m-%d'),
+                  "days": len(returns),
+                  "totalreturn": cls._number(cumulative[-1] - 1.0),
+                  "annualizedreturn": None,
+                  "volatility": None,
+                  "sharperatio": None,
+                  "sortinoratio": None,
+                  "positivedays": None,
+                  "bestday": None,
+                  "worstday": None,
+                  "drawdown": cls.calculatedrawdown(valuedates=valuedates, cumulative=cumulative),
+                  "rolling": []}
+        if len(returns) == 0 or years <= 0:
+            return result
+
+        periodsperyear = len(returns) / years
+        if cumulative[-1] > 0:
+            result["annualizedreturn"] = cls._number(cumulative[-1] ** (1.0 / years) - 1.0)
+        result["positivedays"] = cls._number(np.count_nonzero(returns > 0) / len(returns))
+        best, worst = int(np.argmax(returns)), int(np.argmin(returns))
+        result["bestday"] = {"valuedate": enddates[best].strftime('%Y-%m-%d'), "return": cls._number(returns[best])}
+        result["worstday"] = {"valuedate": enddates[worst].strftime('%Y-%m-%d'), "return": cls._number(returns[worst])}
+
+        if len(returns) > 1:
+            deviation = returns.std(ddof=1)
+            excess = returns - ((1.0 + riskfreerate) ** (1.0 / periodsperyear) - 1.0)
+            downside = math.sqrt(np.mean(np.minimum(excess, 0.0) ** 2))
+            result["volatility"] = cls._number(deviation * math.sqrt(periodsperyear))
+            if deviation > 0:
+                result["sharperatio"] = cls._number(excess.mean() / deviation * math.sqrt(periodsperyear))
+            if downside > 0:
+                result["sortinoratio"] = cls._number(excess.mean() / downside * math.sqrt(periodsperyear))
+
+        result["rolling"] = [cls.calculaterollingwindow(enddates=enddates,
+                                                        returns=returns,
+                                                        cumulative=cumulative,
+                                                        window=x,
+                                                        periodsperyear=periodsperyear)
+                             for x in windows if 0 < x <= len(returns)]
+        return result
+
+    @classmethod
+    def calculatedrawdown(cls, valuedates: pd.DatetimeIndex, cumulative: np.ndarray) -> dict:
+        """
+        Finds the largest decline from a peak of the cumulative performance and when it recovered.
+        """
+        peaks = np.maximum.accumulate(cumulative)
+        drawdowns = cumulative / peaks - 1.0
+        trough = int(np.argmin(drawdowns))
+        peak = int(np.argmax(cumulative[:trough + 1]))
+        recovered = np.flatnonzero(cumulative[trough:] >= cumulative[peak])
+        recovery = trough + int(recovered[0]) if drawdowns[trough] < 0 and len(recovered) else None
+        return {"maximum": cls._number(drawdowns[trough]),
+                "peakdate": valuedates[peak].strftime('%Y-%m-%d'),
+                "troughdate": valuedates[trough].strftime('%Y-%m-%d'),
+                "recoverydate": valuedates[recovery].strftime('%Y-%m-%d') if recovery is not None else None,
+                "current": cls._number(drawdowns[-1])}
+
+    @classmethod
+    def calculaterollingwindow(cls,
+                               enddates: pd.DatetimeIndex,
+                               returns: np.ndarray,
+                               cumulative: np.ndarray,
+                               window: int,
+                               periodsperyear: float) -> dict:
+        """
+        Summarizes the compounded returns and the annualized volatility of all windows of window returns.
+        """
+        windowreturns = cumulative[window:] / cumulative[:-window] - 1.0
+        windowenddates = enddates[window - 1:]
+        best, worst = int(np.argmax(windowreturns)), int(np.argmin(windowreturns))
+        result = {"window": window,
+                  "latestreturn": cls._number(windowreturns[-1]),
+                  "averagereturn": cls._number(windowreturns.mean()),
+                  "bestreturn": cls._number(windowreturns[best]),
+                  "bestenddate": windowenddates[best].strftime('%Y-%m-%d'),
+                  "worstreturn": cls._number(windowreturns[worst]),
+                  "worstenddate": windowenddates[worst].strftime('%Y-%m-%d'),
+                  "latestvolatility": None,
+                  "averagevolatility": None}
+        if window > 1:
+            volatility = cls._rollingstd(returns=returns, window=window) * math.sqrt(periodsperyear)
+            result["latestvolatility"] = cls._number(volatility[-1])
+            result["averagevolatility"] = cls._number(volatility.mean())
+        return result
+
+    @staticmethod
+    def _rollingstd(returns: np.ndarray, window: int) -> np.ndarray:
+        # Sums over the windows from running sums, the returns are centred first to keep the differences accurate
+        centred = returns - returns.mean()
+        sums = np.concatenate(([0.0], np.cumsum(centred)))
+        squares = np.concatenate(([0.0], np.cumsum(centred ** 2)))
+        windowsums = sums[window:] - sums[:-window]
+        windowsquares = squares[window:] - squares[:-window]
+        return np.sqrt(np.maximum(windowsquares - windowsums ** 2 / window, 0.0) / (window - 1))
+
+    @staticmethod
+    def _number(value) -> Optional[float]:
+        value = float(value)
+        return value if math.isfinite(value) else None
+
@@ -1,9 +1,13 @@
-from typing import List
+from typing import List, Optional, Sequence, Union
+from datetime import date
 from db.models import AccountValue, AccountTransaction
-from db.db import Session
+from sqlalchemy.orm import Session
 import pandas as pd
 import numpy as np
 
+# Period codes of the calendar resolutions of resampleperformance
+RESOLUTIONS = {"weekly": "W", "monthly": "M"}
+
 
 class PerformanceCalculator:
     """
@@ -52,3 +56,222 @@ class PerformanceCalculator:
         df['rangeperformance'] = np.cumprod(df['dayperformance'])
 
         return df
+
+    @classmethod
+    def calculateperformanceforperiod(cls,
+                                      session: Session,
+                                      accountids: List[int],
+                                      startdate: date,
+                                      enddate: date) -> pd.DataFrame:
+        """
+        Calculates performance for one or more accounts over a period. Values and transactions are summed up per
+        day in the database, so only one row per day is fetched however many accounts are involved.
+        :param session:
+        :param accountids: database ids of the accounts, values for the same date are summed up
+        :param startdate:
+        :param enddate:
+        :return: DataFrame indexed by valuedate
+        """
+        values = AccountValue.getdailytotalsforperiod(session=session,
+                                                      startdate=startdate,
+                                                      enddate=enddate,
+                                                      accountids=accountids)
+        if not values:
+            return pd.DataFrame()
+
+        valuedates, values = zip(*values)
+
+        transactions = AccountTransaction.getperformancetransactiontotalsforperiod(session=session,
+                                                                                   startdate=valuedates[0],
+                                                                                   enddate=valuedates[-1],
+                                                                                   accountids=accountids)
+        transactiondates, transactionvalues = None, None
+        if transactions:
+            transactiondates, transactionvalues = zip(*transactions)
+
+        return cls.calculateperformancefromseries(valuedates=valuedates,
+                                                  values=values,
+                                                  transactiondates=transactiondates,
+                                                  transactionvalues=transactionvalues)
+
+    @classmethod
+    def calculateperformanceforaccounts(cls,
+                                        session: Session,
+                                        accountids: List[int],
+                                        startdate: date,
+                                        enddate: date) -> pd.DataFrame:
+        """
+        Calculates the performance of every account of a list separately over a period. Values and transactions of
+        all accounts are fetched with one query each and calculated in one grouped pass.
+        :param session:
+        :param accountids: database ids of the accounts
+        :param startdate:
+        :param enddate:
+        :return: DataFrame indexed by accountdbid and valuedate
+        """
+        values = AccountValue.getvaluecolumnsforperiod(session=session,
+                                                       accountids=accountids,
+                                                       startdate=startdate,
+                                                       enddate=enddate)
+        if not values:
+            return pd.DataFrame()
+
+        valuedates, values, valueaccountids = zip(*values)
+
+        transactions = AccountTransaction.getperformancetransactioncolumnsforperiod(session=session,
+                                                                                    startdate=min(valuedates),
+                                                                                    enddate=max(valuedates),
+                                                                                    accountids=accountids)
+        transactiondates, transactionvalues, transactionaccountids = None, None, None
+        if transactions:
+            transactiondates, transactionvalues, transactionaccountids = zip(*transactions)
+
+        return cls.calculateperformanceperaccountfromseries(accountids=valueaccountids,
+                                                            valuedates=valuedates,
+                                                            values=values,
+                                                            transactionaccountids=transactionaccountids,
+                                                            transactiondates=transactiondates,
+                                                            transactionvalues=transactionvalues)
+
+    @staticmethod
+    def calculateperformanceperaccountfromseries(accountids: Sequence[int],
+                                                 valuedates: Sequence,
+                                                 values: Sequence[float],
+                                                 transactionaccountids: Optional[Sequence[int]] = None,
+                                                 transactiondates: Optional[Sequence] = None,
+                                                 transactionvalues: Optional[Sequence[float]] = None) -> pd.DataFrame:
+        """
+        Same as calculateperformancefromseries for several accounts at once, every value and transaction belongs to
+        the account at the same position of accountids or transactionaccountids.
+        :return: DataFrame indexed by accountdbid and valuedate
+        """
+        if len(valuedates) == 0:
+            return pd.DataFrame()
+
+        df = pd.DataFrame({"accountdbid": np.asarray(accountids, dtype=np.int64),
+                           "valuedate": pd.to_datetime(np.asarray(valuedates, dtype='datetime64[D]')),
+                           "value": np.asarray(values, dtype=float)})
+        df = df.groupby(["accountdbid", "valuedate"], sort=True).sum()
+        accounts = df.groupby(level="accountdbid")
+        df['priorvalue'] = accounts['value'].shift(1).fillna(df['value'])
+
+        df['transactionvalue'] = 0.0
+        if transactiondates is not None and len(transactiondates) > 0:
+            transactionseries = pd.DataFrame({
+                "accountdbid": np.asarray(transactionaccountids, dtype=np.int64),
+                "valuedate": pd.to_datetime(np.asarray(transactiondates, dtype='datetime64[D]')),
+                "transactionvalue": np.asarray(transactionvalues, dtype=float)}).\
+                groupby(["accountdbid", "valuedate"]).sum()['transactionvalue']
+            df['transactionvalue'] = transactionseries.reindex(df.index, fill_value=0.0)
+
+        basevalue = df['priorvalue'].to_numpy() + df['transactionvalue'].to_numpy()
+        df['dayperformance'] = df['value'].to_numpy() / basevalue
+        df['rangeperformance'] = df.groupby(level="accountdbid")['dayperformance'].cumprod()
+
+        return df
+
+    @classmethod
+    def calculatestrategyperformanceforperiod(cls,
+                                              session: Session,
+                                              strategyid: int,
+                                              startdate: date,
+                                              enddate: date) -> pd.DataFrame:
+        """
+        Calculates the combined performance of all accounts that executed a strategy over a period. Accounts that
+        start or stop executing the strategy are treated like transactions, so only the returns earned while
+        executing it count.
+        :param session:
+        :param strategyid:
+        :param startdate:
+        :param enddate:
+        :return: DataFrame indexed by valuedate
+        """
+        values = AccountValue.getstrategydailytotalsforperiod(session=session,
+                                                              strategyid=strategyid,
+                                                              startdate=startdate,
+                                                              enddate=enddate)
+        if not values:
+            return pd.DataFrame()
+
+        valuedates, values, flows = zip(*values)
+        transactions = AccountTransaction.getperformancetransactiontotalsforstrategy(session=session,
+                                                                                     strategyid=strategyid,
+                                                                                     startdate=valuedates[0],
+                                                                                     enddate=valuedates[-1])
+        transactiondates, transactionvalues = zip(*transactions) if transactions else ((), ())
+
+        # The first day is the base of the range, accounts already executing the strategy then are no flow
+        return cls.calculateperformancefromseries(valuedates=valuedates,
+                                                  values=values,
+                                                  transactiondates=valuedates[1:] + transactiondates,
+                                                  transactionvalues=flows[1:] + transactionvalues)
+
+    @staticmethod
+    def calculateperformancefromseries(valuedates: Sequence,
+                                       values: Sequence[float],
+                                       transactiondates: Optional[Sequence] = None,
+                                       transactionvalues: Optional[Sequence[float]] = None) -> pd.DataFrame:
+        """
+        Calculates performance from plain value and transaction series. Values and transactions on the same day are
+        summed up, transactions on days without a value are ignored.
+        :param valuedates: dates or datetimes of the values
+        :param values:
+        :param transactiondates: dates or datetimes of the transactions
+        :param transactionvalues:
+        :return: DataFrame indexed by valuedate
+        """
+        if len(valuedates) == 0:
+            return pd.DataFrame()
+
+        valueseries = pd.Series(np.asarray(values, dtype=float),
+                                index=np.asarray(valuedates, dtype='datetime64[D]'))
+        df = valueseries.groupby(level=0).sum().to_frame('value')
+        df.index = pd.DatetimeIndex(df.index, name='valuedate')
+        df['priorvalue'] = df['value'].shift(1).fillna(df['value'])
+
+        df['transactionvalue'] = 0.0
+        if transactiondates is not None and len(transactiondates) > 0:
+            transactionseries = pd.Series(np.asarray(transactionvalues, dtype=float),
+                                          index=np.asarray(transactiondates, dtype='datetime64[D]'))
+            transactionseries = transactionseries.groupby(level=0).sum()
+            transactionseries.index = pd.DatetimeIndex(transactionseries.index)
+            df['transactionvalue'] = transactionseries.reindex(df.index, fill_value=0.0)
+
+        basevalue = df['priorvalue'].to_numpy() + df['transactionvalue'].to_numpy()
+        df['dayperformance'] = df['value'].to_numpy() / basevalue
+        # Cumulative product of dayperformance gives the rangeperformance
+        df['rangeperformance'] = np.cumprod(df['dayperformance'].to_numpy())
+
+        return df
+
+    @staticmethod
+    def resampleperformance(df: pd.DataFrame, resolution: Union[str, int]) -> pd.DataFrame:
+        """
+        Reduces a daily performance series to the first day and the last day of every week or month, or to at most
+        resolution evenly spaced days when it is a number. rangeperformance is cumulative, so a kept day carries the
+        chain-linked performance of the days in between with their transactions. transactionvalue is summed up and
+        dayperformance becomes the performance since the previous kept day.
+        :param df: DataFrame indexed by valuedate with value, transactionvalue, dayperformance and rangeperformance
+        :param resolution: "daily", "weekly", "monthly" or the maximum number of days, at least 2
+        :return: DataFrame indexed by valuedate
+        """
+        if resolution == "daily" or len(df) <= 1:
+            return df
+        if isinstance(resolution, int):
+            if len(df) <= resolution:
+                return df
+            step = -(-(len(df) - 1) // (resolution - 1))
+            positions = np.arange(len(df) - 1, 0, -step)[::-1]
+        else:
+            periods = df.index.to_period(RESOLUTIONS[resolution]).asi8
+            positions = np.append(np.flatnonzero(periods[1:] != periods[:-1]), len(df) - 1)
+        # The first day stays as the base of the range
+        positions = np.concatenate(([0], positions[positions > 0]))
+
+        result = df.iloc[positions].copy()
+        result['transactionvalue'] = np.diff(np.cumsum(df['transactionvalue'].to_numpy())[positions], prepend=0.0)
+        performance = df['rangeperformance'].to_numpy()[positions]
+        result['dayperformance'] = np.concatenate(([df['dayperformance'].iloc[0]], performance[1:] / performance[:-1]))
+        if 'priorvalue' in result:
+            result['priorvalue'] = np.concatenate(([df['priorvalue'].iloc[0]], result['value'].to_numpy()[:-1]))
+        return result
@@ -0,0 +1,284 @@
+from typing import Optional, Dict, List
+from datetime import date, datetime
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+from db.models import AccountValue, AccountTransaction, AccountPerformance, AccountChange
+from supporting.performancecalculator import PerformanceCalculator
+from supporting.resultcache import performancecache
+import pandas as pd
+
+DIRTYACCOUNTSKEY = "performanceseriesdirtyaccounts"
+CHANGEDACCOUNTSKEY = "performanceserieschangedaccounts"
+
+
+class PerformanceSeries:
+    """
+    This class maintains the persisted daily performance series of accounts in AccountPerformance. History does not
+    change once a day is closed, so writes only recompute the series from the changed date forward and range queries
+    rebase the stored cumulative index to the start of the range.
+
+    AccountValue and AccountTransaction objects written through the ORM mark their account as dirty and the series is
+    updated before the session commits. Writes that bypass the ORM have to call updatefromdate themselves.
+    """
+    @classmethod
+    def getperformanceforperiod(cls,
+                                session: Session,
+                                accountid: int,
+                                startdate: date,
+                                enddate: date) -> pd.DataFrame:
+        """
+        Returns the performance of an account for a period from the persisted series. The series is built on first
+        use for accounts that have values but no series yet, read-only sessions calculate it from the values instead.
+        Results are cached in performancecache under the values version of the account, so a cache that missed the
+        invalidation of a write in another process never returns the old series.
+        :param session:
+        :param accountid:
+        :param startdate:
+        :param enddate:
+        :return: DataFrame indexed by valuedate, rangeperformance is 1.0 on the first date
+        """
+        cachekey = cls.cachekey(session=session, accountid=accountid, startdate=startdate, enddate=enddate)
+        df = performancecache.get(cachekey)
+        if df is not None:
+            return df
+
+        rows = AccountPerformance.getseriesforperiod(session=session,
+                                                     accountid=accountid,
+                                                     startdate=startdate,
+                                                     enddate=enddate)
+        if not rows and not AccountPerformance.hasseries(session=session, accountid=accountid):
+            if session.info.get("readonly"):
+                # Read-only sessions may be on a replica, the series is built by the next write instead
+                df = PerformanceCalculator.calculateperformanceforperiod(session=session,
+                                                                         accountids=[accountid],
+                                                                         startdate=startdate,
+                                                                         enddate=enddate)
+                if not df.empty:
+                    performancecache.set(cachekey, df)
+                return df
+            cls.updatefromdate(session=session, accountid=accountid, fromdate=None)
+            session.commit()
+            # Building the series bumped the version
+            cachekey = cls.cachekey(session=session, accountid=accountid, startdate=startdate, enddate=enddate)
+            rows = AccountPerformance.getseriesforperiod(session=session,
+                                                         accountid=accountid,
+                                                         startdate=startdate,
+                                                         enddate=enddate)
+        if not rows:
+            return pd.DataFrame()
+
+        df = pd.DataFrame.from_records(rows, columns=["valuedate",
+                                                      "value",
+                                                      "transactionvalue",
+                                                      "dayperformance",
+                                                      "cumulativeperformance"])
+        df = df.set_index(pd.DatetimeIndex(df.pop("valuedate"), name="valuedate"))
+        df["rangeperformance"] = df["cumulativeperformance"] / df["cumulativeperformance"].iloc[0]
+
+        performancecache.set(cachekey, df)
+        return df
+
+    @classmethod
+    def getperformanceforaccounts(cls,
+                                  session: Session,
+                                  accountids: List[int],
+                                  startdate: date,
+                                  enddate: date) -> Dict[int, pd.DataFrame]:
+        """
+        Same as getperformanceforperiod for several accounts, the series of all accounts missing in performancecache
+        are read with one query.
+        :param session:
+        :param accountids:
+        :param startdate:
+        :param enddate:
+        :return: DataFrames per account id, accounts without values in the period are left out
+        """
+        frames = dict()
+        missing = []
+        versions = AccountChange.getversions(session=session, accountids=accountids, kind="values")
+        for accountid in accountids:
+            df = performancecache.get((accountid, startdate, enddate, versions.get(accountid, 0)))
+            if df is None:
+                missing.append(accountid)
+            else:
+                frames[accountid] = df
+        if not missing:
+            return frames
+
+        found = cls._framesfromseries(AccountPerformance.getseriesforaccounts(session=session,
+                                                                              accountids=missing,
+                                                                              startdate=startdate,
+                                                                              enddate=enddate))
+        unbuilt = [x for x in missing if x not in found]
+        if unbuilt:
+            unbuilt = list(set(unbuilt) - set(AccountPerformance.getaccountswithseries(session=session,
+                                                                                      accountids=unbuilt)))
+        if unbuilt and session.info.get("readonly"):
+            # Read-only sessions may be on a replica, the series are built by the next write instead
+            df = PerformanceCalculator.calculateperformanceforaccounts(session=session,
+                                                                       accountids=unbuilt,
+                                                                       startdate=startdate,
+                                                                       enddate=enddate)
+            if not df.empty:
+                found.update({x: y.droplevel("accountdbid") for x, y in df.groupby(level="accountdbid")})
+        elif unbuilt:
+            for accountid in unbuilt:
+                cls.updatefromdate(session=session, accountid=accountid, fromdate=None)
+            session.commit()
+            versions.update(AccountChange.getversions(session=session, accountids=unbuilt, kind="values"))
+            found.update(cls._framesfromseries(AccountPerformance.getseriesforaccounts(session=session,
+                                                                                       accountids=unbuilt,
+                                                                                       startdate=startdate,
+                                                                                       enddate=enddate)))
+
+        for accountid, df in found.items():
+            performancecache.set((accountid, startdate, enddate, versions.get(accountid, 0)), df)
+        frames.update(found)
+        return frames
+
+    @staticmethod
+    def cachekey(session: Session, accountid: int, startdate: date, enddate: date) -> tuple:
+        """
+        Returns the performancecache key of a range, starting with accountid and the range as ResultCache expects.
+        """
+        version, _ = AccountChange.getversion(session=session, accountid=accountid, kind="values")
+        return accountid, startdate, enddate, version
+
+    @staticmethod
+    def _framesfromseries(rows: list) -> Dict[int, pd.DataFrame]:
+        if not rows:
+            return dict()
+        df = pd.DataFrame.from_records(rows, columns=["accountdbid",
+                                                      "valuedate",
+                                                      "value",
+                                                      "transactionvalue",
+                                                      "dayperformance",
+                                                      "cumulativeperformance"])
+        df = df.set_index(["accountdbid", pd.DatetimeIndex(df.pop("valuedate"), name="valuedate")])
+        # Rebase every account to the first day of the range in one pass
+        df["rangeperformance"] = df["cumulativeperformance"] / \
+            df.groupby(level="accountdbid")["cumulativeperformance"].transform("first")
+        return {x: y.droplevel("accountdbid") for x, y in df.groupby(level="accountdbid")}
+
+    @classmethod
+    def updatefromdate(cls, session: Session, accountid: int, fromdate: Optional[date]):
+        """
+        Recomputes the persisted series of an account from fromdate forward. The whole series is rebuilt if fromdate
+        is None or there is no persisted day before fromdate to continue from.
+        :param session:
+        :param accountid:
+        :param fromdate:
+        :return:
+        """
+        prior = None
+        if fromdate:
+            prior = AccountPerformance.getlastbeforedate(session=session, accountid=accountid, valuedate=fromdate)
+        if prior is None:
+            fromdate = None
+
+        AccountPerformance.deletefromdate(session=session, accountid=accountid, fromdate=fromdate)
+        AccountChange.bump(session=session, accountid=accountid, kind="values")
+        changedaccounts: Dict[int, Optional[date]] = session.info.setdefault(CHANGEDACCOUNTSKEY, {})
+        if accountid not in changedaccounts or fromdate is None or \
+                (changedaccounts[accountid] is not None and fromdate < changedaccounts[accountid]):
+            changedaccounts[accountid] = fromdate
+
+        values = AccountValue.getdailytotalsforperiod(session=session,
+                                                      startdate=fromdate or date.min,
+                                                      enddate=date.max,
+                                                      accountids=[accountid])
+        if not values:
+            return
+
+        valuedates, values = zip(*values)
+
+        transactions = AccountTransaction.getperformancetransactiontotalsforperiod(session=session,
+                                                                                   startdate=valuedates[0],
+                                                                                   enddate=valuedates[-1],
+                                                                                   accountids=[accountid])
+        transactiondates, transactionvalues = None, None
+        if transactions:
+            transactiondates, transactionvalues = zip(*transactions)
+
+        if prior:
+            # The prior day only provides the starting value, it is dropped again after the calculation
+            valuedates = (prior.valuedate,) + valuedates
+            values = (prior.value,) + values
+
+        df = PerformanceCalculator.calculateperformancefromseries(valuedates=valuedates,
+                                                                  values=values,
+                                                                  transactiondates=transactiondates,
+                                                                  transactionvalues=transactionvalues)
+        if prior:
+            df = df.iloc[1:]
+            df["rangeperformance"] *= prior.cumulativeperformance
+
+        records = [{"accountdbid": accountid,
+                    "valuedate": valuedate,
+                    "value": value,
+                    "transactionvalue": transactionvalue,
+                    "dayperformance": dayperformance,
+                    "cumulativeperformance": cumulativeperformance}
+                   for valuedate, value, transactionvalue, dayperformance, cumulativeperformance in
+                   zip(df.index.date,
+                       df["value"].tolist(),
+                       df["transactionvalue"].tolist(),
+                       df["dayperformance"].tolist(),
+                       df["rangeperformance"].tolist())]
+        if records:
+            session.execute(AccountPerformance.__table__.insert(), records)
+
+    @staticmethod
+    def markdirty(session: Session, accountid: int, fromdate: date):
+        """
+        Marks the series of an account as changed from fromdate. The series is updated before the session commits.
+        """
+        if accountid is None or fromdate is None:
+            return
+        if isinstance(fromdate, datetime):
+            fromdate = fromdate.date()
+        dirtyaccounts: Dict[int, date] = session.info.setdefault(DIRTYACCOUNTSKEY, {})
+        if accountid not in dirtyaccounts or fromdate < dirtyaccounts[accountid]:
+            dirtyaccounts[accountid] = fromdate
+
+
+def _markdirtyfromtarget(accountattribute: str, dateattribute: str):
+    def listener(mapper, connection, target):
+        session = Session.object_session(target)
+        if session is None:
+            return
+        state = inspect(target)
+        accountids = set(state.attrs[accountattribute].history.sum()) or {getattr(target, accountattribute)}
+        dates = [x for x in state.attrs[dateattribute].history.sum() if x is not None] or \
+            [getattr(target, dateattribute)]
+        for accountid in accountids:
+            for changeddate in dates:
+                PerformanceSeries.markdirty(session=session, accountid=accountid, fromdate=changeddate)
+    return listener
+
+
+for _eventname in ("after_insert", "after_update", "after_delete"):
+    event.listen(AccountValue, _eventname, _markdirtyfromtarget("accountdbid", "valuedate"))
+    event.listen(AccountTransaction, _eventname, _markdirtyfromtarget("accountdbid", "transactiondatetime"))
+
+
+@event.listens_for(Session, "before_commit")
+def _updatedirtyseries(session: Session):
+    session.flush()
+    dirtyaccounts = session.info.pop(DIRTYACCOUNTSKEY, None)
+    if not dirtyaccounts:
+        return
+    for accountid, fromdate in dirtyaccounts.items():
+        PerformanceSeries.updatefromdate(session=session, accountid=accountid, fromdate=fromdate)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidatechangedseries(session: Session):
+    for accountid, fromdate in session.info.pop(CHANGEDACCOUNTSKEY, {}).items():
+        performancecache.invalidate(accountid=accountid, fromdate=fromdate)
+
+
+@event.listens_for(Session, "after_rollback")
+def _cleardirtyseries(session: Session):
+    session.info.pop(DIRTYACCOUNTSKEY, None)
+    session.info.pop(CHANGEDACCOUNTSKEY, None)
@@ -0,0 +1,140 @@
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, timedelta
+from typing import List, Optional, Tuple
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+from db.models import Account, AccountValue, PortfolioValue
+from supporting.unitpricing import UnitPricing
+import pandas as pd
+
+
+def _rollupperiod(databaseurl: str, accountids: List[int], startdate: date, enddate: date) -> int:
+    # Runs in a pool process, which needs an engine of its own
+    engine = create_engine(databaseurl)
+    try:
+        with Session(bind=engine) as session:
+            days = PortfolioRollup.rollupperiod(session=session, accountids=accountids, startdate=startdate,
+                                                enddate=enddate)
+            session.commit()
+        return days
+    finally:
+        engine.dispose()
+
+
+class PortfolioRollup:
+    """
+    Fills PortfolioValue with the summed up values of the active accounts on every day any of them reported. An
+    account that did not report on a day counts with its last value, so accounts valued on business days only next to
+    accounts valued every day do not make the weekends look like a loss. The totals are written in bulk, shareprice
+    and performance are then computed by UnitPricing.
+    """
+    @classmethod
+    def rollupperiod(cls, session: Session, accountids: List[int], startdate: date, enddate: date) -> int:
+        """
+        Writes the totalvalue of every day of the period.
+        :param session:
+        :param accountids: database ids of the accounts to sum up
+        :param startdate:
+        :param enddate:
+        :return: number of days with a total
+        """
+        values = AccountValue.getvaluecolumnsforperiod(session=session, accountids=accountids, startdate=startdate,
+                                                       enddate=enddate)
+        priorvalues = AccountValue.getlastvaluesbefore(session=session, accountids=accountids, valuedate=startdate)
+        totals = cls.calculatetotals(values=values, priorvalues=priorvalues)
+        PortfolioValue.replacetotalsforperiod(session=session, startdate=startdate, enddate=enddate, totals=totals)
+        return len(totals)
+
+    @staticmethod
+    def calculatetotals(values: List[Tuple[date, float, int]],
+                        priorvalues: List[Tuple[int, float]]) -> List[Tuple[date, float]]:
+        """
+        Sums up the values of the accounts per day, carrying the last value of an account forward to the days it did
+        not report.
+        :param values: (valuedate, value, accountdbid) tuples of the period
+        :param priorvalues: (accountdbid, value) tuples with the last value of the accounts before the period
+        :return: (valuedate, total) tuples for the days with at least one value
+        """
+        if not values:
+            return []
+        df = pd.DataFrame(values, columns=["valuedate", "value", "accountdbid"]).\
+            pivot(index="valuedate", columns="accountdbid", values="value")
+        prior = pd.Series(dict(priorvalues), dtype=float)
+        df = df.reindex(columns=df.columns.union(prior.index))
+        df.iloc[0] = df.iloc[0].fillna(prior)
+        # Accounts without a value yet count as 0
+        totals = df.ffill().sum(axis=1)
+        return list(zip(totals.index.tolist(), totals.tolist()))
+
+    @classmethod
+    def updatefromdate(cls, session: Session, fromdate: Optional[date] = None) -> int:
+        """
+        Rolls up the days from fromdate to the last account value and prices them. Without fromdate it continues
+        at the last rolled up day, which is rolled up again as accounts may have reported after it was written.
+        :param session:
+        :param fromdate:
+        :return: number of rolled up days
+        """
+        accountids = Account.getactiveaccountids(session=session)
+        firstdate, lastdate = AccountValue.getvaluedaterange(session=session, accountids=accountids)
+        if lastdate is None:
+            return 0
+        startdate = fromdate or PortfolioValue.getlastvaluedate(session=session) or firstdate
+        days = cls.rollupperiod(session=session, accountids=accountids, startdate=startdate, enddate=lastdate)
+        UnitPricing.updatefromdate(session=session, fromdate=startdate)
+        logging.info(f"Rolled up {days} days from {startdate} for {len(accountids)} accounts")
+        return days
+
+    @classmethod
+    def rebuild(cls,
+                databaseurl: str,
+                fromdate: Optional[date] = None,
+                processes: Optional[int] = None,
+                chunkdays: int = 365) -> int:
+        """
+        Rolls up the whole history from fromdate, or from the first account value, in periods of chunkdays. The
+        periods are rolled up in parallel by a pool of processes, each writing its own days, then all days are priced.
+        :param databaseurl: database the pool processes connect to
+        :param fromdate:
+        :param processes: pool size, defaults to the number of CPUs, 1 rolls up in this process
+        :param chunkdays: days per period
+        :return: number of rolled up days
+        """
+        engine = create_engine(databaseurl)
+        try:
+            with Session(bind=engine) as session:
+                accountids = Account.getactiveaccountids(session=session)
+                firstdate, lastdate = AccountValue.getvaluedaterange(session=session, accountids=accountids)
+            if lastdate is None:
+                return 0
+            startdate = fromdate or firstdate
+            periods = cls.splitperiod(startdate=startdate, enddate=lastdate, chunkdays=chunkdays)
+            processes = min(processes or os.cpu_count() or 1, len(periods))
+
+            if processes > 1:
+                # The parent holds an engine, forked processes would share its connections
+                with ProcessPoolExecutor(max_workers=processes,
+                                         mp_context=multiprocessing.get_context("forkserver")) as executor:
+                    days = sum(executor.map(_rollupperiod, *zip(*[(databaseurl, accountids, x, y)
+                                                                  for x, y in periods])))
+            else:
+                days = sum(_rollupperiod(databaseurl, accountids, x, y) for x, y in periods)
+
+            with Session(bind=engine) as session:
+                UnitPricing.updatefromdate(session=session, fromdate=startdate)
+                session.commit()
+        finally:
+            engine.dispose()
+        logging.info(f"Rebuilt {days} days from {startdate} in {len(periods)} periods on {processes} processes")
+        return days
+
+    @staticmethod
+    def splitperiod(startdate: date, enddate: date, chunkdays: int) -> List[Tuple[date, date]]:
+        periods = []
+        while startdate <= enddate:
+            periods.append((startdate, min(startdate + timedelta(days=chunkdays - 1), enddate)))
+            startdate += timedelta(days=chunkdays)
+        return periods
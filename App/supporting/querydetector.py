@@ -0,0 +1,166 @@
+import logging
+import os
+import re
+import threading
+import traceback
+from collections import OrderedDict
+from contextlib import contextmanager
+from time import perf_counter
+from typing import List, Optional
+from flask import Flask, g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# "warn" logs problems, "raise" fails the request, anything else leaves the detector off
+querydebug = os.environ.get("querydebug", "")
+querybudget = int(os.environ.get("querybudget", 10))
+repeatedquerylimit = int(os.environ.get("repeatedquerylimit", 3))
+slowqueryms = float(os.environ.get("slowqueryms", 100))
+
+_appdir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_placeholders = re.compile(r"\((?:\s*(?:\?|%s|%\(\w+\)s|:\w+)\s*,)+\s*(?:\?|%s|%\(\w+\)s|:\w+)\s*\)")
+_activetrackers = threading.local()
+
+
+class QueryBudgetExceeded(Exception):
+    """
+    Raised when a request or tracked block exceeds its query budget, repeats a statement too often or runs a slow
+    statement.
+    """
+    pass
+
+
+class TrackedStatement:
+    def __init__(self, shape: str, callsite: str):
+        self.shape = shape
+        self.callsite = callsite
+        self.count = 0
+        self.seconds = 0.0
+        self.slowest = 0.0
+
+
+class QueryTracker:
+    """
+    Records the statements of a request or block grouped by their shape, the SQL with IN lists collapsed, and the
+    application line that issued them first.
+    """
+    def __init__(self):
+        self.statements: 'OrderedDict[str, TrackedStatement]' = OrderedDict()
+        self.total = 0
+
+    def record(self, statement: str, seconds: float):
+        shape = _placeholders.sub("(?)", " ".join(statement.split()))
+        tracked = self.statements.get(shape)
+        if tracked is None:
+            tracked = TrackedStatement(shape=shape, callsite=_callsite())
+            self.statements[shape] = tracked
+        tracked.count += 1
+        tracked.seconds += seconds
+        tracked.slowest = max(tracked.slowest, seconds)
+        self.total += 1
+
+    def problems(self,
+                 maxqueries: Optional[int] = None,
+                 maxrepeats: Optional[int] = None,
+                 slowms: Optional[float] = None) -> List[str]:
+        """
+        Returns a description of every exceeded limit, limits that are None are not checked.
+        """
+        problems = []
+        if maxqueries is not None and self.total > maxqueries:
+            problems.append(f"{self.total} statements exceed the budget of {maxqueries}")
+        for tracked in self.statements.values():
+            if maxrepeats is not None and tracked.count > maxrepeats:
+                problems.append(f"Statement repeated {tracked.count} times from {tracked.callsite}: {tracked.shape}")
+            if slowms is not None and tracked.slowest * 1000 > slowms:
+                problems.append(f"Statement took {tracked.slowest * 1000:.1f} ms from {tracked.callsite}: "
+                                f"{tracked.shape}")
+        return problems
+
+
+def _callsite() -> str:
+    for frame in reversed(traceback.extract_stack()):
+        if frame.filename.startswith(_appdir) and not frame.filename.endswith(os.path.basename(__file__)):
+            return f"{os.path.relpath(frame.filename, _appdir)}:{frame.lineno} in {frame.name}"
+    return "unknown"
+
+
+def _trackers() -> list:
+    trackers = list(getattr(_activetrackers, "trackers", ()))
+    if has_request_context() and "querytracker" in g:
+        trackers.append(g.querytracker)
+    return trackers
+
+
+def instrumentengine(engine: Engine):
+    """
+    Registers the hooks that feed statements to the active trackers. Registering more than once is a no-op.
+    """
+    if event.contains(engine, "after_cursor_execute", _aftercursorexecute):
+        return
+    event.listen(engine, "before_cursor_execute", _beforecursorexecute)
+    event.listen(engine, "after_cursor_execute", _aftercursorexecute)
+
+
+def _beforecursorexecute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("querydetectorstarts", []).append(perf_counter())
+
+
+def _aftercursorexecute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = perf_counter() - conn.info["querydetectorstarts"].pop()
+    for tracker in _trackers():
+        tracker.record(statement, elapsed)
+
+
+@contextmanager
+def trackqueries(engine: Engine,
+                 maxqueries: Optional[int] = None,
+                 maxrepeats: Optional[int] = None,
+                 slowms: Optional[float] = None):
+    """
+    Tracks the statements executed by the current thread within the block, for example in tests:
+
+        with trackqueries(db.engine, maxqueries=3, maxrepeats=1):
+            client.get('/accounts', headers=headers)
+
+    Raises QueryBudgetExceeded at the end of the block if a limit was exceeded.
+    """
+    instrumentengine(engine)
+    tracker = QueryTracker()
+    trackers = getattr(_activetrackers, "trackers", [])
+    _activetrackers.trackers = trackers + [tracker]
+    try:
+        yield tracker
+    finally:
+        _activetrackers.trackers = trackers
+    problems = tracker.problems(maxqueries=maxqueries, maxrepeats=maxrepeats, slowms=slowms)
+    if problems:
+        raise QueryBudgetExceeded("\n".join(problems))
+
+
+def installquerydetector(app: Flask, engines: List[Engine]):
+    """
+    Checks every request against querybudget, repeatedquerylimit and slowqueryms when querydebug is "warn" or
+    "raise", counting the statements of all engines. Meant for development and test runs.
+    """
+    if querydebug not in ("warn", "raise"):
+        return
+    for engine in engines:
+        instrumentengine(engine)
+
+    @app.before_request
+    def startquerytracking():
+        g.querytracker = QueryTracker()
+
+    @app.after_request
+    def checkquerytracking(response):
+        tracker = g.pop("querytracker", None)
+        if tracker is None:
+            return response
+        problems = tracker.problems(maxqueries=querybudget, maxrepeats=repeatedquerylimit, slowms=slowqueryms)
+        if problems:
+            message = f"{request.method} {request.path}: " + "\n".join(problems)
+            if querydebug == "raise":
+                raise QueryBudgetExceeded(message)
+            logging.warning(message)
+        return response
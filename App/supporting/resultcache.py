@@ -0,0 +1,209 @@
+import os
+import pickle
+import sqlite3
+import threading
+from collections import OrderedDict
+from datetime import date
+from time import time
+from typing import Any, Dict, Hashable, Optional, Set, Tuple
+
+
+class ResultCache:
+    """
+    Base class of the caches for computed results of an account over a date range. Entries are keyed by
+    (accountid, startdate, enddate, *extra) and invalidated by account and date, so a write on a date only removes
+    the ranges ending on or after it. Invalidation only reaches the caches the writing process can see, other
+    gunicorn workers and hosts keep their entries, so callers put a version of the data in extra that changes with
+    every write.
+    """
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self._statslock = threading.Lock()
+
+    def get(self, key: Tuple) -> Optional[Any]:
+        value = self._get(key)
+        with self._statslock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return value
+
+    def set(self, key: Tuple, value: Any):
+        raise NotImplementedError()
+
+    def invalidate(self, accountid: int, fromdate: Optional[date]):
+        """
+        Removes the entries of an account whose range ends on or after fromdate, or all entries of the account if
+        fromdate is None.
+        """
+        raise NotImplementedError()
+
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations}
+
+    def _get(self, key: Tuple) -> Optional[Any]:
+        raise NotImplementedError()
+
+    @staticmethod
+    def _sizeof(value: Any) -> int:
+        if hasattr(value, "memory_usage"):
+            return int(value.memory_usage(deep=True).sum())
+        return len(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+
+    @staticmethod
+    def _copy(value: Any) -> Any:
+        return value.copy() if hasattr(value, "copy") else value
+
+
+class NoResultCache(ResultCache):
+    """
+    A cache that never stores anything.
+    """
+    def set(self, key: Tuple, value: Any):
+        pass
+
+    def invalidate(self, accountid: int, fromdate: Optional[date]):
+        pass
+
+    def _get(self, key: Tuple) -> Optional[Any]:
+        return None
+
+
+class MemoryResultCache(ResultCache):
+    """
+    An in-process LRU cache bounded by the memory size of the stored values. Values are copied on the way in and out
+    so callers can modify them.
+    """
+    def __init__(self, maxbytes: int):
+        super().__init__()
+        self.maxbytes = maxbytes
+        self._entries: 'OrderedDict[Tuple, Tuple[Any, int]]' = OrderedDict()
+        self._accountkeys: Dict[Hashable, Set[Tuple]] = dict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def set(self, key: Tuple, value: Any):
+        size = self._sizeof(value)
+        if size > self.maxbytes:
+            return
+        value = self._copy(value)
+        with self._lock:
+            self._remove(key)
+            self._entries[key] = (value, size)
+            self._accountkeys.setdefault(key[0], set()).add(key)
+            self._bytes += size
+            while self._bytes > self.maxbytes:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def invalidate(self, accountid: int, fromdate: Optional[date]):
+        with self._lock:
+            for key in list(self._accountkeys.get(accountid, ())):
+                if fromdate is None or key[2] >= fromdate:
+                    self._remove(key)
+                    self.invalidations += 1
+
+    def stats(self) -> Dict[str, int]:
+        return dict(super().stats(), entries=len(self._entries), bytes=self._bytes)
+
+    def _get(self, key: Tuple) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+        return self._copy(entry[0])
+
+    def _remove(self, key: Tuple):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        self._bytes -= entry[1]
+        keys = self._accountkeys[key[0]]
+        keys.discard(key)
+        if not keys:
+            del self._accountkeys[key[0]]
+
+
+class SqliteResultCache(ResultCache):
+    """
+    A cache stored in a local SQLite file that is shared by all gunicorn workers on a host. The least recently used
+    entries are removed when the pickled values exceed maxbytes. Hit and miss counters are per process.
+    """
+    def __init__(self, path: str, maxbytes: int):
+        super().__init__()
+        self.path = path
+        self.maxbytes = maxbytes
+        self._local = threading.local()
+        with self._connection() as connection:
+            connection.execute("CREATE TABLE IF NOT EXISTS results ("
+                               "key TEXT PRIMARY KEY, accountid INTEGER NOT NULL, enddate TEXT NOT NULL, "
+                               "value BLOB NOT NULL, size INTEGER NOT NULL, lastused REAL NOT NULL)")
+            connection.execute("CREATE INDEX IF NOT EXISTS ix_results_account ON results (accountid, enddate)")
+            connection.execute("CREATE INDEX IF NOT EXISTS ix_results_lastused ON results (lastused)")
+
+    def set(self, key: Tuple, value: Any):
+        data = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        if len(data) > self.maxbytes:
+            return
+        with self._connection() as connection:
+            connection.execute("INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?)",
+                               (repr(key), key[0], key[2].isoformat(), data, len(data), time()))
+            total = connection.execute("SELECT COALESCE(SUM(size), 0) FROM results").fetchone()[0]
+            while total > self.maxbytes:
+                oldest = connection.execute("SELECT key, size FROM results ORDER BY lastused LIMIT 1").fetchone()
+                connection.execute("DELETE FROM results WHERE key = ?", (oldest[0],))
+                total -= oldest[1]
+                self.evictions += 1
+
+    def invalidate(self, accountid: int, fromdate: Optional[date]):
+        with self._connection() as connection:
+            if fromdate is None:
+                cursor = connection.execute("DELETE FROM results WHERE accountid = ?", (accountid,))
+            else:
+                cursor = connection.execute("DELETE FROM results WHERE accountid = ? AND enddate >= ?",
+                                            (accountid, fromdate.isoformat()))
+            self.invalidations += cursor.rowcount
+
+    def stats(self) -> Dict[str, int]:
+        entries, size = self._connection().execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM results").fetchone()
+        return dict(super().stats(), entries=entries, bytes=size)
+
+    def _get(self, key: Tuple) -> Optional[Any]:
+        with self._connection() as connection:
+            row = connection.execute("SELECT value FROM results WHERE key = ?", (repr(key),)).fetchone()
+            if row is None:
+                return None
+            connection.execute("UPDATE results SET lastused = ? WHERE key = ?", (time(), repr(key)))
+        return pickle.loads(row[0])
+
+    def _connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, "connection", None)
+        if connection is None or getattr(self._local, "pid", None) != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=5)
+            connection.execute("PRAGMA journal_mode=WAL")
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+
+def createresultcache(backend: str, maxbytes: int, path: str) -> ResultCache:
+    if backend == "none":
+        return NoResultCache()
+    if backend == "sqlite":
+        return SqliteResultCache(path=path, maxbytes=maxbytes)
+    if backend == "memory":
+        return MemoryResultCache(maxbytes=maxbytes)
+    raise ValueError(f"Unknown result cache backend {backend}")
+
+
+performancecache = createresultcache(backend=os.environ.get("performancecache", "memory"),
+                                     maxbytes=int(os.environ.get("performancecachebytes", 64 * 1024 * 1024)),
+                                     path=os.environ.get("performancecachepath", "/tmp/performancecache.sqlite"))
@@ -0,0 +1,156 @@
+import logging
+from typing import Optional, Tuple
+from datetime import date
+from sqlalchemy.orm import Session
+from db.models import PortfolioValue, AccountTransaction, Investor
+import pandas as pd
+import numpy as np
+
+INITIALSHAREPRICE = 100.0
+
+
+class UnitPricing:
+    """
+    This class prices the portfolio in shares. Investor transactions, AccountTransaction rows with investor set, issue
+    shares when positive and redeem shares when negative, at the share price of the first PortfolioValue day on or
+    after the transaction. The totalvalue of that day is expected to include the transaction.
+
+    The price of a day is its value before the day's transactions divided by the shares outstanding the day before,
+    so the shares outstanding grow by value / (value - transactions) every day and the whole history is one
+    cumulative product. The first day, and a day after the portfolio was emptied, starts at the last price or
+    INITIALSHAREPRICE.
+    """
+    @classmethod
+    def updatefromdate(cls, session: Session, fromdate: Optional[date] = None) -> int:
+        """
+        Computes share prices, daily performance and the shares traded by each transaction from fromdate forward,
+        then the holdings of every investor. Without fromdate it continues after the last day with a share price,
+        pass an earlier date after values or investor transactions before that day changed.
+        :param session:
+        :param fromdate:
+        :return: number of priced days
+        """
+        prior = PortfolioValue.getlastpricedbefore(session=session, valuedate=fromdate)
+        priordate = prior.valuedate if prior else None
+        values = PortfolioValue.getvaluecolumnsafter(session=session, valuedate=priordate)
+        if not values:
+            cls.updateholdings(session=session)
+            return 0
+
+        valueids, valuedates, totalvalues = zip(*values)
+        valuedates = np.asarray(valuedates, dtype='datetime64[D]')
+        totalvalues = np.asarray(totalvalues, dtype=float)
+
+        transactions = AccountTransaction.getinvestortransactioncolumnsafter(session=session, valuedate=priordate)
+        transactionids, transactiondates, transactionvalues = zip(*transactions) if transactions else ((), (), ())
+        transactiondates = np.asarray(transactiondates, dtype='datetime64[D]')
+        transactionvalues = np.asarray(transactionvalues, dtype=float)
+        # Every transaction is priced on the first valuation day on or after it, later ones wait for the next run
+        valuationindex = np.searchsorted(valuedates, transactiondates, side='left')
+        priced = valuationindex < len(valuedates)
+        flows = np.bincount(valuationindex[priced], weights=transactionvalues[priced], minlength=len(valuedates))
+
+        priorshares = prior.totalvalue / prior.shareprice if prior else None
+        prices, shares = cls.calculateshareprices(values=totalvalues,
+                                                  flows=flows,
+                                                  priorshares=priorshares,
+                                                  priorprice=prior.shareprice if prior else None)
+        priorprices = np.concatenate(([prior.shareprice if prior else prices[0]], prices[:-1]))
+
+        PortfolioValue.updateprices(session=session, prices=[
+            {"id": valueid, "shareprice": price, "performance": performance}
+            for valueid, price, performance in zip(valueids, prices.tolist(), (prices / priorprices).tolist())])
+        AccountTransaction.updatesharestraded(session=session, shares=[
+            {"id": transactionid, "sharestraded": sharestraded}
+            for transactionid, sharestraded in zip(np.asarray(transactionids)[priced].tolist(),
+                                                   (transactionvalues[priced] /
+                                                    prices[valuationindex[priced]]).tolist())])
+        cls.updateholdings(session=session)
+        logging.info(f"Priced {len(prices)} days from {valuedates[0]}, {int(priced.sum())} investor transactions")
+        return len(prices)
+
+    @staticmethod
+    def calculateshareprices(values: np.ndarray,
+                             flows: np.ndarray,
+                             priorshares: Optional[float] = None,
+                             priorprice: Optional[float] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Calculates the share price and the shares outstanding of every day.
+        :param values: portfolio value of every day including its flows
+        :param flows: sum of the investor transactions priced on every day
+        :param priorshares: shares outstanding the day before the first day
+        :param priorprice: share price the day before the first day
+        :return: share prices and shares outstanding
+        """
+        prices = np.empty(len(values))
+        shares = np.empty(len(values))
+        outstanding, price = priorshares, priorprice
+        start = 0
+        while start < len(values):
+            if not outstanding or outstanding <= 0:
+                # Nothing outstanding, the day issues all shares at the last price
+                price = price or INITIALSHAREPRICE
+                prices[start] = price
+                shares[start] = outstanding = values[start] / price
+                start += 1
+                continue
+
+            basevalues = values[start:] - flows[start:]
+            emptied = np.flatnonzero(basevalues <= 0)
+            end = start + (emptied[0] if len(emptied) else len(basevalues))
+            shares[start:end] = outstanding * np.cumprod(values[start:end] / basevalues[:end - start])
+            # Value before the flows over the shares of the day before, a day that redeems all shares has no shares
+            # left to divide its value by
+            prices[start:end] = basevalues[:end - start] / np.concatenate(([outstanding], shares[start:end - 1]))
+            if end > start:
+                price = prices[end - 1]
+            # A day without value before its flows starts over at the last price
+            outstanding = shares[end - 1] if end == len(values) else 0.0
+            start = end
+        return prices, shares
+
+    @staticmethod
+    def updateholdings(session: Session):
+        """
+        Sets noofshares, averageacquisitioncost and netassetvalue of every investor with priced transactions.
+        """
+        last = PortfolioValue.getlastpricedbefore(session=session, valuedate=None)
+        if last is None:
+            return
+        Investor.updateholdings(session=session, holdings=[
+            {"id": investorid,
+             "noofshares": shares,
+             "averageacquisitioncost": boughtvalue / boughtshares if boughtshares else None,
+             "netassetvalue": shares * last.shareprice}
+            for investorid, shares, boughtvalue, boughtshares in
+            AccountTransaction.getinvestorholdings(session=session)])
+
+    @staticmethod
+    def getnavseries(session: Session, investorid: int, startdate: date, enddate: date) -> pd.DataFrame:
+        """
+        Returns the shares, share price and net asset value of an investor for every priced day of the period.
+        :param session:
+        :param investorid:
+        :param startdate:
+        :param enddate:
+        :return: DataFrame indexed by valuedate
+        """
+        prices = PortfolioValue.getsharepricesforperiod(session=session, startdate=startdate, enddate=enddate)
+        if not prices:
+            return pd.DataFrame()
+
+        valuedates, shareprices = zip(*prices)
+        df = pd.DataFrame({"shareprice": np.asarray(shareprices, dtype=float)},
+                          index=pd.DatetimeIndex(np.asarray(valuedates, dtype='datetime64[D]'), name="valuedate"))
+
+        df['shares'] = 0.0
+        traded = AccountTransaction.getsharestradedforinvestor(session=session, investorid=investorid, enddate=enddate)
+        if traded:
+            tradedates, tradedshares = zip(*traded)
+            # Holdings on a day are all shares traded on or before it
+            holdings = np.cumsum(np.asarray(tradedshares, dtype=float))
+            positions = np.searchsorted(np.asarray(tradedates, dtype='datetime64[D]'),
+                                        df.index.values.astype('datetime64[D]'), side='right') - 1
+            df['shares'] = np.where(positions >= 0, holdings[np.maximum(positions, 0)], 0.0)
+        df['nav'] = df['shares'] * df['shareprice']
+        return df
@@ -0,0 +1,21 @@
+"""
+Prices the portfolio in shares and updates the investor holdings. rollupportfolio.py prices the days it rolls up,
+run this after investor transactions changed:
+
+    python updateshareprices.py               continues after the last priced day
+    python updateshareprices.py 2024-01-31    recomputes from the given day, after earlier values or investor
+                                              transactions changed
+"""
+import logging
+import sys
+from dateutil.parser import parse
+from db import db
+from supporting.unitpricing import UnitPricing
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    fromdate = parse(sys.argv[1]).date() if len(sys.argv) > 1 else None
+    with db.Session() as session:
+        days = UnitPricing.updatefromdate(session=session, fromdate=fromdate)
+        session.commit()
+    print(f"Priced {days} days")
@@ -0,0 +1,84 @@
+"""
+Compares the ORM based PerformanceCalculator path with the column projected path.
+
+The benchmark seeds an in-memory SQLite database with one account and N daily values and times both paths including
+the database reads. The ORM path cannot handle transactions, so none are seeded.
+
+Usage: python benchmarks/benchmark_performancecalculator.py [rows ...]
+"""
+import os
+import sys
+from datetime import date, timedelta
+from time import perf_counter
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "App"))
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from db.models import Base, Account, AccountValue
+from supporting.performancecalculator import PerformanceCalculator
+
+DEFAULT_ROWS = [1000, 10000, 100000]
+REPEATS = 3
+
+
+def seed(session, rows: int) -> Account:
+    account = Account(accountid="BENCH", name="Benchmark", currency="USD", timezone="UTC")
+    session.add(account)
+    session.flush([account])
+
+    startdate = date(2000, 1, 1)
+    value = 100000.0
+    records = []
+    for day in range(rows):
+        value *= 1.0 + ((day * 7919) % 200 - 100) / 10000.0
+        records.append({"accountdbid": account.id, "valuedate": startdate + timedelta(days=day), "value": value})
+    session.execute(AccountValue.__table__.insert(), records)
+    session.commit()
+    return account
+
+
+def timeit(func) -> float:
+    best = None
+    for _ in range(REPEATS):
+        start = perf_counter()
+        func()
+        elapsed = perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def run(rows: int):
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    Session = sessionmaker(bind=engine, expire_on_commit=False)
+
+    with Session() as session:
+        account = seed(session, rows)
+        startdate = date(2000, 1, 1)
+        enddate = startdate + timedelta(days=rows)
+
+    def ormpath():
+        with Session() as session:
+            values = AccountValue.getaccountvalueforperiod(session=session,
+                                                           accountid=account.id,
+                                                           startdate=startdate,
+                                                           enddate=enddate)
+            PerformanceCalculator.calculateperformancefromaccountvalues(session=session, accountvalues=values)
+
+    def columnpath():
+        with Session() as session:
+            PerformanceCalculator.calculateperformanceforperiod(session=session,
+                                                                accountids=[account.id],
+                                                                startdate=startdate,
+                                                                enddate=enddate)
+
+    ormtime = timeit(ormpath)
+    columntime = timeit(columnpath)
+    print(f"{rows:>8} rows  orm: {ormtime * 1000:9.1f} ms  columns: {columntime * 1000:9.1f} ms  "
+          f"speedup: {ormtime / columntime:5.1f}x")
+
+
+if __name__ == '__main__':
+    for rowcount in [int(x) for x in sys.argv[1:]] or DEFAULT_ROWS:
+        run(rowcount)
@@ -0,0 +1,76 @@
+"""
+Times a full rebuild of PortfolioValue over 10 years of daily account values.
+
+The per day path reads the day's total and writes it with PortfolioValue.setaccountvaluefordate, one select and one
+write per day. The roll-up path is PortfolioRollup.rebuild, once in this process and once with a process pool. Both
+include the unit pricing of the rebuilt days. A SQLite file is used unless a database URL is passed, SQLite serializes
+the writers of the pool so the parallel gain shows best on MySQL.
+
+Usage: python benchmarks/benchmark_portfoliorollup.py [accounts] [processes] [databaseurl]
+"""
+import os
+import sys
+import tempfile
+from time import perf_counter
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "App"))
+
+from sqlalchemy import create_engine, delete, func, select
+from sqlalchemy.orm import sessionmaker
+from db.models import Account, AccountValue, PortfolioValue
+from supporting.portfoliorollup import PortfolioRollup
+from supporting.unitpricing import UnitPricing
+from seed import seed, DatasetSize
+
+DAYS = 3650
+DEFAULT_ACCOUNTS = 20
+
+
+def perdaypath(Session):
+    with Session() as session:
+        accountids = Account.getactiveaccountids(session=session)
+        valuedates = session.execute(select(AccountValue.valuedate).where(AccountValue.accountdbid.in_(accountids)).
+                                     distinct().order_by(AccountValue.valuedate)).scalars().all()
+        for valuedate in valuedates:
+            total = session.execute(select(func.sum(AccountValue.value)).
+                                    where(AccountValue.accountdbid.in_(accountids)).
+                                    where(AccountValue.valuedate == valuedate)).scalar()
+            PortfolioValue.setaccountvaluefordate(session=session, valuedate=valuedate, totalvalue=total)
+            session.flush()
+        UnitPricing.updatefromdate(session=session, fromdate=valuedates[0])
+        session.commit()
+
+
+def timeit(Session, func) -> float:
+    with Session() as session:
+        session.execute(delete(PortfolioValue))
+        session.commit()
+    start = perf_counter()
+    func()
+    return perf_counter() - start
+
+
+def run(databaseurl: str, accounts: int, processes: int):
+    seed(databaseurl, DatasetSize(users=1, accountsperuser=accounts, days=DAYS, positionsperaccount=1,
+                                  transactionsperaccount=2))
+    engine = create_engine(databaseurl)
+    Session = sessionmaker(bind=engine, expire_on_commit=False)
+
+    perday = timeit(Session, lambda: perdaypath(Session))
+    serial = timeit(Session, lambda: PortfolioRollup.rebuild(databaseurl=databaseurl, processes=1))
+    parallel = timeit(Session, lambda: PortfolioRollup.rebuild(databaseurl=databaseurl, processes=processes))
+    engine.dispose()
+    print(f"{DAYS} days x {accounts} accounts")
+    print(f"  per day:             {perday * 1000:9.1f} ms")
+    print(f"  roll-up, 1 process:  {serial * 1000:9.1f} ms  speedup: {perday / serial:5.1f}x")
+    print(f"  roll-up, {processes} processes: {parallel * 1000:9.1f} ms  speedup: {perday / parallel:5.1f}x")
+
+
+if __name__ == '__main__':
+    accounts = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_ACCOUNTS
+    processes = int(sys.argv[2]) if len(sys.argv) > 2 else os.cpu_count() or 1
+    if len(sys.argv) > 3:
+        run(sys.argv[3], accounts, processes)
+    else:
+        with tempfile.TemporaryDirectory() as directory:
+            run(f"sqlite:///{os.path.join(directory, 'rollup.sqlite')}", accounts, processes)
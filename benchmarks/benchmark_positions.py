@@ -0,0 +1,93 @@
+"""
+Compares the throughput of the single-item position write path with the batch upsert path.
+
+The single-item path mirrors Positions.post: one lookup, assignment and commit per position. The batch path mirrors
+the batch mode of Positions.post: one lookup and one executemany per batch and a single commit. Both run against an
+in-memory SQLite database, half of the positions of each run already exist.
+
+Usage: python benchmarks/benchmark_positions.py [positions ...]
+"""
+import os
+import sys
+from datetime import datetime, timedelta
+from time import perf_counter
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "App"))
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from db.models import Base, Account, Position
+
+DEFAULT_POSITIONS = [100, 1000, 5000]
+BATCHSIZE = 500
+
+
+def positionrows(count: int, offset: int):
+    entry = datetime(2020, 1, 1)
+    return [{
+        "brokerpositionid": f"DEAL{offset + x}",
+        "brokerinstrumentidentifier": "CS.D.EURUSD.CFD.IP",
+        "instrumentname": "EURUSD",
+        "status": "OPEN",
+        "expirydate": None,
+        "size": 1.0,
+        "entrydatetime": entry + timedelta(minutes=x),
+        "entryprice": 1.1,
+        "stoplossprice": 1.0,
+        "takeprofitprice": 1.2,
+        "exitdatetime": None,
+        "exitprice": None,
+        "profit": None
+    } for x in range(count)]
+
+
+def setup(count: int):
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    Session = sessionmaker(bind=engine, expire_on_commit=False)
+    with Session() as session:
+        account = Account(accountid="BENCH")
+        session.add(account)
+        session.flush([account])
+        Position.upsertpositions(session=session, accountid=account.id, positions=positionrows(count // 2, 0))
+        session.commit()
+    return Session, account.id
+
+
+def singleitem(Session, accountid: int, rows):
+    with Session() as session:
+        for row in rows:
+            dbpos = Position.getpositionwithaccountandbrokerid(session=session,
+                                                               accountid=accountid,
+                                                               brokerpositionid=row['brokerpositionid'])
+            if not dbpos:
+                dbpos = Position(accountid=accountid, brokerpositionid=row['brokerpositionid'])
+                session.add(dbpos)
+            for key, value in row.items():
+                setattr(dbpos, key, value)
+            session.commit()
+
+
+def batch(Session, accountid: int, rows):
+    with Session() as session:
+        for start in range(0, len(rows), BATCHSIZE):
+            Position.upsertpositions(session=session, accountid=accountid, positions=rows[start:start + BATCHSIZE])
+        session.commit()
+
+
+def run(count: int):
+    rows = positionrows(count, count // 4)
+    timings = {}
+    for name, func in (("single", singleitem), ("batch", batch)):
+        Session, accountid = setup(count)
+        start = perf_counter()
+        func(Session, accountid, rows)
+        timings[name] = perf_counter() - start
+
+    print(f"{count:>6} positions  single: {count / timings['single']:9.0f}/s  "
+          f"batch: {count / timings['batch']:9.0f}/s  speedup: {timings['single'] / timings['batch']:5.1f}x")
+
+
+if __name__ == '__main__':
+    for positioncount in [int(x) for x in sys.argv[1:]] or DEFAULT_POSITIONS:
+        run(positioncount)
@@ -0,0 +1,134 @@
+"""
+Compares rows per second of the ORM read path with the Core select read path of the GET endpoints.
+
+Each endpoint is measured at the model layer including serialization to dicts, against a temporary SQLite
+database with one user, many accounts and strategies, positions and daily account values. The performance cache is
+turned off so the account values are read from the persisted series every time.
+
+Usage: python benchmarks/benchmark_readpath.py [rows]
+"""
+import os
+import sys
+import tempfile
+from datetime import date, datetime, timedelta
+from time import perf_counter
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "App"))
+
+# db connects to databaseurl on import, the benchmark seeds its own database instead of a configured one
+databasedirectory = tempfile.TemporaryDirectory()
+os.environ["databaseurl"] = f"sqlite:///{os.path.join(databasedirectory.name, 'readpath.sqlite')}"
+
+from db import db
+from db.models import User, Account, UserAccountLink, Strategy, StrategyUserLink, Position, AccountValue
+from supporting import performanceseries
+from supporting.performancecalculator import PerformanceCalculator
+from supporting.performanceseries import PerformanceSeries
+from supporting.resultcache import NoResultCache
+from resources.helpers import rowtodict
+
+DEFAULT_ROWS = 5000
+REPEATS = 3
+
+
+def seed(Session, rows: int):
+    with Session() as session:
+        user = User(username="bench", password="-", isactive=True)
+        session.add(user)
+        session.flush([user])
+        accountcount = max(1, rows // 50)
+        strategies = [Strategy(name=f"Strategy {x}", description="-", startdate=date(2000, 1, 1))
+                      for x in range(accountcount)]
+        session.add_all(strategies)
+        session.flush(strategies)
+        accounts = [Account(accountid=f"ACC{x}", name=f"Account {x}", currency="USD", timezone="UTC",
+                            executingstrategy=strategies[x].id) for x in range(accountcount)]
+        session.add_all(accounts)
+        session.flush(accounts)
+        session.add_all([StrategyUserLink(userid=user.id, strategyid=x.id) for x in strategies])
+        session.add_all([UserAccountLink(userid=user.id, accountid=x.id, isowner=True) for x in accounts])
+        Position.upsertpositions(session=session, accountid=accounts[0].id, positions=[{
+            "brokerpositionid": f"DEAL{x}", "brokerinstrumentidentifier": "CS.D.EURUSD.CFD.IP",
+            "instrumentname": "EURUSD", "status": "OPEN" if x % 10 == 0 else "CLOSED", "size": 1.0,
+            "entrydatetime": datetime(2000, 1, 1) + timedelta(hours=x), "entryprice": 1.1, "stoplossprice": 1.0,
+            "takeprofitprice": 1.2, "exitdatetime": datetime(2000, 1, 1) + timedelta(hours=x + 1),
+            "exitprice": 1.15, "profit": 5.0} for x in range(rows)])
+        AccountValue.upsertvalues(session=session, values=[{
+            "accountdbid": accounts[0].id, "valuedate": date(2000, 1, 1) + timedelta(days=x),
+            "value": 100000.0 + x, "executedstrategyid": None} for x in range(rows)])
+        PerformanceSeries.updatefromdate(session=session, accountid=accounts[0].id, fromdate=None)
+        session.commit()
+        return user.id, accounts[0].id, accountcount
+
+
+def best(func) -> float:
+    timings = []
+    for _ in range(REPEATS):
+        start = perf_counter()
+        func()
+        timings.append(perf_counter() - start)
+    return min(timings)
+
+
+def run(rows: int):
+    performanceseries.performancecache = NoResultCache()
+    Session = db.Session
+    userid, accountid, accountcount = seed(Session, rows)
+    enddate = date(2000, 1, 1) + timedelta(days=rows)
+
+    def ormaccounts():
+        with Session() as session:
+            for account in Account.getaccountsbyuserid(session=session, userid=userid):
+                strategy = Strategy.getstrategywithid(session=session, id=account.executingstrategy)
+                {"id": account.id, "accountname": account.name, "accountid": account.accountid,
+                 "currency": account.currency, "timezone": account.timezone,
+                 "executingstrategyid": account.executingstrategy,
+                 "executingstrategyname": strategy.name if strategy else None, "isactive": account.isactive}
+
+    def coreaccounts():
+        with Session() as session:
+            [rowtodict(x) for x in Account.getaccountlistingforuser(session=session, userid=userid)]
+
+    def ormstrategies():
+        with Session() as session:
+            [{"id": x.id, "name": x.name, "description": x.description, "startdate": x.startdate.isoformat()}
+             for x in Strategy.getstrategiesforuser(session=session, userid=userid)]
+
+    def corestrategies():
+        with Session() as session:
+            [rowtodict(x) for x in Strategy.getstrategyrowsforuser(session=session, userid=userid)]
+
+    def ormpositions():
+        with Session() as session:
+            [{column: getattr(x, column).isoformat() if isinstance(getattr(x, column), date) else getattr(x, column)
+              for column in Position.__table__.columns.keys() if column != "id"}
+             for x in Position.getallpositionsforaccount(session=session, accountid=accountid)]
+
+    def corepositions():
+        with Session() as session:
+            [rowtodict(x, exclude=("id",))
+             for x in session.execute(Position.getpositionsselect(accountid=accountid)).mappings()]
+
+    def ormaccountvalues():
+        with Session() as session:
+            values = AccountValue.getaccountvalueforperiod(session=session, accountid=accountid,
+                                                           startdate=date(2000, 1, 1), enddate=enddate)
+            PerformanceCalculator.calculateperformancefromaccountvalues(session=session, accountvalues=values)
+
+    def coreaccountvalues():
+        with Session() as session:
+            PerformanceSeries.getperformanceforperiod(session=session, accountid=accountid,
+                                                      startdate=date(2000, 1, 1), enddate=enddate)
+
+    for name, count, orm, core in (("accounts", accountcount, ormaccounts, coreaccounts),
+                                   ("strategies", accountcount, ormstrategies, corestrategies),
+                                   ("positions", rows, ormpositions, corepositions),
+                                   ("accountvalues", rows, ormaccountvalues, coreaccountvalues)):
+        ormtime = best(orm)
+        coretime = best(core)
+        print(f"{name:>14} {count:>7} rows  orm: {count / ormtime:10.0f} rows/s  core: {count / coretime:10.0f} rows/s"
+              f"  speedup: {ormtime / coretime:5.1f}x")
+
+
+if __name__ == '__main__':
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_ROWS)
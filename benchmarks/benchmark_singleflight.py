@@ -0,0 +1,80 @@
+"""
+Shows the effect of request coalescing on a burst of identical performance requests.
+
+A burst of threads asks for the same account range at the same moment, once with every thread running the
+computation and once through SingleFlight. The benchmark reports wall time, process CPU time and the number of
+database statements of each run. The account values live in a SQLite file so the threads use real connections.
+
+Usage: python benchmarks/benchmark_singleflight.py [threads] [days]
+"""
+import os
+import sys
+import tempfile
+import threading
+from datetime import date, timedelta
+from time import perf_counter, process_time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "App"))
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from db.models import Base, Account, AccountValue
+from supporting.performancecalculator import PerformanceCalculator
+from supporting.singleflight import SingleFlight
+
+DEFAULT_THREADS = 16
+DEFAULT_DAYS = 20000
+
+
+def run(threads: int, days: int):
+    with tempfile.TemporaryDirectory() as directory:
+        engine = create_engine(f"sqlite:///{os.path.join(directory, 'bench.sqlite')}",
+                               pool_size=threads, max_overflow=0)
+        Base.metadata.create_all(engine)
+        Session = sessionmaker(bind=engine, expire_on_commit=False)
+        startdate = date(1970, 1, 1)
+        enddate = startdate + timedelta(days=days)
+        with Session() as session:
+            account = Account(accountid="BENCH")
+            session.add(account)
+            session.flush([account])
+            AccountValue.upsertvalues(session=session, values=[{
+                "accountdbid": account.id, "valuedate": startdate + timedelta(days=x),
+                "value": 100000.0 + x, "executedstrategyid": None} for x in range(days)])
+            session.commit()
+
+        statements = [0]
+        event.listen(engine, "before_cursor_execute", lambda *args: statements.__setitem__(0, statements[0] + 1))
+
+        def compute():
+            with Session() as session:
+                return PerformanceCalculator.calculateperformanceforperiod(session=session,
+                                                                           accountids=[account.id],
+                                                                           startdate=startdate,
+                                                                           enddate=enddate)
+
+        for name, flight in (("independent", None), ("singleflight", SingleFlight())):
+            barrier = threading.Barrier(threads)
+
+            def request():
+                barrier.wait()
+                if flight:
+                    flight.do((account.id, startdate, enddate), compute)
+                else:
+                    compute()
+
+            statements[0] = 0
+            workers = [threading.Thread(target=request) for _ in range(threads)]
+            wallstart, cpustart = perf_counter(), process_time()
+            for worker in workers:
+                worker.start()
+            for worker in workers:
+                worker.join()
+            print(f"{name:>13} {threads} requests  wall: {(perf_counter() - wallstart) * 1000:8.1f} ms  "
+                  f"cpu: {(process_time() - cpustart) * 1000:8.1f} ms  statements: {statements[0]}")
+        engine.dispose()
+
+
+if __name__ == '__main__':
+    run(threads=int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_THREADS,
+        days=int(sys.argv[2]) if len(sys.argv) > 2 else DEFAULT_DAYS)
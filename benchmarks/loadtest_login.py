@@ -0,0 +1,87 @@
+"""
+Measures the latency of a cheap endpoint while logins are running against a live server.
+
+The script first measures GET /strategies alone, then again while loginthreads threads log in continuously, and
+prints p50/p99 of both runs and the number of logins rejected with 503.
+
+Usage: python benchmarks/loadtest_login.py <baseurl> <username> <password> [requests] [loginthreads]
+"""
+import json
+import sys
+import threading
+import urllib.error
+import urllib.request
+from time import perf_counter
+
+
+def post(url: str, body: dict, token: str = None) -> tuple:
+    headers = {"Content-Type": "application/json"}
+    if token:
+        headers["Authorization"] = f"Bearer {token}"
+    request = urllib.request.Request(url, data=json.dumps(body).encode(), headers=headers, method="POST")
+    try:
+        with urllib.request.urlopen(request) as response:
+            return response.status, json.loads(response.read())
+    except urllib.error.HTTPError as e:
+        return e.code, None
+
+
+def get(url: str, token: str) -> int:
+    request = urllib.request.Request(url, headers={"Authorization": f"Bearer {token}"})
+    with urllib.request.urlopen(request) as response:
+        response.read()
+        return response.status
+
+
+def percentile(values: list, fraction: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def measure(baseurl: str, token: str, requests: int) -> list:
+    latencies = []
+    for _ in range(requests):
+        start = perf_counter()
+        get(f"{baseurl}/strategies", token)
+        latencies.append(perf_counter() - start)
+    return latencies
+
+
+def run(baseurl: str, username: str, password: str, requests: int, loginthreads: int):
+    status, body = post(f"{baseurl}/login", {"username": username, "password": password})
+    if status != 200:
+        raise SystemExit(f"Login failed with {status}")
+    token = body['accesstoken']
+
+    idle = measure(baseurl, token, requests)
+
+    stop = threading.Event()
+    logins = {"ok": 0, "rejected": 0}
+
+    def loginloop():
+        while not stop.is_set():
+            loginstatus, _ = post(f"{baseurl}/login", {"username": username, "password": password})
+            logins["ok" if loginstatus == 200 else "rejected"] += 1
+
+    threads = [threading.Thread(target=loginloop, daemon=True) for _ in range(loginthreads)]
+    for thread in threads:
+        thread.start()
+    underload = measure(baseurl, token, requests)
+    stop.set()
+    for thread in threads:
+        thread.join()
+
+    for name, latencies in (("idle", idle), (f"{loginthreads} login threads", underload)):
+        print(f"{name:>20}  p50: {percentile(latencies, 0.5) * 1000:7.1f} ms  "
+              f"p99: {percentile(latencies, 0.99) * 1000:7.1f} ms")
+    print(f"logins: {logins['ok']} ok, {logins['rejected']} rejected")
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 4:
+        raise SystemExit(__doc__)
+    run(baseurl=sys.argv[1].rstrip("/"),
+        username=sys.argv[2],
+        password=sys.argv[3],
+        requests=int(sys.argv[4]) if len(sys.argv) > 4 else 200,
+        loginthreads=int(sys.argv[5]) if len(sys.argv) > 5 else 8)
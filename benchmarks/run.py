@@ -0,0 +1,329 @@
+"""
+Runs the benchmark suite against a local SQLite stand-in database.
+
+The suite seeds a synthetic dataset (see seed.py), runs micro-benchmarks of the performance calculations and model
+queries in-process, then starts the API with gunicorn on the same database and drives load against every endpoint.
+Each benchmark reports throughput and p50/p95/p99 latency. Results are written as JSON named after the time and git
+commit, so runs can be compared with --compare.
+
+Usage: python benchmarks/run.py [--users N] [--accounts M] [--days D] [--positions P] [--transactions T]
+                                [--requests R] [--concurrency C] [--skip-http] [--output DIR] [--compare FILE]
+"""
+import argparse
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import urllib.error
+import urllib.request
+from datetime import date, datetime, timedelta
+from time import perf_counter, sleep
+
+benchmarkdir = os.path.dirname(os.path.abspath(__file__))
+appdir = os.path.join(benchmarkdir, "..", "App")
+sys.path.insert(0, appdir)
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from db.models import Account, AccountValue, AccountTransaction, AccountChange, Position, Strategy, UserAccountLink
+from seed import seed, DatasetSize, BENCHMARKPASSWORD
+from supporting import performanceseries
+from supporting.performancecalculator import PerformanceCalculator
+from supporting.resultcache import NoResultCache
+
+
+def summarize(latencies: list, elapsed: float, errors: int = 0) -> dict:
+    ordered = sorted(latencies)
+
+    def percentile(fraction: float) -> float:
+        return round(ordered[min(len(ordered) - 1, int(len(ordered) * fraction))] * 1000, 3) if ordered else None
+
+    return {"count": len(latencies),
+            "errors": errors,
+            "throughput": round(len(latencies) / elapsed, 1) if elapsed else None,
+            "p50ms": percentile(0.50),
+            "p95ms": percentile(0.95),
+            "p99ms": percentile(0.99)}
+
+
+def runmicro(databaseurl: str, seeded: dict, repeats: int) -> dict:
+    # Measure the computation itself, not the result cache
+    performanceseries.performancecache = NoResultCache()
+
+    engine = create_engine(databaseurl)
+    Session = sessionmaker(bind=engine, expire_on_commit=False)
+    user = next(iter(seeded['users'].values()))
+    accountid = user['accountids'][0]
+    enddate = date.today()
+    startdate = enddate - timedelta(days=365)
+    firstdate = enddate - timedelta(days=seeded['size']['days'])
+
+    with Session() as session:
+        values = AccountValue.getvaluecolumnsforperiod(session=session, accountids=[accountid],
+                                                       startdate=firstdate, enddate=enddate)
+        transactions = AccountTransaction.getperformancetransactioncolumnsforperiod(
+            session=session, startdate=firstdate, enddate=enddate, accountids=[accountid])
+    valuedates, valueamounts, _ = zip(*values)
+    transactiondates, transactionvalues, _ = zip(*transactions) if transactions else (None, None, None)
+
+    benchmarks = {
+        "calculator.fromseries.fullhistory": lambda session: PerformanceCalculator.calculateperformancefromseries(
+            valuedates=valuedates, values=valueamounts,
+            transactiondates=transactiondates, transactionvalues=transactionvalues),
+        "calculator.forperiod.fullhistory": lambda session: PerformanceCalculator.calculateperformanceforperiod(
+            session=session, accountids=[accountid], startdate=firstdate, enddate=enddate),
+        "calculator.forperiod.allaccounts": lambda session: PerformanceCalculator.calculateperformanceforperiod(
+            session=session, accountids=user['accountids'], startdate=firstdate, enddate=enddate),
+        "series.getperformanceforperiod.1y": lambda session: performanceseries.PerformanceSeries.
+        getperformanceforperiod(session=session, accountid=accountid, startdate=startdate, enddate=enddate),
+        "model.getaccountlistingforuser": lambda session: Account.getaccountlistingforuser(
+            session=session, userid=user['id']),
+        "model.getstrategyrowsforuser": lambda session: Strategy.getstrategyrowsforuser(
+            session=session, userid=user['id']),
+        "model.getrightsforuser": lambda session: UserAccountLink.getrightsforuser(session=session, userid=user['id']),
+        "model.getpositionsselect.all": lambda session: session.execute(
+            Position.getpositionsselect(accountid=accountid)).all(),
+        "model.getpositionsselect.page100": lambda session: session.execute(
+            Position.getpositionsselect(accountid=accountid).limit(101)).all(),
+        "model.getvaluecolumnsforperiod.1y": lambda session: AccountValue.getvaluecolumnsforperiod(
+            session=session, accountids=[accountid], startdate=startdate, enddate=enddate),
+        "model.getperformancetransactioncolumnsforperiod.1y": lambda session: AccountTransaction.
+        getperformancetransactioncolumnsforperiod(session=session, startdate=startdate, enddate=enddate,
+                                                  accountids=[accountid]),
+        "model.getdailytotalsforperiod.allaccounts": lambda session: AccountValue.getdailytotalsforperiod(
+            session=session, startdate=firstdate, enddate=enddate, accountids=user['accountids']),
+        "model.getperformancetransactiontotalsforperiod.allaccounts": lambda session: AccountTransaction.
+        getperformancetransactiontotalsforperiod(session=session, startdate=firstdate, enddate=enddate,
+                                                 accountids=user['accountids']),
+        "calculator.strategy.1y": lambda session: PerformanceCalculator.calculatestrategyperformanceforperiod(
+            session=session, strategyid=user['strategyid'], startdate=startdate, enddate=enddate),
+        "series.getperformanceforaccounts.1y": lambda session: performanceseries.PerformanceSeries.
+        getperformanceforaccounts(session=session, accountids=user['accountids'], startdate=startdate, enddate=enddate),
+        "calculator.foraccounts.fullhistory": lambda session: PerformanceCalculator.calculateperformanceforaccounts(
+            session=session, accountids=user['accountids'], startdate=firstdate, enddate=enddate),
+        "model.accountchange.getversion": lambda session: AccountChange.getversion(
+            session=session, accountid=accountid, kind="values"),
+    }
+
+    results = dict()
+    with Session() as session:
+        for name, func in benchmarks.items():
+            func(session)
+            latencies = []
+            started = perf_counter()
+            for _ in range(repeats):
+                start = perf_counter()
+                func(session)
+                latencies.append(perf_counter() - start)
+            results[name] = summarize(latencies, perf_counter() - started)
+    engine.dispose()
+    return results
+
+
+class Client:
+    def __init__(self, baseurl: str):
+        self.baseurl = baseurl
+
+    def request(self, method: str, path: str, token: str = None, body=None) -> tuple:
+        headers = {"Content-Type": "application/json"} if body is not None else {}
+        if token:
+            headers["Authorization"] = f"Bearer {token}"
+        data = json.dumps(body).encode() if body is not None else None
+        request = urllib.request.Request(self.baseurl + path, data=data, headers=headers, method=method)
+        try:
+            with urllib.request.urlopen(request, timeout=60) as response:
+                return response.status, response.read()
+        except urllib.error.HTTPError as e:
+            return e.code, e.read()
+
+
+def startserver(databaseurl: str, port: int) -> subprocess.Popen:
+    environment = dict(os.environ, databaseurl=databaseurl, JWTSecret="benchmark-secret-" + "x" * 32)
+    server = subprocess.Popen([sys.executable, "-m", "gunicorn", "--config", "gunicorn.cfg",
+                               "--bind", f"127.0.0.1:{port}", "--log-level", "warning", "app:app"],
+                              cwd=appdir, env=environment)
+    for _ in range(100):
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=1):
+                return server
+        except OSError:
+            if server.poll() is not None:
+                raise SystemExit("Server did not start")
+            sleep(0.2)
+    server.terminate()
+    raise SystemExit("Server did not start")
+
+
+def runhttp(databaseurl: str, seeded: dict, requests: int, concurrency: int) -> dict:
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        port = probe.getsockname()[1]
+    server = startserver(databaseurl, port)
+    client = Client(f"http://127.0.0.1:{port}")
+    try:
+        sessions = []
+        for username, user in seeded['users'].items():
+            status, body = client.request("POST", "/login", body={"username": username,
+                                                                  "password": BENCHMARKPASSWORD})
+            if status != 200:
+                raise SystemExit(f"Login of {username} failed with {status}")
+            tokens = json.loads(body)
+            sessions.append(dict(user, accesstoken=tokens['accesstoken'], refreshtoken=tokens['refreshtoken'],
+                                 username=username))
+
+        # Investors can only be read by admins, the seed makes bench0 one
+        admin = next(x for x in sessions if x['username'] == "bench0")
+        today = date.today()
+        yearago = (today - timedelta(days=365)).isoformat()
+        counter = iter(range(10 ** 9))
+
+        def position(number: int) -> dict:
+            return {"brokerpositionid": f"LOAD{number}", "brokerinstrumentidentifier": "CS.D.EURUSD.CFD.IP",
+                    "instrumentname": "EURUSD", "status": "OPEN", "size": 1,
+                    "entrydatetime": datetime.now().isoformat(), "entryprice": 1.1, "stoplossprice": 1.0,
+                    "takeprofitprice": 1.2}
+
+        scenarios = {
+            "POST /login": lambda s: ("POST", "/login", None,
+                                      {"username": s['username'], "password": BENCHMARKPASSWORD}),
+            "POST /login/refresh": lambda s: ("POST", "/login/refresh", s['refreshtoken'], None),
+            "GET /accounts": lambda s: ("GET", "/accounts", s['accesstoken'], None),
+            "GET /strategies": lambda s: ("GET", "/strategies", s['accesstoken'], None),
+            "GET /strategies/performance": lambda s: ("GET", f"/strategies/performance?strategyid={s['strategyid']}"
+                                                             f"&startdate={yearago}&enddate={today.isoformat()}",
+                                                      s['accesstoken'], None),
+            "GET /positions": lambda s: ("GET", f"/positions?accountid={s['accountids'][0]}", s['accesstoken'], None),
+            "GET /positions?limit=100": lambda s: ("GET", f"/positions?accountid={s['accountids'][0]}&limit=100",
+                                                   s['accesstoken'], None),
+            "GET /positions?format=ndjson": lambda s: ("GET", f"/positions?accountid={s['accountids'][0]}"
+                                                              f"&format=ndjson", s['accesstoken'], None),
+            "GET /accountvalues": lambda s: ("GET", f"/accountvalues?accountid={s['accountids'][0]}"
+                                                    f"&startdate={yearago}&enddate={today.isoformat()}",
+                                             s['accesstoken'], None),
+            "GET /accountvalues?accountids=all": lambda s: ("GET", f"/accountvalues?accountids=all&startdate={yearago}"
+                                                                   f"&enddate={today.isoformat()}",
+                                                            s['accesstoken'], None),
+            "GET /accountvalues/analytics": lambda s: ("GET", f"/accountvalues/analytics"
+                                                              f"?accountid={s['accountids'][0]}"
+                                                              f"&startdate={yearago}&enddate={today.isoformat()}",
+                                                       s['accesstoken'], None),
+            "POST /accountvalues": lambda s: ("POST", "/accountvalues", s['accesstoken'],
+                                              {"accountid": s['accountids'][-1], "value": 100000.0}),
+            "POST /accountvalues/backfill": lambda s: ("POST", "/accountvalues/backfill", s['accesstoken'],
+                                                       {"accountid": s['accountids'][-1], "values": [
+                                                           {"valuedate": (today - timedelta(days=x)).isoformat(),
+                                                            "value": 100000.0 + x} for x in range(1, 31)]}),
+            "POST /positions": lambda s: ("POST", "/positions", s['accesstoken'],
+                                          dict(position(next(counter)), accountid=s['accountids'][-1])),
+            "POST /positions batch100": lambda s: ("POST", "/positions", s['accesstoken'],
+                                                   {"accountid": s['accountids'][-1],
+                                                    "positions": [position(next(counter)) for _ in range(100)]}),
+            "GET /investors/nav": lambda s: ("GET", f"/investors/nav?investorid={seeded['investorids'][0]}"
+                                                    f"&startdate={yearago}&enddate={today.isoformat()}",
+                                             admin['accesstoken'], None),
+            "GET /cachestats": lambda s: ("GET", "/cachestats", s['accesstoken'], None),
+            "GET /metrics": lambda s: ("GET", "/metrics", None, None),
+        }
+
+        results = dict()
+        generator = random.Random(42)
+        for name, build in scenarios.items():
+            planned = [build(generator.choice(sessions)) for _ in range(requests)]
+            latencies = []
+            errors = [0]
+            lock = threading.Lock()
+
+            def worker(chunk):
+                for method, path, token, body in chunk:
+                    start = perf_counter()
+                    status, _ = client.request(method, path, token, body)
+                    elapsed = perf_counter() - start
+                    with lock:
+                        latencies.append(elapsed)
+                        if status >= 400:
+                            errors[0] += 1
+
+            threads = [threading.Thread(target=worker, args=(planned[x::concurrency],)) for x in range(concurrency)]
+            started = perf_counter()
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            results[name] = summarize(latencies, perf_counter() - started, errors[0])
+    finally:
+        server.terminate()
+        server.wait()
+    return results
+
+
+def gitcommit() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], cwd=benchmarkdir, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def printresults(title: str, results: dict, baseline: dict = None):
+    print(f"\n{title}")
+    for name, result in results.items():
+        line = f"  {name:<52} {result['throughput'] or 0:>9.1f}/s  p50 {result['p50ms'] or 0:>9.2f} ms  " \
+               f"p95 {result['p95ms'] or 0:>9.2f} ms  p99 {result['p99ms'] or 0:>9.2f} ms"
+        if result.get('errors'):
+            line += f"  errors {result['errors']}"
+        if baseline and name in baseline and baseline[name]['p50ms']:
+            line += f"  p50 {(result['p50ms'] / baseline[name]['p50ms'] - 1) * 100:+6.1f}%"
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Runs the benchmark suite against a local SQLite database")
+    parser.add_argument("--users", type=int, default=DatasetSize.users)
+    parser.add_argument("--accounts", type=int, default=DatasetSize.accountsperuser, help="accounts per user")
+    parser.add_argument("--days", type=int, default=DatasetSize.days)
+    parser.add_argument("--positions", type=int, default=DatasetSize.positionsperaccount, help="per account")
+    parser.add_argument("--transactions", type=int, default=DatasetSize.transactionsperaccount, help="per account")
+    parser.add_argument("--repeats", type=int, default=50, help="repetitions of each micro-benchmark")
+    parser.add_argument("--requests", type=int, default=200, help="requests per endpoint")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--skip-http", action="store_true")
+    parser.add_argument("--output", default=os.path.join(benchmarkdir, "results"))
+    parser.add_argument("--compare", help="earlier result file to compare against")
+    arguments = parser.parse_args()
+
+    size = DatasetSize(users=arguments.users, accountsperuser=arguments.accounts, days=arguments.days,
+                       positionsperaccount=arguments.positions, transactionsperaccount=arguments.transactions)
+    baseline = None
+    if arguments.compare:
+        with open(arguments.compare) as file:
+            baseline = json.load(file)
+
+    with tempfile.TemporaryDirectory() as directory:
+        databaseurl = f"sqlite:///{os.path.join(directory, 'benchmark.sqlite')}"
+        started = perf_counter()
+        seeded = seed(databaseurl, size)
+        print(f"Seeded {size} in {perf_counter() - started:.1f} s")
+
+        results = {"commit": gitcommit(),
+                   "timestamp": datetime.utcnow().isoformat(timespec="seconds"),
+                   "parameters": dict(vars(arguments), output=None, compare=None),
+                   "micro": runmicro(databaseurl, seeded, arguments.repeats)}
+        printresults("Micro-benchmarks", results['micro'], baseline and baseline.get('micro'))
+
+        if not arguments.skip_http:
+            results['http'] = runhttp(databaseurl, seeded, arguments.requests, arguments.concurrency)
+            printresults("HTTP endpoints", results['http'], baseline and baseline.get('http'))
+
+    os.makedirs(arguments.output, exist_ok=True)
+    filename = os.path.join(arguments.output,
+                            f"{datetime.utcnow().strftime('%Y%m%dT%H%M%S')}-{results['commit'][:8]}.json")
+    with open(filename, "w") as file:
+        json.dump(results, file, indent=2)
+    print(f"\nResults written to {filename}")
+
+
+if __name__ == '__main__':
+    main()
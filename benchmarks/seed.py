@@ -0,0 +1,147 @@
+"""
+Seeds a database with a reproducible synthetic dataset for benchmarks.
+
+Every user gets one strategy and a number of accounts. Every account gets a daily value series ending today,
+positions and transactions. All users share the password in BENCHMARKPASSWORD and are named bench0, bench1, ...,
+bench0 is an admin. Investors deposit into the portfolio, which is rolled up from the accounts and priced.
+
+Usage: python benchmarks/seed.py <databaseurl> [users] [accountsperuser] [days] [positions] [transactions]
+                                [randomseed] [investors]
+"""
+import os
+import random
+import sys
+from dataclasses import dataclass, asdict
+from datetime import date, datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "App"))
+
+from passlib.hash import pbkdf2_sha256
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from db.models import Base, User, UserAccountLink, Strategy, StrategyUserLink, Account, AccountValue, Position, \
+    AccountTransaction, Investor
+from supporting.performanceseries import PerformanceSeries
+from supporting.portfoliorollup import PortfolioRollup
+
+BENCHMARKPASSWORD = "benchmark"
+
+
+@dataclass
+class DatasetSize:
+    users: int = 10
+    accountsperuser: int = 5
+    days: int = 2000
+    positionsperaccount: int = 500
+    transactionsperaccount: int = 20
+    randomseed: int = 42
+    investors: int = 5
+
+
+def seed(databaseurl: str, size: DatasetSize) -> dict:
+    """
+    Creates the tables and the dataset, returns the ids of the seeded users, accounts and investors.
+    """
+    engine = create_engine(databaseurl)
+    Base.metadata.create_all(engine)
+    Session = sessionmaker(bind=engine, expire_on_commit=False)
+    generator = random.Random(size.randomseed)
+    passwordhash = pbkdf2_sha256.hash(BENCHMARKPASSWORD)
+    firstdate = date.today() - timedelta(days=size.days - 1)
+
+    users = dict()
+    with Session() as session:
+        for usernumber in range(size.users):
+            user = User(username=f"bench{usernumber}", password=passwordhash, isactive=True,
+                        isadmin=usernumber == 0)
+            strategy = Strategy(name=f"Strategy {usernumber}", description="Benchmark strategy", startdate=firstdate)
+            session.add_all([user, strategy])
+            session.flush([user, strategy])
+            session.add(StrategyUserLink(userid=user.id, strategyid=strategy.id, isowner=True))
+
+            accounts = [Account(accountid=f"BENCH{usernumber}-{x}", name=f"Account {usernumber}-{x}",
+                                currency="USD", timezone="UTC", executingstrategy=strategy.id, isactive=True)
+                        for x in range(size.accountsperuser)]
+            session.add_all(accounts)
+            session.flush(accounts)
+            session.add_all([UserAccountLink(userid=user.id, accountid=x.id, isowner=True) for x in accounts])
+            users[user.username] = {"id": user.id, "strategyid": strategy.id, "accountids": [x.id for x in accounts]}
+
+            for account in accounts:
+                _seedaccount(session, generator, account.id, strategy.id, firstdate, size)
+            session.commit()
+
+        for user in users.values():
+            for accountid in user['accountids']:
+                PerformanceSeries.updatefromdate(session=session, accountid=accountid, fromdate=None)
+        session.commit()
+
+        investorids = _seedinvestors(session, generator, firstdate, size)
+        PortfolioRollup.updatefromdate(session=session)
+        session.commit()
+    engine.dispose()
+
+    return {"size": asdict(size), "users": users, "investorids": investorids}
+
+
+def _seedinvestors(session, generator: random.Random, firstdate: date, size: DatasetSize) -> list:
+    investors = [Investor(name=f"Investor {x}", email=f"investor{x}@example.com") for x in range(size.investors)]
+    session.add_all(investors)
+    session.flush(investors)
+    firstdatetime = datetime.combine(firstdate, datetime.min.time())
+    # Every investor buys in on the first day and trades a few times later
+    transactions = [{"transactiondatetime": firstdatetime if number == 0 else
+                     firstdatetime + timedelta(minutes=generator.randrange(size.days * 24 * 60)),
+                     "value": round(generator.uniform(10000, 50000) if number == 0 else
+                                    generator.choice([-1, 1]) * generator.uniform(100, 5000), 2),
+                     "investor": investor.id, "sharedtransaction": False, "internaltransaction": False,
+                     "includeinperformance": False}
+                    for investor in investors for number in range(5)]
+    if transactions:
+        session.execute(AccountTransaction.__table__.insert(), transactions)
+    return [x.id for x in investors]
+
+
+def _seedaccount(session, generator: random.Random, accountid: int, strategyid: int, firstdate: date,
+                 size: DatasetSize):
+    value = 100000.0
+    values = []
+    for day in range(size.days):
+        value *= 1.0 + generator.gauss(0.0003, 0.01)
+        values.append({"accountdbid": accountid, "valuedate": firstdate + timedelta(days=day),
+                       "value": round(value, 2), "executedstrategyid": strategyid})
+    session.execute(AccountValue.__table__.insert(), values)
+
+    firstdatetime = datetime.combine(firstdate, datetime.min.time())
+    positions = []
+    for number in range(size.positionsperaccount):
+        entry = firstdatetime + timedelta(minutes=generator.randrange(size.days * 24 * 60))
+        isopen = generator.random() < 0.1
+        entryprice = round(generator.uniform(1.0, 1.5), 5)
+        exitprice = round(entryprice * (1 + generator.gauss(0, 0.005)), 5)
+        positions.append({"accountid": accountid, "brokerpositionid": f"DEAL{accountid}-{number}",
+                          "brokerinstrumentidentifier": "CS.D.EURUSD.CFD.IP", "instrumentname": "EURUSD",
+                          "status": "OPEN" if isopen else "CLOSED", "expirydate": None, "size": 1.0,
+                          "entrydatetime": entry, "entryprice": entryprice, "stoplossprice": entryprice * 0.99,
+                          "takeprofitprice": entryprice * 1.01,
+                          "exitdatetime": None if isopen else entry + timedelta(hours=generator.randrange(1, 72)),
+                          "exitprice": None if isopen else exitprice,
+                          "profit": None if isopen else round((exitprice - entryprice) * 10000, 2)})
+    if positions:
+        session.execute(Position.__table__.insert(), positions)
+
+    transactions = [{"accountdbid": accountid, "brokertransactionid": accountid * 100000 + number,
+                     "transactiondatetime": firstdatetime + timedelta(minutes=generator.randrange(size.days * 24 * 60)),
+                     "value": round(generator.choice([-1, 1]) * generator.uniform(100, 5000), 2),
+                     "sharedtransaction": False, "internaltransaction": False, "includeinperformance": True}
+                    for number in range(size.transactionsperaccount)]
+    if transactions:
+        session.execute(AccountTransaction.__table__.insert(), transactions)
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        raise SystemExit(__doc__)
+    arguments = [int(x) for x in sys.argv[2:]]
+    seeded = seed(sys.argv[1], DatasetSize(*arguments))
+    print(f"Seeded {len(seeded['users'])} users with {seeded['size']}")
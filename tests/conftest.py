@@ -0,0 +1,22 @@
+import os
+import sys
+import tempfile
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "App"))
+
+# db reads its settings when it is first imported, the test modules import it while they are collected
+_databasedirectory = tempfile.TemporaryDirectory()
+os.environ["databaseurl"] = f"sqlite:///{os.path.join(_databasedirectory.name, 'api.sqlite')}"
+os.environ.setdefault("JWTSecret", "test")
+
+
+@pytest.fixture(scope="session")
+def app():
+    from app import app
+    return app
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
@@ -0,0 +1,45 @@
+"""
+GET /accounts loads the accounts of a user with their strategies in a fixed number of queries.
+"""
+from datetime import date
+import pytest
+from flask_jwt_extended import create_access_token
+from db import db
+from db.models import Account, Strategy, User, UserAccountLink
+from supporting.querydetector import trackqueries
+
+
+def _createuser(username: str, accounts: int) -> int:
+    with db.Session() as session:
+        user = User(username=username, password="", isactive=True, isadmin=False)
+        session.add(user)
+        for number in range(accounts):
+            strategy = Strategy(name=f"{username}-strategy{number}", description="", startdate=date(2024, 1, 1))
+            account = Account(accountid=f"{username}-{number}", name=f"Account {number}", currency="EUR",
+                              timezone="Europe/Berlin", executingstrategy=None)
+            session.add_all([strategy, account])
+            session.flush()
+            # Every other account runs a strategy, the listing also covers accounts without one
+            account.executingstrategy = strategy.id if number % 2 == 0 else None
+            session.add(UserAccountLink(userid=user.id, accountid=account.id, isowner=True))
+        session.commit()
+        return user.id
+
+
+def _getaccounts(app, client, userid: int):
+    with app.test_request_context():
+        token = create_access_token(identity=userid)
+    with trackqueries(db.engine) as tracker:
+        response = client.get("/accounts", headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == 200
+    return response.get_json(), tracker.total
+
+
+@pytest.mark.parametrize("accounts", [5, 25])
+def test_accountlistingqueriesdonotgrowwithaccounts(app, client, accounts):
+    single, singlequeries = _getaccounts(app, client, _createuser(f"single{accounts}", 1))
+    many, manyqueries = _getaccounts(app, client, _createuser(f"many{accounts}", accounts))
+
+    assert len(single) == 1
+    assert len(many) == accounts
+    assert singlequeries == manyqueries
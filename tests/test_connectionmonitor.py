@@ -0,0 +1,75 @@
+"""
+Connections held too long are logged with the stack that checked them out, request sessions are closed on teardown.
+"""
+import logging
+from time import sleep
+import pytest
+from sqlalchemy import create_engine, select, text
+from db import db
+from db.connectionmonitor import ConnectionMonitor
+from db.models import User
+from resources.helpers import requestsession
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'monitor.sqlite'}")
+    yield engine
+    engine.dispose()
+
+
+def _holdconnection(engine, seconds: float):
+    with engine.connect() as connection:
+        connection.execute(text("SELECT 1"))
+        sleep(seconds)
+
+
+def test_heldconnectionisreportedwithcaller(engine, caplog):
+    monitor = ConnectionMonitor(thresholdseconds=0.2)
+    monitor.instrumentengine(engine)
+
+    with caplog.at_level(logging.WARNING):
+        _holdconnection(engine, 0.4)
+
+    assert monitor.reported == 1
+    message = next(x.getMessage() for x in caplog.records if "checked out at" in x.getMessage())
+    assert "_holdconnection" in message and "test_heldconnectionisreportedwithcaller" in message
+    assert "sqlalchemy" not in message.split("checked out at:")[1]
+
+
+def test_returnedconnectionisnotreported(engine):
+    monitor = ConnectionMonitor(thresholdseconds=0.2)
+    monitor.instrumentengine(engine)
+
+    for _ in range(3):
+        _holdconnection(engine, 0.0)
+
+    assert monitor.reported == 0
+    assert not monitor._held
+
+
+def test_zerothresholddisablesmonitor(engine):
+    monitor = ConnectionMonitor(thresholdseconds=0)
+    monitor.instrumentengine(engine)
+
+    _holdconnection(engine, 0.0)
+
+    assert monitor._threadpid is None
+
+
+def test_teardownclosesrequestsessions(app):
+    checkedout = db.engine.pool.checkedout()
+    with pytest.raises(RuntimeError):
+        with app.test_request_context():
+            session = requestsession(readonly=False)
+            session.add(User(username="teardown", password="", isactive=True, isadmin=False))
+            session.flush()
+            readonly = requestsession(readonly=True)
+            readonly.execute(select(User.id)).all()
+            assert db.engine.pool.checkedout() == checkedout + 2
+            # The handler fails before it commits or closes its sessions
+            raise RuntimeError()
+
+    assert db.engine.pool.checkedout() == checkedout
+    with db.Session() as session:
+        assert session.execute(select(User.id).where(User.username == "teardown")).first() is None
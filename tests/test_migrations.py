@@ -0,0 +1,78 @@
+"""
+Adding the unique keys to a database created before they were declared.
+"""
+from datetime import date
+import pytest
+from sqlalchemy import MetaData, create_engine, insert, select, func
+from db import migrations
+from db.migrations import DuplicateKeys
+from db.models import Base, AccountValue, Position
+
+
+@pytest.fixture
+def engine(tmp_path):
+    # The schema as create_all made it before the unique keys were declared
+    uniquenames = {x[1] for x in migrations.UNIQUEKEYS}
+    metadata = MetaData()
+    for table in Base.metadata.sorted_tables:
+        copy = table.to_metadata(metadata)
+        for constraint in [x for x in copy.constraints if x.name in uniquenames]:
+            copy.constraints.remove(constraint)
+        for index in [x for x in copy.indexes if x.name in uniquenames]:
+            copy.indexes.remove(index)
+    engine = create_engine(f"sqlite:///{tmp_path / 'old.sqlite'}")
+    metadata.create_all(engine)
+    yield engine
+    engine.dispose()
+
+
+def _insertvalues(engine, rows: list):
+    with engine.begin() as connection:
+        connection.execute(insert(AccountValue), rows)
+
+
+def _values(engine) -> list:
+    with engine.connect() as connection:
+        return connection.execute(select(AccountValue.id, AccountValue.accountdbid, AccountValue.value).
+                                  order_by(AccountValue.id)).all()
+
+
+def _positioncount(engine) -> int:
+    with engine.connect() as connection:
+        return connection.execute(select(func.count()).select_from(Position)).scalar()
+
+
+def test_upgradefailsanddeletesnothingwithduplicates(engine):
+    _insertvalues(engine, [{"accountdbid": 1, "valuedate": x, "value": y}
+                           for x, y in ((date(2024, 1, 1), 1.0), (date(2024, 1, 1), 2.0), (date(2024, 1, 2), 3.0))])
+
+    with pytest.raises(DuplicateKeys) as error:
+        migrations.upgrade(engine)
+
+    assert "accountvalue: accountdbid=1, valuedate=2024-01-01 (2 rows)" in str(error.value)
+    assert len(_values(engine)) == 3
+    assert migrations.currentversion(engine) == 1
+
+
+def test_rowswithnullkeysarekept(engine):
+    _insertvalues(engine, [{"accountdbid": None, "valuedate": date(2024, 1, 1), "value": float(x)} for x in range(2)])
+    with engine.begin() as connection:
+        connection.execute(insert(Position), [{"accountid": None, "brokerpositionid": "1"} for _ in range(2)])
+
+    assert migrations.deleteduplicates(engine) == {}
+    migrations.upgrade(engine)
+
+    assert len(_values(engine)) == 2
+    assert _positioncount(engine) == 2
+    assert migrations.currentversion(engine) == len(migrations.migrations)
+
+
+def test_deleteduplicateskeepsnewestrow(engine):
+    _insertvalues(engine, [{"accountdbid": 1, "valuedate": date(2024, 1, 1), "value": float(x)} for x in range(3)] +
+                  [{"accountdbid": 2, "valuedate": date(2024, 1, 1), "value": 9.0}])
+
+    assert migrations.deleteduplicates(engine) == {"accountvalue": 2}
+    migrations.upgrade(engine)
+
+    assert [(x.accountdbid, x.value) for x in _values(engine)] == [(1, 2.0), (2, 9.0)]
+    assert migrations.currentversion(engine) == len(migrations.migrations)
@@ -0,0 +1,123 @@
+"""
+PerformanceAnalytics against the same figures calculated step by step with pandas.
+"""
+import math
+import numpy as np
+import pandas as pd
+import pytest
+from supporting.performanceanalytics import PerformanceAnalytics, DAYSPERYEAR
+
+
+@pytest.fixture
+def series():
+    generator = np.random.default_rng(7)
+    valuedates = pd.bdate_range("2022-01-03", periods=400)
+    dayperformance = np.concatenate(([1.0], 1.0 + generator.normal(0.0004, 0.012, len(valuedates) - 1)))
+    return valuedates, dayperformance
+
+
+def _reference(valuedates, dayperformance, windows, riskfreerate) -> dict:
+    returns = pd.Series(dayperformance[1:] - 1.0, index=valuedates[1:])
+    cumulative = pd.Series(np.concatenate(([1.0], (1.0 + returns).cumprod().to_numpy())), index=valuedates)
+    years = (valuedates[-1] - valuedates[0]).days / DAYSPERYEAR
+    periodsperyear = len(returns) / years
+    excess = returns - ((1.0 + riskfreerate) ** (1.0 / periodsperyear) - 1.0)
+    downside = math.sqrt((excess.clip(upper=0.0) ** 2).mean())
+
+    drawdowns = cumulative / cumulative.cummax() - 1.0
+    trough = drawdowns.idxmin()
+    peak = cumulative[:trough].idxmax()
+    recovered = cumulative[trough:][cumulative[trough:] >= cumulative[peak]]
+
+    rolling = []
+    for window in windows:
+        windowreturns = (cumulative / cumulative.shift(window) - 1.0).dropna()
+        volatility = (returns.rolling(window).std() * math.sqrt(periodsperyear)).dropna()
+        rolling.append({"window": window,
+                        "latestreturn": windowreturns.iloc[-1],
+                        "averagereturn": windowreturns.mean(),
+                        "bestreturn": windowreturns.max(),
+                        "bestenddate": windowreturns.idxmax().strftime('%Y-%m-%d'),
+                        "worstreturn": windowreturns.min(),
+                        "worstenddate": windowreturns.idxmin().strftime('%Y-%m-%d'),
+                        "latestvolatility": volatility.iloc[-1] if window > 1 else None,
+                        "averagevolatility": volatility.mean() if window > 1 else None})
+
+    return {"startdate": valuedates[0].strftime('%Y-%m-%d'),
+            "enddate": valuedates[-1].strftime('%Y-%m-%d'),
+            "days": len(returns),
+            "totalreturn": cumulative.iloc[-1] - 1.0,
+            "annualizedreturn": cumulative.iloc[-1] ** (1.0 / years) - 1.0,
+            "volatility": returns.std() * math.sqrt(periodsperyear),
+            "sharperatio": excess.mean() / returns.std() * math.sqrt(periodsperyear),
+            "sortinoratio": excess.mean() / downside * math.sqrt(periodsperyear),
+            "positivedays": (returns > 0).mean(),
+            "bestday": {"valuedate": returns.idxmax().strftime('%Y-%m-%d'), "return": returns.max()},
+            "worstday": {"valuedate": returns.idxmin().strftime('%Y-%m-%d'), "return": returns.min()},
+            "drawdown": {"maximum": drawdowns.min(),
+                         "peakdate": peak.strftime('%Y-%m-%d'),
+                         "troughdate": trough.strftime('%Y-%m-%d'),
+                         "recoverydate": recovered.index[0].strftime('%Y-%m-%d')
+                         if drawdowns.min() < 0 and len(recovered) else None,
+                         "current": drawdowns.iloc[-1]},
+            "rolling": rolling}
+
+
+def _assertfigures(result, reference):
+    if isinstance(reference, dict):
+        assert result.keys() == reference.keys()
+        for key in reference:
+            _assertfigures(result[key], reference[key])
+    elif isinstance(reference, list):
+        assert len(result) == len(reference)
+        for x, y in zip(result, reference):
+            _assertfigures(x, y)
+    elif isinstance(reference, float):
+        assert result == pytest.approx(reference, rel=1e-9, abs=1e-12)
+    else:
+        assert result == reference
+
+
+@pytest.mark.parametrize("riskfreerate", [0.0, 0.03])
+def test_calculateanalyticsmatchespandas(series, riskfreerate):
+    valuedates, dayperformance = series
+    windows = [1, 5, 21, 63, 252]
+
+    result = PerformanceAnalytics.calculateanalytics(valuedates=valuedates, dayperformance=dayperformance,
+                                                     windows=windows, riskfreerate=riskfreerate)
+
+    _assertfigures(result, _reference(valuedates, dayperformance, windows, riskfreerate))
+
+
+def test_drawdownrecovery():
+    valuedates = pd.bdate_range("2024-01-01", periods=7)
+    dayperformance = np.array([1.0, 1.1, 0.9, 0.9, 1.1, 1.2, 0.95])
+
+    drawdown = PerformanceAnalytics.calculateanalytics(valuedates=valuedates, dayperformance=dayperformance,
+                                                       windows=[])["drawdown"]
+
+    assert drawdown["maximum"] == pytest.approx(0.81 - 1.0)
+    assert (drawdown["peakdate"], drawdown["troughdate"]) == ("2024-01-02", "2024-01-04")
+    assert drawdown["recoverydate"] == "2024-01-08"
+    assert drawdown["current"] == pytest.approx(-0.05)
+
+
+def test_shortseries():
+    valuedates = pd.bdate_range("2024-01-01", periods=2)
+
+    result = PerformanceAnalytics.calculateanalytics(valuedates=valuedates, dayperformance=np.array([1.0, 1.01]),
+                                                     windows=[1, 5])
+
+    assert result["totalreturn"] == pytest.approx(0.01)
+    assert result["volatility"] is None and result["sharperatio"] is None
+    assert [x["window"] for x in result["rolling"]] == [1]
+
+
+@pytest.mark.parametrize("window", [2, 5, 21, 100])
+def test_rollingstdmatchespandas(series, window):
+    returns = series[1][1:] - 1.0
+
+    result = PerformanceAnalytics._rollingstd(returns=returns, window=window)
+
+    reference = pd.Series(returns).rolling(window).std().dropna().to_numpy()
+    assert result == pytest.approx(reference, rel=1e-9, abs=1e-15)
@@ -0,0 +1,69 @@
+"""
+Reducing a daily performance series to weekly, monthly or at most N days.
+"""
+import numpy as np
+import pandas as pd
+import pytest
+from supporting.performancecalculator import PerformanceCalculator
+
+
+@pytest.fixture
+def daily():
+    generator = np.random.default_rng(11)
+    valuedates = pd.bdate_range("2023-01-02", periods=300, name="valuedate")
+    dayperformance = np.concatenate(([1.0], 1.0 + generator.normal(0.0003, 0.01, len(valuedates) - 1)))
+    transactionvalue = np.where(generator.random(len(valuedates)) < 0.1, generator.normal(0, 1000, len(valuedates)),
+                                0.0)
+    return pd.DataFrame({"value": 100000.0 * np.cumprod(dayperformance) + np.cumsum(transactionvalue),
+                         "transactionvalue": transactionvalue,
+                         "dayperformance": dayperformance,
+                         "rangeperformance": np.cumprod(dayperformance)}, index=valuedates)
+
+
+def _assertresampled(result: pd.DataFrame, daily: pd.DataFrame):
+    # Kept days carry their daily values, the first and the last day are always kept
+    assert result.index[0] == daily.index[0] and result.index[-1] == daily.index[-1]
+    assert result['rangeperformance'].to_numpy() == pytest.approx(daily.loc[result.index, 'rangeperformance'])
+    assert result['value'].to_numpy() == pytest.approx(daily.loc[result.index, 'value'])
+    # Transactions between kept days are summed up on the later one
+    periods = np.searchsorted(result.index.values, daily.index.values, side='left')
+    assert result['transactionvalue'].to_numpy() == pytest.approx(
+        daily['transactionvalue'].groupby(periods).sum().to_numpy())
+    assert np.cumprod(result['dayperformance'].to_numpy()) == pytest.approx(result['rangeperformance'])
+
+
+def test_dailyisunchanged(daily):
+    assert PerformanceCalculator.resampleperformance(df=daily, resolution="daily") is daily
+
+
+@pytest.mark.parametrize("resolution, frequency", [("weekly", "W"), ("monthly", "M")])
+def test_keepsfirstandlastdayofperiods(daily, resolution, frequency):
+    result = PerformanceCalculator.resampleperformance(df=daily, resolution=resolution)
+
+    lastdays = daily.groupby(daily.index.to_period(frequency)).tail(1).index
+    assert result.index.equals(lastdays.insert(0, daily.index[0]))
+    _assertresampled(result, daily)
+
+
+@pytest.mark.parametrize("maxpoints", [2, 3, 7, 50, 100, 299])
+def test_keepsatmostmaxpointsdays(daily, maxpoints):
+    result = PerformanceCalculator.resampleperformance(df=daily, resolution=maxpoints)
+
+    assert len(result) <= maxpoints
+    assert result.index.is_unique and result.index.is_monotonic_increasing
+    _assertresampled(result, daily)
+
+
+@pytest.mark.parametrize("days", [1, 2, 5])
+def test_shortseriesiskept(daily, days):
+    result = PerformanceCalculator.resampleperformance(df=daily.iloc[:days], resolution=5)
+
+    assert result.index.equals(daily.index[:days])
+
+
+def test_neverexceedsmaxpoints(daily):
+    for days in range(2, 80):
+        for maxpoints in range(2, 12):
+            result = PerformanceCalculator.resampleperformance(df=daily.iloc[:days], resolution=maxpoints)
+            assert len(result) <= maxpoints
+            assert result.index[0] == daily.index[0] and result.index[-1] == daily.index[days - 1]
@@ -0,0 +1,93 @@
+"""
+Rolling up account values into PortfolioValue when accounts report on different days.
+"""
+from datetime import date, timedelta
+import pytest
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import sessionmaker
+from db.models import Base, Account, AccountValue, PortfolioValue
+from supporting.portfoliorollup import PortfolioRollup
+
+FIRSTDATE = date(2024, 1, 1)
+
+
+@pytest.fixture
+def databaseurl(tmp_path):
+    return f"sqlite:///{tmp_path / 'rollup.sqlite'}"
+
+
+@pytest.fixture
+def session(databaseurl):
+    engine = create_engine(databaseurl)
+    Base.metadata.create_all(engine)
+    with sessionmaker(bind=engine, expire_on_commit=False)() as session:
+        # Account 1 is valued on business days only, account 2 every day, account 3 starts in the second week
+        session.add_all([Account(id=x, accountid=f"ACCOUNT{x}", isactive=True) for x in (1, 2, 3)])
+        for day in range(21):
+            valuedate = FIRSTDATE + timedelta(days=day)
+            if valuedate.weekday() < 5:
+                session.add(AccountValue(accountdbid=1, valuedate=valuedate, value=1000.0 + day))
+            session.add(AccountValue(accountdbid=2, valuedate=valuedate, value=500.0))
+            if day >= 9:
+                session.add(AccountValue(accountdbid=3, valuedate=valuedate, value=200.0))
+        session.commit()
+        yield session
+    engine.dispose()
+
+
+def _expectedtotal(valuedate: date) -> float:
+    day = (valuedate - FIRSTDATE).days
+    # The business day account carries Friday's value over the weekend
+    lastbusinessday = day - max(0, valuedate.weekday() - 4)
+    return 1000.0 + lastbusinessday + 500.0 + (200.0 if day >= 9 else 0.0)
+
+
+def _totals(session) -> dict:
+    return dict(session.execute(select(PortfolioValue.valuedate, PortfolioValue.totalvalue)).all())
+
+
+def test_missingdayscarrylastvalue(session):
+    days = PortfolioRollup.rollupperiod(session=session, accountids=[1, 2, 3], startdate=FIRSTDATE,
+                                        enddate=FIRSTDATE + timedelta(days=20))
+
+    totals = _totals(session)
+    assert days == 21
+    assert totals == {x: pytest.approx(_expectedtotal(x)) for x in totals}
+
+
+def test_periodstartingonmissingdayusespriorvalue(session):
+    saturday = date(2024, 1, 6)
+
+    PortfolioRollup.rollupperiod(session=session, accountids=[1, 2, 3], startdate=saturday,
+                                 enddate=saturday + timedelta(days=1))
+
+    assert _totals(session) == {saturday: pytest.approx(1004.0 + 500.0),
+                                saturday + timedelta(days=1): pytest.approx(1004.0 + 500.0)}
+
+
+def test_rebuildinchunksmatchesrollup(session, databaseurl):
+    PortfolioRollup.rollupperiod(session=session, accountids=[1, 2, 3], startdate=FIRSTDATE,
+                                 enddate=FIRSTDATE + timedelta(days=20))
+    session.commit()
+    expected = _totals(session)
+
+    assert PortfolioRollup.rebuild(databaseurl=databaseurl, processes=1, chunkdays=4) == 21
+
+    session.expire_all()
+    assert _totals(session) == pytest.approx(expected)
+
+
+def test_calculatetotalswithoutvalues():
+    assert PortfolioRollup.calculatetotals(values=[], priorvalues=[(1, 100.0)]) == []
+
+
+def test_rebuildinparallelmatchesrollup(session, databaseurl):
+    PortfolioRollup.rollupperiod(session=session, accountids=[1, 2, 3], startdate=FIRSTDATE,
+                                 enddate=FIRSTDATE + timedelta(days=20))
+    session.commit()
+    expected = _totals(session)
+
+    assert PortfolioRollup.rebuild(databaseurl=databaseurl, processes=2, chunkdays=7) == 21
+
+    session.expire_all()
+    assert _totals(session) == pytest.approx(expected)
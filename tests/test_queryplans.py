@@ -0,0 +1,135 @@
+"""
+Checks the query plans of the model queries used by the endpoints for full table scans.
+
+Every model query runs once while its statements are captured, then each statement is run again with EXPLAIN and
+fails the test when the plan reads a whole table instead of using an index. A small SQLite database is seeded, set
+explaindatabaseurl to a MySQL URL with the production schema to check the plans MySQL picks.
+"""
+import os
+import sys
+from datetime import date, datetime, timedelta
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from db.models import Base, Account, AccountChange, AccountPerformance, AccountTransaction, AccountValue, Position, \
+    PortfolioValue, Strategy, User, UserAccountLink
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "benchmarks"))
+
+from seed import seed, DatasetSize
+
+TODAY = date.today()
+YEARAGO = TODAY - timedelta(days=365)
+
+MODELQUERIES = {
+    "User by username": lambda session, user: session.query(User).filter(User.username == "bench0").first(),
+    "UserAccountLink.getrightsforuser": lambda session, user: UserAccountLink.getrightsforuser(
+        session=session, userid=user['id']),
+    "Account.getaccountlistingforuser": lambda session, user: Account.getaccountlistingforuser(
+        session=session, userid=user['id']),
+    "Strategy.getstrategyrowsforuser": lambda session, user: Strategy.getstrategyrowsforuser(
+        session=session, userid=user['id']),
+    "Strategy.canuserusestrategy": lambda session, user: Strategy.canuserusestrategy(
+        session=session, userid=user['id'], strategyid=user['strategyid']),
+    "AccountChange.getversion": lambda session, user: AccountChange.getversion(
+        session=session, accountid=user['accountids'][0], kind="values"),
+    "AccountValue.getvaluecolumnsforperiod": lambda session, user: AccountValue.getvaluecolumnsforperiod(
+        session=session, accountids=user['accountids'][:1], startdate=YEARAGO, enddate=TODAY),
+    "AccountValue.getdbobjvalueforidanddate": lambda session, user: AccountValue.getdbobjvalueforidanddate(
+        session=session, accountdbid=user['accountids'][0], valuedate=TODAY),
+    "AccountTransaction.getperformancetransactioncolumnsforperiod": lambda session, user: AccountTransaction.
+    getperformancetransactioncolumnsforperiod(session=session, startdate=YEARAGO, enddate=TODAY,
+                                              accountids=user['accountids'][:1]),
+    "AccountValue.getdailytotalsforperiod": lambda session, user: AccountValue.getdailytotalsforperiod(
+        session=session, startdate=YEARAGO, enddate=TODAY, accountids=user['accountids']),
+    "AccountValue.getdailytotalsforperiod strategy": lambda session, user: AccountValue.getdailytotalsforperiod(
+        session=session, startdate=YEARAGO, enddate=TODAY, strategyid=user['strategyid']),
+    "AccountTransaction.getperformancetransactiontotalsforperiod": lambda session, user: AccountTransaction.
+    getperformancetransactiontotalsforperiod(session=session, startdate=YEARAGO, enddate=TODAY,
+                                             accountids=user['accountids']),
+    "AccountValue.getstrategydailytotalsforperiod": lambda session, user: AccountValue.getstrategydailytotalsforperiod(
+        session=session, strategyid=user['strategyid'], startdate=YEARAGO, enddate=TODAY),
+    "AccountTransaction.getperformancetransactiontotalsforstrategy": lambda session, user: AccountTransaction.
+    getperformancetransactiontotalsforstrategy(session=session, strategyid=user['strategyid'], startdate=YEARAGO,
+                                               enddate=TODAY),
+    "AccountPerformance.getseriesforperiod": lambda session, user: AccountPerformance.getseriesforperiod(
+        session=session, accountid=user['accountids'][0], startdate=YEARAGO, enddate=TODAY),
+    "AccountPerformance.getseriesforaccounts": lambda session, user: AccountPerformance.getseriesforaccounts(
+        session=session, accountids=user['accountids'], startdate=YEARAGO, enddate=TODAY),
+    "AccountPerformance.getaccountswithseries": lambda session, user: AccountPerformance.getaccountswithseries(
+        session=session, accountids=user['accountids']),
+    "AccountPerformance.getlastbeforedate": lambda session, user: AccountPerformance.getlastbeforedate(
+        session=session, accountid=user['accountids'][0], valuedate=TODAY),
+    "AccountValue.getlastvaluesbefore": lambda session, user: AccountValue.getlastvaluesbefore(
+        session=session, accountids=user['accountids'], valuedate=YEARAGO),
+    "AccountValue.getvaluedaterange": lambda session, user: AccountValue.getvaluedaterange(
+        session=session, accountids=user['accountids']),
+    "PortfolioValue.getlastvaluedate": lambda session, user: PortfolioValue.getlastvaluedate(session=session),
+    "PortfolioValue.getlastpricedbefore": lambda session, user: PortfolioValue.getlastpricedbefore(
+        session=session, valuedate=TODAY),
+    "PortfolioValue.getvaluecolumnsafter": lambda session, user: PortfolioValue.getvaluecolumnsafter(
+        session=session, valuedate=YEARAGO),
+    "PortfolioValue.getsharepricesforperiod": lambda session, user: PortfolioValue.getsharepricesforperiod(
+        session=session, startdate=YEARAGO, enddate=TODAY),
+    "AccountTransaction.getinvestortransactioncolumnsafter": lambda session, user: AccountTransaction.
+    getinvestortransactioncolumnsafter(session=session, valuedate=YEARAGO),
+    "AccountTransaction.getsharestradedforinvestor": lambda session, user: AccountTransaction.
+    getsharestradedforinvestor(session=session, investorid=1, enddate=TODAY),
+    "Position.getpositionsselect": lambda session, user: session.execute(
+        Position.getpositionsselect(accountid=user['accountids'][0]).limit(100)).all(),
+    "Position.getpositionsselect open": lambda session, user: session.execute(
+        Position.getpositionsselect(accountid=user['accountids'][0], status="OPEN").limit(100)).all(),
+    "Position.getpositionsselect after cursor": lambda session, user: session.execute(
+        Position.getpositionsselect(accountid=user['accountids'][0], after=(datetime.now() - timedelta(days=30), 0)).
+        limit(100)).all(),
+    "Position.getpositionidsforbrokerids": lambda session, user: Position.getpositionidsforbrokerids(
+        session=session, accountid=user['accountids'][0],
+        brokerpositionids=[f"DEAL{user['accountids'][0]}-1", f"DEAL{user['accountids'][0]}-2"]),
+}
+
+
+@pytest.fixture(scope="module")
+def seeded(tmp_path_factory):
+    # The queries only need ids that exist, on an existing database a tiny dataset is seeded next to the data
+    url = os.environ.get("explaindatabaseurl") or f"sqlite:///{tmp_path_factory.mktemp('explain') / 'explain.sqlite'}"
+    users = seed(url, DatasetSize(users=2, accountsperuser=3, days=60, positionsperaccount=20,
+                                  transactionsperaccount=5))
+    engine = create_engine(url)
+    yield engine, next(iter(users['users'].values()))
+    engine.dispose()
+
+
+def _fullscans(connection, statement: str, parameters) -> list:
+    """
+    Returns the plan lines of statement that read a whole table.
+    """
+    if connection.dialect.name == "sqlite":
+        plan = connection.exec_driver_sql("EXPLAIN QUERY PLAN " + statement, parameters).all()
+        # "SCAN table" reads every row, "SCAN table USING INDEX" walks an index and "SEARCH" seeks into one. Scans of
+        # subqueries read their already filtered result.
+        return [x.detail for x in plan if x.detail.startswith("SCAN") and "USING" not in x.detail and
+                x.detail.split()[1] in Base.metadata.tables]
+    plan = connection.exec_driver_sql("EXPLAIN " + statement, parameters).mappings().all()
+    return [f"{x['table']}: type ALL, {x['rows']} rows" for x in plan
+            if x['type'] == "ALL" and x['table'] in Base.metadata.tables]
+
+
+@pytest.mark.parametrize("name", list(MODELQUERIES))
+def test_querydoesnotscanfulltable(seeded, name):
+    engine, user = seeded
+    captured = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        captured.append((statement, parameters))
+    event.listen(engine, "before_cursor_execute", capture)
+    try:
+        with sessionmaker(bind=engine)() as session:
+            MODELQUERIES[name](session, user)
+            session.rollback()
+    finally:
+        event.remove(engine, "before_cursor_execute", capture)
+
+    assert captured
+    with engine.connect() as connection:
+        scans = {statement: _fullscans(connection, statement, parameters) for statement, parameters in captured}
+    assert not {x: y for x, y in scans.items() if y}
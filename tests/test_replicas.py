@@ -0,0 +1,108 @@
+"""
+Routes read-only sessions between a primary and replica SQLite files. Every database holds one strategy named after
+the database, so a read shows which database served it.
+"""
+from datetime import date
+import pytest
+from sqlalchemy import create_engine, select
+from sqlalchemy.exc import InvalidRequestError
+from sqlalchemy.orm import Session
+from db import replicas
+from db.models import Base, Strategy
+from db.replicas import ReplicaRouter
+
+
+def _createdatabase(url: str, name: str):
+    engine = create_engine(url)
+    Base.metadata.create_all(engine)
+    with Session(bind=engine) as session:
+        session.add(Strategy(name=name, description=name, startdate=date(2024, 1, 1)))
+        session.commit()
+    return engine
+
+
+def _servedby(session: Session) -> str:
+    try:
+        return session.execute(select(Strategy.name)).scalar_one()
+    finally:
+        session.close()
+
+
+@pytest.fixture
+def engines(tmp_path):
+    engines = {x: _createdatabase(f"sqlite:///{tmp_path / x}.sqlite", x) for x in ("primary", "replica1", "replica2")}
+    # The directory does not exist, connecting fails like an unreachable replica
+    engines["down"] = create_engine(f"sqlite:///{tmp_path / 'missing' / 'down.sqlite'}")
+    yield engines
+    for engine in engines.values():
+        engine.dispose()
+
+
+def test_readsrotatebetweenreplicas(engines):
+    router = ReplicaRouter(primary=engines["primary"], replicas=[engines["replica1"], engines["replica2"]],
+                           retryseconds=30, stickyseconds=5)
+
+    served = [_servedby(router.readonlysession()) for _ in range(4)]
+
+    assert served == ["replica1", "replica2", "replica1", "replica2"]
+
+
+def test_unreachablereplicaisskipped(engines):
+    router = ReplicaRouter(primary=engines["primary"], replicas=[engines["down"], engines["replica1"]],
+                           retryseconds=30, stickyseconds=5)
+
+    served = [_servedby(router.readonlysession()) for _ in range(4)]
+
+    assert served == ["replica1"] * 4
+    assert engines["down"] in router._downuntil
+
+
+def test_readsfailovertoprimarywithoutreplicas(engines):
+    router = ReplicaRouter(primary=engines["primary"], replicas=[engines["down"]], retryseconds=30,
+                           stickyseconds=5)
+
+    assert _servedby(router.readonlysession()) == "primary"
+    assert _servedby(router.readonlysession(userid=1)) == "primary"
+
+
+def test_replicaisretriedafterretryseconds(engines, tmp_path, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(replicas, "monotonic", lambda: now[0])
+    router = ReplicaRouter(primary=engines["primary"], replicas=[engines["down"]], retryseconds=30,
+                           stickyseconds=5)
+    assert _servedby(router.readonlysession()) == "primary"
+
+    # The replica comes back, it is left alone until retryseconds passed
+    (tmp_path / "missing").mkdir()
+    _createdatabase(str(engines["down"].url), "down").dispose()
+    assert _servedby(router.readonlysession()) == "primary"
+
+    now[0] += 31
+    assert _servedby(router.readonlysession()) == "down"
+
+
+def test_userreadsfromprimaryafterwrite(engines, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(replicas, "monotonic", lambda: now[0])
+    router = ReplicaRouter(primary=engines["primary"], replicas=[engines["replica1"]], retryseconds=30,
+                           stickyseconds=5)
+
+    router.recordwrite(userid=1)
+
+    assert _servedby(router.readonlysession(userid=1)) == "primary"
+    assert _servedby(router.readonlysession(userid=2)) == "replica1"
+    assert _servedby(router.readonlysession()) == "replica1"
+
+    now[0] += 6
+    assert _servedby(router.readonlysession(userid=1)) == "replica1"
+
+
+def test_readonlysessionrejectswrites(engines):
+    router = ReplicaRouter(primary=engines["primary"], replicas=[], retryseconds=30, stickyseconds=5)
+    session = router.readonlysession()
+    try:
+        session.add(Strategy(name="write", description="write", startdate=date(2024, 1, 1)))
+        with pytest.raises(InvalidRequestError):
+            session.flush()
+    finally:
+        session.close()
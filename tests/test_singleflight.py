@@ -0,0 +1,69 @@
+"""
+Concurrent GET /accountvalues requests share one execution only when they computed the same ETag.
+"""
+import threading
+from datetime import date
+from flask_jwt_extended import create_access_token
+from db import db
+from db.models import Account, AccountValue, User, UserAccountLink
+from supporting.performanceseries import PerformanceSeries
+
+QUERY = "/accountvalues?accountid={}&startdate=2024-01-01&enddate=2024-01-31"
+
+
+def _createaccount(username: str) -> tuple:
+    with db.Session() as session:
+        user = User(username=username, password="", isactive=True, isadmin=False)
+        account = Account(accountid=username, name=username, currency="EUR", timezone="Europe/Berlin")
+        session.add_all([user, account])
+        session.flush()
+        session.add(UserAccountLink(userid=user.id, accountid=account.id, isowner=True))
+        session.add_all([AccountValue(accountdbid=account.id, valuedate=date(2024, 1, x), value=100.0)
+                         for x in (1, 2)])
+        session.commit()
+        return user.id, account.id
+
+
+def test_requestafterwritedoesnotjoinolderread(app, client, monkeypatch):
+    userid, accountid = _createaccount("singleflight")
+    with app.test_request_context():
+        headers = {"Authorization": f"Bearer {create_access_token(identity=userid)}"}
+
+    # The first read returns its data and then waits, so it is still in flight while the value is written
+    getperformanceforperiod = PerformanceSeries.getperformanceforperiod
+    reading, release = threading.Event(), threading.Event()
+
+    def blockingread(**kwargs):
+        df = getperformanceforperiod(**kwargs)
+        if not reading.is_set():
+            reading.set()
+            release.wait(10)
+        return df
+    monkeypatch.setattr(PerformanceSeries, "getperformanceforperiod", blockingread)
+
+    responses = {}
+
+    def get(name: str):
+        responses[name] = app.test_client().get(QUERY.format(accountid), headers=headers)
+
+    first = threading.Thread(target=get, args=("first",))
+    second = threading.Thread(target=get, args=("second",))
+    try:
+        first.start()
+        assert reading.wait(10)
+
+        response = client.post("/accountvalues/backfill", headers=headers,
+                               json={"accountid": accountid, "values": [{"valuedate": "2024-01-02", "value": 110.0}]})
+        assert response.status_code == 200
+
+        second.start()
+        second.join(10)
+        assert not second.is_alive()
+    finally:
+        release.set()
+        first.join(10)
+        second.join(10)
+
+    assert [x["value"] for x in responses["first"].get_json()] == [100.0, 100.0]
+    assert [x["value"] for x in responses["second"].get_json()] == [100.0, 110.0]
+    assert responses["first"].headers["ETag"] != responses["second"].headers["ETag"]
@@ -0,0 +1,146 @@
+"""
+Share prices, shares traded and holdings of the unit pricing on a small hand calculated portfolio.
+
+    day         value  flows                          price  shares outstanding
+    2024-01-01   1000  investor 1 +1000               100.0   10
+    2024-01-02   1100                                 110.0   10
+    2024-01-03   1650  investor 2 +550                110.0   15
+    2024-01-04   1815                                 121.0   15
+    2024-01-05   1815                                 121.0   15
+    2024-01-08   1210  investor 1 -605 on Saturday    121.0   10
+    2024-01-09      0  investors 1 and 2 -605 each    121.0    0
+    2024-01-10    500  investor 1 +500                121.0   500 / 121
+"""
+from datetime import date, datetime
+import numpy as np
+import pytest
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import sessionmaker
+from db.models import Base, AccountTransaction, Investor, PortfolioValue
+from supporting.unitpricing import UnitPricing
+
+VALUES = [(date(2024, 1, 1), 1000.0), (date(2024, 1, 2), 1100.0), (date(2024, 1, 3), 1650.0),
+          (date(2024, 1, 4), 1815.0), (date(2024, 1, 5), 1815.0), (date(2024, 1, 8), 1210.0),
+          (date(2024, 1, 9), 0.0), (date(2024, 1, 10), 500.0)]
+TRANSACTIONS = [(datetime(2024, 1, 1, 9), 1, 1000.0), (datetime(2024, 1, 3, 12), 2, 550.0),
+                (datetime(2024, 1, 6, 10), 1, -605.0), (datetime(2024, 1, 9, 8), 1, -605.0),
+                (datetime(2024, 1, 9, 8), 2, -605.0), (datetime(2024, 1, 10, 8), 1, 500.0)]
+PRICES = [100.0, 110.0, 110.0, 121.0, 121.0, 121.0, 121.0, 121.0]
+
+
+@pytest.fixture
+def session(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'unitpricing.sqlite'}")
+    Base.metadata.create_all(engine)
+    with sessionmaker(bind=engine, expire_on_commit=False)() as session:
+        session.add_all([Investor(id=1, name="One"), Investor(id=2, name="Two")])
+        session.flush()
+        yield session
+    engine.dispose()
+
+
+def _add(session, untildate: date):
+    session.add_all([PortfolioValue(valuedate=x, totalvalue=y) for x, y in VALUES if x <= untildate])
+    session.add_all([AccountTransaction(transactiondatetime=x, investor=y, value=z) for x, y, z in TRANSACTIONS
+                     if x.date() <= untildate])
+    session.flush()
+
+
+def _prices(session) -> list:
+    return session.execute(select(PortfolioValue.valuedate, PortfolioValue.shareprice, PortfolioValue.performance).
+                           order_by(PortfolioValue.valuedate)).all()
+
+
+def _sharestraded(session) -> list:
+    return session.execute(select(AccountTransaction.transactiondatetime, AccountTransaction.investor,
+                                  AccountTransaction.sharestraded).
+                           order_by(AccountTransaction.transactiondatetime, AccountTransaction.investor)).all()
+
+
+def test_pricesandsharestraded(session):
+    _add(session, VALUES[-1][0])
+
+    assert UnitPricing.updatefromdate(session=session) == len(VALUES)
+
+    assert [x.shareprice for x in _prices(session)] == pytest.approx(PRICES)
+    assert [x.sharestraded for x in _sharestraded(session)] == pytest.approx([10.0, 5.0, -5.0, -5.0, -5.0,
+                                                                              500.0 / 121.0])
+
+
+def test_transactiononnonvaluationdayispricedonnextday(session):
+    _add(session, date(2024, 1, 8))
+
+    UnitPricing.updatefromdate(session=session)
+
+    saturday = next(x for x in _sharestraded(session) if x.transactiondatetime == datetime(2024, 1, 6, 10))
+    assert saturday.sharestraded == pytest.approx(-605.0 / 121.0)
+    # The redemption is in the value of Monday, so it does not move the price
+    assert _prices(session)[-1].performance == pytest.approx(1.0)
+
+
+def test_transactionafterlastvaluationdaywaits(session):
+    _add(session, date(2024, 1, 5))
+    session.add(AccountTransaction(transactiondatetime=datetime(2024, 1, 6, 10), investor=1, value=-605.0))
+    session.flush()
+
+    UnitPricing.updatefromdate(session=session)
+
+    assert _sharestraded(session)[-1].sharestraded is None
+
+
+def test_zerovaluedayrestartsatlastprice(session):
+    _add(session, VALUES[-1][0])
+
+    UnitPricing.updatefromdate(session=session)
+
+    prices = {x.valuedate: x for x in _prices(session)}
+    assert prices[date(2024, 1, 9)].shareprice == pytest.approx(121.0)
+    assert prices[date(2024, 1, 10)].shareprice == pytest.approx(121.0)
+    assert prices[date(2024, 1, 10)].performance == pytest.approx(1.0)
+    assert np.isfinite([x.performance for x in prices.values()]).all()
+
+
+def test_redemptionreducesholdings(session):
+    _add(session, date(2024, 1, 8))
+
+    UnitPricing.updatefromdate(session=session)
+
+    one, two = session.get(Investor, 1), session.get(Investor, 2)
+    session.refresh(one)
+    session.refresh(two)
+    assert (one.noofshares, two.noofshares) == pytest.approx((5.0, 5.0))
+    assert (one.netassetvalue, two.netassetvalue) == pytest.approx((605.0, 605.0))
+    # Redemptions do not change the cost of the shares bought
+    assert (one.averageacquisitioncost, two.averageacquisitioncost) == pytest.approx((100.0, 110.0))
+
+
+def test_incrementalupdatematchesfullrecompute(session):
+    _add(session, date(2024, 1, 4))
+    UnitPricing.updatefromdate(session=session)
+    session.add_all([PortfolioValue(valuedate=x, totalvalue=y) for x, y in VALUES if x > date(2024, 1, 4)])
+    session.add_all([AccountTransaction(transactiondatetime=x, investor=y, value=z) for x, y, z in TRANSACTIONS
+                     if x.date() > date(2024, 1, 4)])
+    session.flush()
+
+    assert UnitPricing.updatefromdate(session=session) == 4
+    incremental = (_prices(session), _sharestraded(session))
+
+    assert UnitPricing.updatefromdate(session=session, fromdate=VALUES[0][0]) == len(VALUES)
+    full = (_prices(session), _sharestraded(session))
+
+    for incrementalrows, fullrows in zip(incremental, full):
+        assert [x[:-1] for x in incrementalrows] == [x[:-1] for x in fullrows]
+        assert [x[-1] for x in incrementalrows] == pytest.approx([x[-1] for x in fullrows])
+
+
+def test_navseries(session):
+    _add(session, VALUES[-1][0])
+    UnitPricing.updatefromdate(session=session)
+
+    df = UnitPricing.getnavseries(session=session, investorid=2, startdate=date(2024, 1, 2),
+                                  enddate=date(2024, 1, 9))
+
+    assert df.index.strftime('%Y-%m-%d').tolist() == ["2024-01-02", "2024-01-03", "2024-01-04", "2024-01-05",
+                                                      "2024-01-08", "2024-01-09"]
+    assert df['shares'].tolist() == pytest.approx([0.0, 5.0, 5.0, 5.0, 5.0, 0.0])
+    assert df['nav'].tolist() == pytest.approx([0.0, 550.0, 605.0, 605.0, 605.0, 0.0])